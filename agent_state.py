@@ -5,6 +5,34 @@ from operator import add
 from typing import TypedDict, List, Annotated, Union, Optional, Any
 from langchain_core.messages import BaseMessage
 from operator import add
+import uuid
+
+
+def append_messages(left: List[BaseMessage], right: Union[BaseMessage, List[BaseMessage]]) -> List[BaseMessage]:
+    """
+    chat_history 的 reducer：只追加，不替换。
+    节点只返回本步新增的消息（增量），没有 id 的消息会分配一个，已存在的 id 直接跳过，
+    所以即使某个节点把旧消息又返回一遍，历史也不会翻倍。
+    """
+    if not isinstance(right, list):
+        right = [right]
+    if not right:
+        return left
+
+    seen = {m.id for m in left}
+    new_messages = []
+    for m in right:
+        if m.id is None:
+            m.id = str(uuid.uuid4())
+        elif m.id in seen:
+            continue
+        seen.add(m.id)
+        new_messages.append(m)
+
+    if not new_messages:
+        return left
+    return left + new_messages
+
 
 class AgentState(TypedDict):
     """
@@ -14,7 +42,11 @@ class AgentState(TypedDict):
     input: str
 
     # A list of all messages in the conversation history
-    chat_history: Annotated[List[BaseMessage], add]
+    # 追加式消息日志：节点只返回增量，按 id 去重（见 append_messages）
+    chat_history: Annotated[List[BaseMessage], append_messages]
+
+    # 本轮用户输入写入 chat_history 后的消息 id；为 None 表示还没写入（每次运行开始时）
+    input_id: Annotated[Optional[str], lambda x, y: y]
 
     # The final answer from the agent
     final_answer: Annotated[Optional[str], lambda x, y: y]
@@ -26,6 +58,9 @@ class AgentState(TypedDict):
     # 建议这里其实用 Any 更稳一点，如果你后面想返回 dict / 结构化数据：
     last_tool_result: Annotated[Optional[Any], lambda x, y: y]
 
+    # 早前对话的滚动摘要（见 context_manager.ContextSummary），超出 token 预算的旧消息会增量折叠进来
+    context_summary: Annotated[Optional[dict], lambda x, y: y]
+
     # The current iteration count (for debugging/limiting loops)
     iteration: Annotated[int, lambda x, y: y]
 
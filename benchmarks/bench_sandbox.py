@@ -0,0 +1,89 @@
+# benchmarks/bench_sandbox.py
+"""
+沙箱后端冷 / 热延迟对比：python benchmarks/bench_sandbox.py [-n 重复次数] [--backend local ppio]
+
+每个后端测三个场景，取多次运行的中位数：
+- cold：新建实例并执行第一段代码（没有预热池时每个新对话要付的代价）；
+- warm lease：从已预热的沙箱池领一个实例并执行代码（新对话的实际路径）；
+- warm exec：在已租用的实例上再次执行代码（同一对话的后续调用）。
+ppio 后端需要 PPIO_API_KEY，没有时跳过。
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tool.sandbox_backend import BACKENDS, make_backend  # noqa: E402
+from tool.sandbox_pool import SandboxPool  # noqa: E402
+
+CODE = "x = sum(range(1000)); print(x)"
+
+
+def _exec(sbx) -> None:
+    execution = sbx.run_code(CODE)
+    if execution.error is not None:
+        raise RuntimeError(f"{execution.error.name}: {execution.error.value}")
+
+
+def bench_backend(name: str, n: int):
+    backend = make_backend(name)
+    results = {"cold": [], "warm lease": [], "warm exec": []}
+
+    for _ in range(n):
+        t = time.perf_counter()
+        sbx = backend.create()
+        _exec(sbx)
+        results["cold"].append(time.perf_counter() - t)
+        sbx.kill()
+
+    pool = SandboxPool(backend.create, size=1, background=False)
+    try:
+        for i in range(n):
+            pool.maintain()  # 补满预热实例（不计时）
+            t = time.perf_counter()
+            sbx = pool.lease(f"bench-{i}")
+            _exec(sbx)
+            results["warm lease"].append(time.perf_counter() - t)
+            for _ in range(3):
+                t = time.perf_counter()
+                _exec(sbx)
+                results["warm exec"].append(time.perf_counter() - t)
+            pool.release(f"bench-{i}")
+    finally:
+        pool.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=5, help="每个场景重复的次数")
+    parser.add_argument("--backend", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'scenario':<14}{'median(ms)':>12}{'min(ms)':>10}")
+    for name in args.backend:
+        if name == "ppio" and not os.getenv("PPIO_API_KEY"):
+            try:
+                from dotenv import load_dotenv
+                load_dotenv()
+            except ImportError:
+                pass
+            if not os.getenv("PPIO_API_KEY"):
+                print(f"{name:<10}(跳过：未设置 PPIO_API_KEY)")
+                continue
+        try:
+            results = bench_backend(name, args.n)
+        except Exception as e:
+            print(f"{name:<10}(失败：{type(e).__name__}: {e})")
+            continue
+        for scenario, samples in results.items():
+            ms = [s * 1000 for s in samples]
+            print(f"{name:<10}{scenario:<14}{statistics.median(ms):>12.1f}{min(ms):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_startup.py
+"""
+冷启动导入耗时对比：python benchmarks/bench_startup.py [-n 重复次数]
+
+每个场景在全新的子进程里执行，取多次运行的中位数。
+"eager" 场景显式导入旧版启动时会顺带导入的 ppio_sandbox / dotenv，用来对照懒加载前的开销。
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    # 工具注册表 + schema（落盘缓存命中时不导入任何工具模块）
+    "registry (lazy)": "from tool.registry import registry; registry.schemas()",
+    # 旧版 import tool.tools 的等价开销：工具模块 + 沙箱 SDK + dotenv
+    "tool modules (eager)": (
+        "import tool.tools, tool.sandbox_tools, dotenv, ppio_sandbox.code_interpreter"
+    ),
+    # python main.py 启动到进入 REPL 之前的全部导入
+    "main (lazy)": "import main",
+    "main + sandbox SDK (eager)": "import main, dotenv, ppio_sandbox.code_interpreter",
+}
+
+PROBE = (
+    "import sys, time; t = time.perf_counter(); {code}; "
+    "print(time.perf_counter() - t, 'ppio_sandbox' in sys.modules)"
+)
+
+
+def run_once(code: str):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code=code)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return float(out[-2]), out[-1] == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=5, help="每个场景重复的次数")
+    args = parser.parse_args()
+
+    # 先跑一次，生成工具 schema 的落盘缓存（模拟第二次及以后的启动）
+    run_once(SCENARIOS["registry (lazy)"])
+
+    print(f"{'scenario':<30}{'median(ms)':>12}{'min(ms)':>10}  ppio_sandbox loaded")
+    for name, code in SCENARIOS.items():
+        samples = []
+        loaded = False
+        for _ in range(args.n):
+            elapsed, loaded = run_once(code)
+            samples.append(elapsed * 1000)
+        print(f"{name:<30}{statistics.median(samples):>12.1f}{min(samples):>10.1f}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import re
+import json
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+# 中日韩文字与全角标点：大致 1 字 1 token；其余字符大致 4 个 1 token
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+# 每条消息除正文外的固定开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "[早前对话摘要]"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计一段文本的 token 数，不依赖具体模型的 tokenizer。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_text(message: BaseMessage) -> str:
+    """
+    取出消息的纯文本内容（兼容 content 为分段列表的情况）。
+    """
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+class ContextSummary(TypedDict):
+    """
+    滚动摘要的状态，随 AgentState 一起传递，不同会话互不干扰。
+    """
+    # 摘要正文
+    text: str
+    # 已经折叠进摘要的最后一条消息的 id；它之前（含它）的消息都不再原样发送
+    upto_id: Optional[str]
+
+
+def _role_label(message: BaseMessage) -> str:
+    if isinstance(message, HumanMessage):
+        return "用户"
+    if isinstance(message, ToolMessage):
+        return f"工具 {message.name or ''}".strip()
+    if isinstance(message, AIMessage):
+        return "AI"
+    return message.type
+
+
+def extractive_summarizer(previous: str, messages: List[BaseMessage], max_tokens: int) -> str:
+    """
+    默认的增量摘要：把新折叠的消息压成一行行要点追加到已有摘要后面，
+    超出 max_tokens 时从最早的要点开始丢弃。不调用 LLM，没有额外延迟。
+    """
+    lines = previous.splitlines() if previous else []
+    for m in messages:
+        text = " ".join(message_text(m).split())
+        if isinstance(m, AIMessage) and m.tool_calls:
+            calls = ", ".join(tc["name"] for tc in m.tool_calls)
+            text = f"{text} (调用工具: {calls})".strip()
+        if not text:
+            continue
+        if len(text) > 200:
+            text = text[:200] + "…"
+        lines.append(f"- {_role_label(m)}: {text}")
+
+    total = sum(estimate_tokens(line) + 1 for line in lines)
+    while lines and total > max_tokens:
+        total -= estimate_tokens(lines[0]) + 1
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ContextWindowManager:
+    """
+    按 token 预算挑选要发给 LLM 的历史消息：
+    - 每条消息的 token 数按 id 缓存，只算一次；
+    - AIMessage 和它发起的 ToolMessage 作为一个整体保留或折叠，不会被拆开；
+    - 超出预算的旧消息增量折叠进滚动摘要（每次只处理新折叠的部分）；
+    - 单次请求的历史部分始终控制在 max_tokens 以内（最新一组消息除外）。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        summary_max_tokens: int = 800,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        summarizer: Optional[Callable[[str, List[BaseMessage], int], str]] = None,
+        cache_size: int = 10000,
+    ):
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.token_counter = token_counter
+        self.summarizer = summarizer or extractive_summarizer
+        self._cache_size = cache_size
+        self._token_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- token 计数 ---
+
+    def count_tokens(self, message: BaseMessage) -> int:
+        """
+        单条消息的 token 数，按消息 id 缓存（没有 id 的消息会分配一个）。
+        """
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+        with self._lock:
+            cached = self._token_cache.get(message.id)
+            if cached is not None:
+                self._token_cache.move_to_end(message.id)
+                return cached
+
+        count = MESSAGE_OVERHEAD_TOKENS + self.token_counter(message_text(message))
+        if isinstance(message, AIMessage) and message.tool_calls:
+            count += self.token_counter(
+                json.dumps([tc["args"] for tc in message.tool_calls], ensure_ascii=False)
+            )
+
+        with self._lock:
+            self._token_cache[message.id] = count
+            if len(self._token_cache) > self._cache_size:
+                self._token_cache.popitem(last=False)
+        return count
+
+    # --- 分组 ---
+
+    @staticmethod
+    def group(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+        """
+        把消息切成不可拆分的单元：带 tool_calls 的 AIMessage 与紧随其后的 ToolMessage 为一组，
+        其余消息各自成组。ToolMessage 永远跟着前一组，保证不会和发起它的 AIMessage 分开。
+        """
+        units: List[List[BaseMessage]] = []
+        for m in messages:
+            if isinstance(m, ToolMessage) and units:
+                units[-1].append(m)
+            else:
+                units.append([m])
+        return units
+
+    # --- 窗口 ---
+
+    def compact(
+        self,
+        history: List[BaseMessage],
+        summary: Optional[ContextSummary] = None,
+    ) -> Tuple[List[BaseMessage], ContextSummary]:
+        """
+        返回 (仍需原样保留的消息, 更新后的摘要)。
+        已折叠进摘要的前缀会被跳过；剩余部分超出预算时，把最旧的若干组折叠进摘要。
+        """
+        summary = summary or {"text": "", "upto_id": None}
+
+        start = 0
+        if summary["upto_id"] is not None:
+            for i in range(len(history) - 1, -1, -1):
+                if history[i].id == summary["upto_id"]:
+                    start = i + 1
+                    break
+            # 找不到说明调用方已经把折叠过的前缀删掉了，剩下的全部是未折叠的消息
+        live = history[start:]
+
+        units = self.group(live)
+        sizes = [sum(self.count_tokens(m) for m in unit) for unit in units]
+        summary_tokens = self.token_counter(summary["text"])
+        if sum(sizes) + summary_tokens <= self.max_tokens:
+            return live, summary
+
+        # 需要折叠：给摘要预留 summary_max_tokens，从最新一组往前装，装不下的都折叠
+        budget = self.max_tokens - self.summary_max_tokens
+        keep_from = len(units)
+        used = 0
+        while keep_from > 0 and (keep_from == len(units) or used + sizes[keep_from - 1] <= budget):
+            used += sizes[keep_from - 1]
+            keep_from -= 1
+
+        folded = [m for unit in units[:keep_from] for m in unit]
+        if not folded:
+            return live, summary
+        new_summary: ContextSummary = {
+            "text": self.summarizer(summary["text"], folded, self.summary_max_tokens),
+            "upto_id": folded[-1].id,
+        }
+        kept = [m for unit in units[keep_from:] for m in unit]
+        return kept, new_summary
+
+    def build(
+        self,
+        history: List[BaseMessage],
+        summary: Optional[ContextSummary] = None,
+    ) -> Tuple[List[BaseMessage], ContextSummary]:
+        """
+        生成本次请求要发送的历史消息：摘要（如果有）+ 预算内的最近消息。
+        """
+        kept, summary = self.compact(history, summary)
+        if summary["text"]:
+            summary_message = HumanMessage(content=f"{SUMMARY_PREFIX}\n{summary['text']}")
+            return [summary_message] + kept, summary
+        return kept, summary
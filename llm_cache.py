@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import warnings
+import threading
+from typing import Any, Dict, Optional
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+# langchain_core.load.loads 每次调用都会发 beta 警告，这里只屏蔽本模块触发的那条
+warnings.filterwarnings("ignore", category=LangChainBetaWarning, module=__name__)
+
+# 消息里只有这些字段会影响模型输出；id、response_metadata 等每次都不同，不参与缓存键
+_MESSAGE_KEY_FIELDS = ("type", "content", "name", "tool_call_id")
+
+
+def _canonical_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    kwargs = message.get("kwargs", message)
+    canonical = {k: kwargs.get(k) for k in _MESSAGE_KEY_FIELDS if kwargs.get(k) is not None}
+    tool_calls = kwargs.get("tool_calls")
+    if tool_calls:
+        canonical["tool_calls"] = [
+            {"name": tc.get("name"), "args": tc.get("args"), "id": tc.get("id")}
+            for tc in tool_calls
+        ]
+    return canonical
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    缓存键：模型参数（含模型名、temperature、绑定的工具 schema）+ 规范化后的消息列表 的 sha256。
+    """
+    try:
+        messages = json.loads(prompt)
+        if isinstance(messages, list):
+            prompt = json.dumps(
+                [_canonical_message(m) if isinstance(m, dict) else m for m in messages],
+                ensure_ascii=False,
+                sort_keys=True,
+            )
+    except ValueError:
+        # 文本补全模型（Tongyi）的 prompt 是普通字符串，直接参与哈希
+        pass
+    payload = json.dumps({"llm": llm_string, "prompt": prompt}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    基于本地 SQLite 的 LLM 响应缓存，用于 temperature=0 的确定性调用。
+    - 条目超过 ttl 秒即视为过期；
+    - 总条数或总字节数超限时，按最近访问时间淘汰最旧的条目（LRU）。
+    通过 ChatTongyi(cache=...) / Tongyi(cache=...) 接入，LangChain 会在调用模型前先查缓存。
+    """
+
+    def __init__(
+        self,
+        path: str = ".cache/llm_cache.sqlite",
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        max_bytes: int = 200 * 1024 * 1024,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        try:
+            return loads(value, allowed_objects="core")
+        except Exception:
+            # 反序列化失败（比如 langchain 升级后结构变了）按未命中处理
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        value = dumps(list(return_val))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # 从最久未访问的开始删，直到条数和字节数都回到上限以内
+        rows = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
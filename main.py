@@ -1,28 +1,74 @@
 
 import os
 import json
-from typing import List, Dict, Any, Union
+import uuid
+import asyncio
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
 from langchain_community.chat_models.tongyi import ChatTongyi
 from langchain_core.tools import BaseTool
 # from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, BaseMessage
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, END
 
 from agent_state import AgentState
-from tool.tools import ALL_TOOLS
-
-MAX_HISTORY = 4   # 只保留最近 4 条（或你喜欢的数量）
+from context_manager import ContextSummary, ContextWindowManager
+from llm_cache import SQLiteResponseCache
+from tool.registry import registry
+from tool.selector import ToolSelector
+from tool.output_store import output_store
+from tool.sandbox_exec import cancel_running
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))  # 每次请求历史部分的 token 上限
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "800"))    # 滚动摘要的 token 上限
+MAX_TOOL_WORKERS = int(os.getenv("MAX_TOOL_WORKERS", "8"))  # 普通工具线程池大小（所有会话共用）
+MAX_BLOCKING_TOOL_WORKERS = int(os.getenv("MAX_BLOCKING_TOOL_WORKERS", "32"))  # 长时间阻塞工具的线程池大小
+# 这些工具可能阻塞几十秒到几分钟（命令、代码、沙箱网络调用），单独放一个池，不占用普通工具的线程
+BLOCKING_TOOLS = {"shell_exec", "code_exec", "sandbox_code_exec", "sandbox_list_files", "sandbox_sync", "sandbox_kill"}
+# 这些工具的结果不分页：plan_task 的 JSON 需要完整解析，tool_output_page 返回的本身就是一页
+UNPAGED_TOOLS = {"plan_task", "tool_output_page"}
+TOOL_TOP_K = int(os.getenv("TOOL_TOP_K", "4"))  # 每轮最多绑定几个相关工具，0 表示总是绑定全部工具
+LLM_TEMPERATURE = 0
+# LLM 响应缓存：LLM_CACHE=1 python main.py 开启，只对 temperature=0 的确定性调用生效
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "0") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
 PPIO_API_KEY="sk_"
+
+response_cache = (
+    SQLiteResponseCache(LLM_CACHE_PATH)
+    if LLM_CACHE_ENABLED and LLM_TEMPERATURE == 0
+    else None
+)
+
 llm = ChatTongyi(
     model="qwen-max", 
-    temperature=0,
+    temperature=LLM_TEMPERATURE,
     api_key="sk-",  
-    
+    cache=response_cache,
 )
 
-# 绑定工具到 LLM
-llm_with_tools = llm.bind_tools(ALL_TOOLS)
+# 每轮只绑定与当前输入相关的工具，减少 schema token；同一工具组合的模型只绑定一次
+tool_selector = ToolSelector(top_k=TOOL_TOP_K)
+
+
+@lru_cache(maxsize=64)
+def bind_model(tool_names: Tuple[str, ...]):
+    """
+    绑定指定工具子集的模型（schema 由注册表缓存，冷启动时不必导入各工具模块）。
+    """
+    return llm.bind_tools(registry.schemas(tool_names))
+
+
+# 绑定全部工具的模型，工具选择退回完整工具集时使用
+llm_with_tools = bind_model(tuple(registry.names()))
+
+# 上下文窗口管理：按 token 预算挑历史，旧消息增量折叠进摘要（token 计数缓存跨会话共享）
+context_manager = ContextWindowManager(
+    max_tokens=CONTEXT_TOKEN_BUDGET,
+    summary_max_tokens=SUMMARY_TOKEN_BUDGET,
+)
 
 # --- 2. Prompt Template ---
 SYSTEM_PROMPT = """
@@ -41,19 +87,24 @@ SYSTEM_PROMPT = """
 
 **最终答案 (Final Answer)**:
 当你认为任务已完成，或者无法继续时，请直接给出最终答案，不要再进行工具调用。
-
-**当前状态**:
-- 历史对话记录: {chat_history}
-- 上次工具执行结果: {last_tool_result}
+历史对话、工具调用及其执行结果都在后续消息中按顺序给出。
 """
 
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", SYSTEM_PROMPT),
-        ("placeholder", "{chat_history}"),
-        ("human", "{input}"),
-    ]
-)
+
+@lru_cache(maxsize=1)
+def _static_prefix() -> Tuple[BaseMessage, ...]:
+    """
+    请求中不随会话变化的前缀：系统提示词只渲染一次，之后每轮复用同一个对象。
+    工具 schema 在 bind_tools 时已固定顺序，加上系统提示词逐字节不变，服务端的前缀缓存才能命中。
+    """
+    return (SystemMessage(content=SYSTEM_PROMPT.strip()),)
+
+
+def build_prompt_messages(history: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    组装最终发给模型的消息：静态前缀 + 历史（历史只出现这一次，不再拼进系统提示词）。
+    """
+    return [*_static_prefix(), *history]
 
 # --- 3. Graph Nodes ---
 
@@ -128,115 +179,245 @@ prompt = ChatPromptTemplate.from_messages(
 
 
 
-def call_llm(state: AgentState) -> Dict[str, Any]:
+def _llm_input(state: AgentState) -> Tuple[List[BaseMessage], Optional[HumanMessage], ContextSummary]:
     """
-    调用 LLM 进行推理，生成下一步的思考、工具调用或最终答案。
+    组装本轮发给 LLM 的消息（call_llm / acall_llm 共用）。
+    返回 (消息列表, 需要写入日志的本轮用户输入或 None, 更新后的滚动摘要)。
+    """
+    history = state["chat_history"]
+
+    # 用户输入只在本次运行的第一次 LLM 调用时写入日志，放在本轮工具往返之前；
+    # 之后每轮只在末尾追加新消息，前缀保持不变，有利于前缀缓存
+    input_message = None
+    if not state.get("input_id"):
+        input_message = HumanMessage(content=state["input"], id=str(uuid.uuid4()))
+        history = history + [input_message]
+    input_id = state.get("input_id") or input_message.id
+
+    # chat_history 是完整的追加式日志（含 call_tool 写入的 ToolMessage），
+    # 上下文窗口只在读取时按 token 预算挑选，不会改写或复制整段历史
+    window, summary = context_manager.build(history, state.get("context_summary"))
+
+    # 本轮用户输入必须原样保留：如果它被折叠进了摘要，就放回窗口开头（摘要之后）
+    if all(m.id != input_id for m in window):
+        pinned = next(m for m in reversed(history) if m.id == input_id)
+        insert_at = 1 if summary["text"] else 0
+        window = window[:insert_at] + [pinned] + window[insert_at:]
+
+    return build_prompt_messages(window), input_message, summary
+
+
+def _select_model(state: AgentState, messages: List[BaseMessage]):
+    """
+    根据本轮输入和计划步骤挑选工具子集，返回对应的（已缓存的）绑定模型。
+    窗口里已经调用过的工具一定保留，避免历史中的 tool_call 指向未绑定的工具。
+    """
+    plan = state.get("plan") or {}
+    query_parts = [state["input"], str(plan.get("goal", ""))]
+    query_parts.extend(str(step.get("description", "")) for step in plan.get("steps", []))
+    used = {tc["name"] for m in messages if isinstance(m, AIMessage) for tc in m.tool_calls}
+    if any(isinstance(m, ToolMessage) and m.artifact for m in messages):
+        # 窗口里有分页的工具输出，模型可能需要继续翻页
+        used.add("tool_output_page")
+
+    tool_names = tool_selector.select(" ".join(query_parts), required=used)
+    if len(tool_names) == len(registry.names()):
+        return llm_with_tools
+    print(f"Tools bound: {', '.join(tool_names)}")
+    return bind_model(tool_names)
+
+
+def _llm_update(
+    state: AgentState,
+    response: AIMessage,
+    input_message: Optional[HumanMessage],
+    summary: ContextSummary,
+) -> Dict[str, Any]:
+    """
+    根据 LLM 的响应生成状态更新（call_llm / acall_llm 共用）。
     """
-    print("--- Node: call_llm ---")
-    
-    # 准备输入消息
-    messages = state["chat_history"] + [HumanMessage(content=state["input"])]
-    
-    # 如果是工具执行后的返回，需要将工具结果添加到消息历史中
-    if state.get("last_tool_result"):
-        # 找到上一个 AIMessage (包含工具调用的那个)
-        last_ai_message = next((msg for msg in reversed(messages) if isinstance(msg, AIMessage) and msg.tool_calls), None)
-        
-        if last_ai_message:
-            # 创建 ToolMessage
-            tool_messages = []
-            for i, tool_call in enumerate(last_ai_message.tool_calls):
-                # 假设我们只处理上一个工具调用的结果
-                tool_messages.append(ToolMessage(
-                    content=state["last_tool_result"],
-                    tool_call_id=tool_call["id"],
-                ))
-            
-            # 将工具消息添加到历史中，然后是用户输入
-            messages = state["chat_history"] + tool_messages + [HumanMessage(content=state["input"])]
-        else:
-            # 如果没有找到工具调用，说明是第一次运行或状态异常，直接用用户输入
-            messages = state["chat_history"] + [HumanMessage(content=state["input"])]
-
-    # 格式化系统提示词
-    formatted_prompt = prompt.format(
-        chat_history=messages,
-        input=state["input"],
-        last_tool_result=state.get("last_tool_result", "无")
-    )
-    
-    # 调用 LLM
-    response = llm_with_tools.invoke(formatted_prompt)
-    # print(f"LLM Raw Response:\n{response}")
-    
-    # 更新状态
-    new_messages = state["chat_history"] + [response] # <-- Added plan to chat history
-    
     # 检查是否是最终答案
     # 如果没有工具调用，即使 content 为空也应该作为最终答案
     final_answer = None
     if not response.tool_calls:
         # 即使 content 为空字符串，也认为这是一个答案（避免陷入循环）
         final_answer = response.content if response.content else "[LLM返回空响应]"
-    if len(new_messages) > MAX_HISTORY:
-        new_messages = new_messages[-MAX_HISTORY:]
+    new_messages = [input_message, response] if input_message else [response]
     return {
-        "chat_history": new_messages,
+        "chat_history": new_messages, # 只返回增量，由 reducer 追加到日志
+        "input_id": input_message.id if input_message else state.get("input_id"),
         "agent_outcome": response,
         "final_answer": final_answer,
         "last_tool_result": None, # 清空上次工具结果
+        "context_summary": summary,
         "iteration": state.get("iteration", 0) + 1
     }
 
-def call_tool(state: AgentState) -> Dict[str, Any]:
+
+def call_llm(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """
-    执行 LLM 建议的工具调用。
+    调用 LLM 进行推理，生成下一步的思考、工具调用或最终答案。
     """
-    print("--- Node: call_tool ---")
-    
-    agent_outcome = state["agent_outcome"]
-    tool_calls = agent_outcome.tool_calls
+    print("--- Node: call_llm ---")
     
-    if not tool_calls:
-        # 理论上不应该发生，因为边已经处理了这种情况
-        return {"last_tool_result": "Error: call_tool node reached without tool calls."}
+    # 调用 LLM
+    # config 透传给模型，astream_events 才能拿到逐 token 的流式事件
+    messages, input_message, summary = _llm_input(state)
+    response = _select_model(state, messages).invoke(messages, config)
+    # print(f"LLM Raw Response:\n{response}")
+    return _llm_update(state, response, input_message, summary)
+
+
+async def acall_llm(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    call_llm 的异步版本：等待模型响应期间不占用事件循环，多个会话可以共享一个 loop。
+    """
+    print("--- Node: call_llm (async) ---")
+
+    messages, input_message, summary = _llm_input(state)
+    response = await _select_model(state, messages).ainvoke(messages, config)
+    return _llm_update(state, response, input_message, summary)
+
+# 工具线程池：同一个 AIMessage 里的多个 tool_call 并发执行，所有会话共用。
+# BLOCKING_TOOLS 放在单独的池里，某个会话跑长命令或沙箱代码时，其他会话的 file_read 等不用排队。
+_tool_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="tool")
+_blocking_executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_TOOL_WORKERS, thread_name_prefix="tool-blocking")
+
+
+def _executor_for(tool_name: str) -> ThreadPoolExecutor:
+    return _blocking_executor if tool_name in BLOCKING_TOOLS else _tool_executor
+
 
-    # 假设我们只处理第一个工具调用
-    tool_call = tool_calls[0]
+def _find_tool(tool_name: str) -> Optional[BaseTool]:
+    # 注册表按名字 O(1) 查找，工具模块在第一次调用时才导入
+    return registry.get(tool_name)
+
+
+def _tool_message(tool_call: Dict[str, Any], result: Any, status: str) -> ToolMessage:
+    print(f"Tool Result ({tool_call['name']}): {str(result)[:100]}...")
+    content, handle = str(result), None
+    if tool_call["name"] not in UNPAGED_TOOLS:
+        # 按 token 控制写进上下文的大小：超过一页只留第一页和续读提示，完整输出存在 output_store
+        content, handle = output_store.shape(tool_call["name"], content)
+    return ToolMessage(
+        content=content,
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+        status=status,
+        artifact={"output_handle": handle} if handle else None,
+    )
+
+
+def _run_tool_call(tool_call: Dict[str, Any], config: Optional[RunnableConfig] = None) -> ToolMessage:
+    """
+    执行单个工具调用，错误只记录在这一次调用对应的 ToolMessage 上，不影响同批其他调用。
+    """
     tool_name = tool_call["name"]
     tool_args = tool_call["args"]
-    plan = tool_call.get("plan", None)
-    
     print(f"Executing Tool: {tool_name} with args: {tool_args}")
-    
+
     # 查找并执行工具
-    tool_func = next((t for t in ALL_TOOLS if t.name == tool_name), None)
-    
+    tool_func = _find_tool(tool_name)
     if not tool_func:
-        result = f"Error: Tool '{tool_name}' not found."
+        return _tool_message(tool_call, f"Error: Tool '{tool_name}' not found.", "error")
+    try:
+        # 执行工具函数
+        # 工具在线程池里执行，contextvars 不会自动带过去，必须显式传 config 才有 on_tool_start/end 事件
+        result = tool_func.invoke(tool_args, config)
+    except Exception as e:
+        return _tool_message(
+            tool_call, f"Tool Execution Error in '{tool_name}': {type(e).__name__}: {e}", "error"
+        )
+    return _tool_message(tool_call, result, "success")
+
+
+async def _arun_tool_call(tool_call: Dict[str, Any], config: Optional[RunnableConfig] = None) -> ToolMessage:
+    """
+    _run_tool_call 的异步版本：原生协程工具直接 await，同步（阻塞）工具放到工具线程池执行。
+    """
+    tool_name = tool_call["name"]
+    tool_args = tool_call["args"]
+    print(f"Executing Tool: {tool_name} with args: {tool_args}")
+
+    tool_func = _find_tool(tool_name)
+    if not tool_func:
+        return _tool_message(tool_call, f"Error: Tool '{tool_name}' not found.", "error")
+    try:
+        if getattr(tool_func, "coroutine", None) is not None:
+            result = await tool_func.ainvoke(tool_args, config)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(_executor_for(tool_name), tool_func.invoke, tool_args, config)
+    except Exception as e:
+        return _tool_message(
+            tool_call, f"Tool Execution Error in '{tool_name}': {type(e).__name__}: {e}", "error"
+        )
+    return _tool_message(tool_call, result, "success")
+
+
+def _tool_update(state: AgentState, tool_calls: List[Dict[str, Any]], tool_messages: List[ToolMessage]) -> Dict[str, Any]:
+    """
+    根据本轮全部 ToolMessage 生成状态更新（call_tool / acall_tool 共用）。
+    """
+    plan = state.get("plan")
+    for tool_call, tool_message in zip(tool_calls, tool_messages):
+        if tool_call["name"] == "plan_task" and tool_message.status == "success":
+            # 如果是 plan_task 工具，格式化输出为可读文本
+            plan = json.loads(tool_message.content)
+            print("计划任务结果:")
+            print(json.dumps(plan, indent=2, ensure_ascii=False))
+
+    if len(tool_messages) == 1:
+        last_tool_result = tool_messages[0].content
     else:
-        try:
-            # 执行工具函数
-            result = tool_func.invoke(tool_args)
-            if tool_name == "plan_task":
-                # 如果是 plan_task 工具，格式化输出为可读文本
-                plan = json.loads(result)
-                print("计划任务结果:")
-                print(json.dumps(json.loads(result), indent=2, ensure_ascii=False))
-        except Exception as e:
-            result = f"Tool Execution Error in '{tool_name}': {type(e).__name__}: {e}"
-    result_str = str(result)
-    print(f"Tool Result: {result_str[:100]}...")
+        last_tool_result = "\n\n".join(
+            f"[{m.name}] {m.content}" for m in tool_messages
+        )
     
     # 更新状态
     return {
         "plan": plan,
-        "last_tool_name": tool_name,
-        "last_tool_result": result,
+        "last_tool_name": ", ".join(tc["name"] for tc in tool_calls),
+        "last_tool_result": last_tool_result,
         "input": state["input"], # 保持用户输入不变，以便 LLM 知道要继续解决哪个问题
-        "chat_history": state["chat_history"] # 历史消息已在 call_llm 中更新
+        "chat_history": tool_messages # 只追加本轮的 ToolMessage
     }
 
+
+def call_tool(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    并发执行 LLM 在这一轮给出的全部工具调用，按 tool_calls 的原始顺序返回 ToolMessage。
+    """
+    print("--- Node: call_tool ---")
+    
+    agent_outcome = state["agent_outcome"]
+    tool_calls = agent_outcome.tool_calls
+    
+    if not tool_calls:
+        # 理论上不应该发生，因为边已经处理了这种情况
+        return {"last_tool_result": "Error: call_tool node reached without tool calls."}
+
+    # 按 tool_calls 的顺序收集结果
+    futures = [_executor_for(tc["name"]).submit(_run_tool_call, tc, config) for tc in tool_calls]
+    tool_messages = [future.result() for future in futures]
+    return _tool_update(state, tool_calls, tool_messages)
+
+
+async def acall_tool(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    call_tool 的异步版本：用 asyncio.gather 并发执行全部工具调用，结果顺序与 tool_calls 一致。
+    """
+    print("--- Node: call_tool (async) ---")
+
+    agent_outcome = state["agent_outcome"]
+    tool_calls = agent_outcome.tool_calls
+
+    if not tool_calls:
+        return {"last_tool_result": "Error: call_tool node reached without tool calls."}
+
+    tool_messages = await asyncio.gather(*(_arun_tool_call(tc, config) for tc in tool_calls))
+    return _tool_update(state, tool_calls, list(tool_messages))
+
 # --- 4. Graph Edges (Conditional Logic) ---
 
 def should_continue(state: AgentState) -> str:
@@ -257,7 +438,8 @@ def should_continue(state: AgentState) -> str:
     if isinstance(agent_outcome, BaseMessage):
         tool_calls = getattr(agent_outcome, 'tool_calls', None)
         if tool_calls:
-            print(f"✅ Tool call suggested: {tool_calls[0]['name']}. Continuing to call_tool.")
+            names = ", ".join(tc["name"] for tc in tool_calls)
+            print(f"✅ Tool call suggested: {names}. Continuing to call_tool.")
             return "continue"
     
     # 检查 LLM 是否给出了最终答案
@@ -280,9 +462,9 @@ def build_graph():
     # create_react_agent()
     workflow = StateGraph(AgentState)
 
-    # 1. 定义节点
-    workflow.add_node("llm", call_llm)
-    workflow.add_node("tool", call_tool)
+    # 1. 定义节点（同时挂上同步和异步实现，app.invoke / app.ainvoke 各走各的）
+    workflow.add_node("llm", RunnableLambda(call_llm, afunc=acall_llm, name="llm"))
+    workflow.add_node("tool", RunnableLambda(call_tool, afunc=acall_tool, name="tool"))
     # workflow.add_node("planner", planner_node)
 
     # 2. 设置入口
@@ -308,19 +490,83 @@ def build_graph():
     app = workflow.compile()
     return app
 
+_app = None
+
+
+def get_app():
+    """
+    懒加载 + 单例：编译好的图本身是无状态的，所有会话共享同一个实例。
+    """
+    global _app
+    if _app is None:
+        _app = build_graph()
+    return _app
+
+
+async def run(state: AgentState, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    异步入口：在调用方的事件循环里跑完整个 ReAct 循环并返回最终状态。
+    大量会话可以在同一个 loop 上并发 await run(...)，互不阻塞。
+    config["configurable"]["thread_id"] 标识一段对话，code_exec 据此复用该对话的 Python 内核。
+    """
+    return await get_app().ainvoke(state, config)
+
+async def stream_run(state: AgentState, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    流式入口：模型 token 一到就打印，工具开始/结束事件穿插显示，最后返回最终状态。
+    """
+    final_state: Dict[str, Any] = {}
+    printed_prefix = False
+    async for event in get_app().astream_events(state, config, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_start":
+            printed_prefix = False
+        elif kind == "on_chat_model_stream":
+            text = event["data"]["chunk"].content
+            if isinstance(text, list):
+                text = "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in text)
+            if text:
+                if not printed_prefix:
+                    print("Agent：", end="", flush=True)
+                    printed_prefix = True
+                print(text, end="", flush=True)
+        elif kind == "on_chat_model_end":
+            if printed_prefix:
+                print(flush=True)
+        elif kind == "on_tool_start":
+            print(f"[工具开始] {event['name']} {event['data'].get('input')}", flush=True)
+        elif kind == "on_custom_event" and event["name"] == "tool_output":
+            # 工具执行中的实时输出（比如 shell_exec 的 stdout）
+            print(event["data"]["text"], end="", flush=True)
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            output = getattr(output, "content", output)
+            print(f"[工具结束] {event['name']}: {str(output)[:100]}", flush=True)
+        elif kind == "on_chain_end" and not event["parent_ids"]:
+            # 根节点（整张图）结束时的输出就是最终状态
+            final_state = event["data"]["output"]
+    return final_state
+
 # --- 6. Main Execution ---
 
 if __name__ == "__main__":
+    import sys
     from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 
+    # 默认流式输出（逐 token 打印 + 工具事件），加 --no-stream 回到一次性输出
+    stream_mode = "--no-stream" not in sys.argv
+
     # 编译 Agent
-    app = build_graph()
+    app = get_app()
     print("--- OpenManus LangGraph Agent Initialized ---")
     print("现在可以直接和 Agent 对话了，输入 exit/quit 结束会话。\n")
 
-    # 持久化对话历史 & 迭代计数
+    # 持久化对话历史 & 迭代计数；超出预算的旧消息折叠进 context_summary，不会无限增长
     chat_history: list[BaseMessage] = []
+    context_summary = None
     iteration = 0
+    # 整个 REPL 是一段对话：code_exec 的变量、导入的模块在多轮之间保留
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
 
     while True:
         try:
@@ -343,28 +589,35 @@ if __name__ == "__main__":
             "final_answer": None,
             "last_tool_name": None,
             "last_tool_result": None,
+            "input_id": None,
+            "context_summary": context_summary,
             "iteration": iteration,
         }
 
-        # 👇 方式一：一步到位拿最终结果（推荐日常使用）
-        result_state = app.invoke(state)
-
-        # 如果你更想看中间 ReAct 过程，可以改用 stream：
-        # result_state = None
-        # for step in app.stream(state):
-        #     # step 是一个 {node_name: partial_state} 的增量
-        #     result_state = list(step.values())[-1]
-        #     # 想调试的话，这里可以打印每一步：
-        #     # print(step, "\n---")
-        #
-        # assert result_state is not None
+        try:
+            if stream_mode:
+                # 👇 方式一：流式运行，模型 token 和工具事件边产生边打印
+                result_state = asyncio.run(stream_run(state, config))
+            else:
+                # 👇 方式二：一步到位拿最终结果
+                result_state = app.invoke(state, config)
+        except KeyboardInterrupt:
+            # Ctrl-C 只打断本轮：沙箱里还在跑的代码一并中断，对话继续
+            cancel_running(config["configurable"]["thread_id"])
+            print("\n[系统] 已中断本轮执行。\n")
+            continue
 
         answer = result_state.get("final_answer") or "（Agent 没有返回 final_answer 字段……）"
-        print(f"Agent：{answer}\n")
+        if stream_mode:
+            # 答案已经逐 token 打印过了，这里只补一个空行
+            print()
+        else:
+            print(f"Agent：{answer}\n")
 
         # 更新对话历史，供下一轮使用
         chat_history.append(HumanMessage(content=user_input))
         chat_history.append(AIMessage(content=answer))
+        chat_history, context_summary = context_manager.compact(chat_history, context_summary)
 
         # 同步迭代计数（如果图里有更新的话）
         iteration = result_state.get("iteration", iteration + 1)
@@ -9,6 +9,7 @@ from langgraph.graph import StateGraph, END
 from agent_state import AgentState
 from tools import ALL_TOOLS
 from config import AGENT_MODEL, MAX_ITERATIONS, DASHSCOPE_API_KEY
+from llm_cache import SQLiteResponseCache
 
 # --- 1. LLM Setup ---
 # 设置 DASHSCOPE_API_KEY 环境变量
@@ -18,9 +19,13 @@ if DASHSCOPE_API_KEY:
 # 使用 Tongyi 模型
 # 注意：Tongyi 模型是 LLM 类型，不支持 OpenAI 格式的 Function Calling。
 # 我们将通过 prompt 指导它输出特定格式的 JSON 来模拟工具调用。
+# LLM_CACHE=1 时开启本地响应缓存（temperature=0，重复调用直接命中）
 llm = Tongyi(
     model=AGENT_MODEL, 
     temperature=0,
+    cache=SQLiteResponseCache(os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"))
+    if os.getenv("LLM_CACHE", "0") == "1"
+    else None,
 )
 
 # --- 2. Prompt Template ---
@@ -51,11 +56,20 @@ SYSTEM_PROMPT = """
 当你认为任务已完成，或者无法继续时，请直接给出最终答案，不要再进行工具调用。
 
 **当前状态**:
-- 历史对话记录:
-{CHAT_HISTORY}
-- 上次工具执行结果: {LAST_TOOL_RESULT}
+- 历史对话记录（含工具执行结果）:
 """
 
+# 静态前缀只渲染一次（把 {{ }} 转义还原），之后每次调用原样复用，保证逐字节稳定
+STATIC_PREFIX = SYSTEM_PROMPT.format()
+
+
+def _history_line(msg: BaseMessage) -> str:
+    if isinstance(msg, HumanMessage):
+        return f"用户: {msg.content}\n"
+    if isinstance(msg, AIMessage):
+        return f"AI: {msg.content}\n"
+    return ""
+
 # --- 3. Graph Nodes ---
 
 def call_llm(state: AgentState) -> Dict[str, Any]:
@@ -64,22 +78,17 @@ def call_llm(state: AgentState) -> Dict[str, Any]:
     """
     print("--- Node: call_llm ---")
     
-    # 1. 构建历史消息字符串
-    history_str = ""
-    for msg in state["chat_history"]:
-        if isinstance(msg, HumanMessage):
-            history_str += f"用户: {msg.content}\n"
-        elif isinstance(msg, AIMessage):
-            history_str += f"AI: {msg.content}\n"
-    
+    # 1. 构建历史消息字符串（逐条格式化，用 join 一次性拼接）
+    parts = [STATIC_PREFIX]
+    parts.extend(_history_line(msg) for msg in state["chat_history"])
+
+    # 工具结果只在历史里出现一次
     if state.get("last_tool_result"):
-        history_str += f"工具 {state['last_tool_name']} 执行结果: {state['last_tool_result']}\n"
+        parts.append(f"工具 {state['last_tool_name']} 执行结果: {state['last_tool_result']}\n")
 
-    # 2. 组合最终输入（使用大写占位符避免 JSON 中的大括号冲突）
-    final_input = SYSTEM_PROMPT.format(
-        CHAT_HISTORY=history_str,
-        LAST_TOOL_RESULT=state.get("last_tool_result", "无")
-    ) + f"\n用户输入: {state['input']}"
+    # 2. 组合最终输入：静态前缀在最前，动态部分都在后面
+    parts.append(f"\n用户输入: {state['input']}")
+    final_input = "".join(parts)
     
     # 调用 LLM
     response = llm.invoke(final_input)
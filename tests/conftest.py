@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块（main、agent_state、tool.*）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class FakeClock:
+    """可手动拨动的单调时钟，注入给沙箱池、列表缓存等按时间过期的组件。"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def sbx(tmp_path):
+    # 根目录在 tmp_path 下的本地沙箱，用完关闭
+    from tool.sandbox_local import LocalSandbox
+
+    root = tmp_path / "sandbox"
+    root.mkdir()
+    sandbox = LocalSandbox(str(root))
+    yield sandbox
+    sandbox.kill()
@@ -0,0 +1,132 @@
+# tests/test_code_runner.py
+import os
+import sys
+import signal
+import subprocess
+import textwrap
+import threading
+import time
+
+import pytest
+
+from tool.code_runner import CodeExecutorPool, SessionKernelManager, _cpu_limit_for
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在独立的会话（进程组）里跑：killpg 只打到这个脚本和它的 worker，不会波及 pytest
+_PROCESS_GROUP_SIGINT = textwrap.dedent("""
+    import os, signal, sys, time
+    from tool.code_runner import CodeExecutorPool, SessionKernelManager
+
+    pool = CodeExecutorPool(size=1)
+    kernels = SessionKernelManager()
+    assert kernels.run("s", "x = 41").status == "ok"
+    assert pool.run("pass").status == "ok"
+
+    # 相当于在终端里按 Ctrl-C：整个前台进程组都收到 SIGINT，父进程自己忽略它
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.killpg(os.getpgrp(), signal.SIGINT)
+    time.sleep(0.5)
+
+    kernel_result = kernels.run("s", "print(x + 1)")
+    pool_result = pool.run("print('pool ok')")
+    print(kernel_result.status, kernel_result.stdout.strip(), kernel_result.error)
+    print(pool_result.status, pool_result.stdout.strip(), pool_result.error)
+    pool.shutdown()
+    kernels.shutdown()
+""")
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="需要 POSIX 进程组")
+def test_session_kernel_survives_process_group_sigint():
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROCESS_GROUP_SIGINT],
+        cwd=ROOT, capture_output=True, text=True, timeout=60, start_new_session=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    kernel_line, pool_line = proc.stdout.splitlines()[-2:]
+    assert kernel_line == "ok 42 None"
+    assert pool_line == "ok pool ok None"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="需要 POSIX 信号")
+def test_sigint_during_exec_interrupts_only_the_current_code():
+    kernels = SessionKernelManager()
+    try:
+        assert kernels.run("s", "x = 1").status == "ok"
+        pid = kernels._sessions["s"].worker.process.pid
+        timer = threading.Timer(0.5, os.kill, (pid, signal.SIGINT))
+        timer.start()
+        result = kernels.run("s", "import time\nx += 1\ntime.sleep(20)", timeout=30)
+        timer.join()
+        assert result.status == "error"
+        assert result.error.startswith("KeyboardInterrupt")
+
+        result = kernels.run("s", "print(x)")
+        assert result.status == "ok"
+        assert result.stdout.strip() == "2"
+    finally:
+        kernels.shutdown()
+
+
+def test_cpu_limit_follows_call_timeout():
+    assert _cpu_limit_for(2.5) == 4
+    assert _cpu_limit_for(120) == 121
+
+    pool = CodeExecutorPool(size=1)
+    try:
+        code = "import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0])"
+        short = int(pool.run(code, timeout=5).stdout)
+        long = int(pool.run(code, timeout=100).stdout)
+    finally:
+        pool.shutdown()
+    assert short < 30 < long
+
+
+def test_full_kernel_manager_rejects_instead_of_evicting_the_new_session():
+    kernels = SessionKernelManager(max_sessions=1)
+    try:
+        busy = threading.Thread(
+            target=kernels.run, args=("a", "import time\ntime.sleep(1.5)"), kwargs={"timeout": 30},
+        )
+        busy.start()
+        # 等 a 的内核真正开始执行
+        while not (kernels.keys() and kernels._sessions["a"].lock.locked()):
+            time.sleep(0.01)
+
+        result = kernels.run("b", "x = 1")
+        assert result.status == "error"
+        assert result.error.startswith("SessionLimitError")
+        assert kernels.keys() == ["a"]
+
+        busy.join()
+        # a 空闲了：b 顶替它
+        assert kernels.run("b", "print('b ok')").stdout == "b ok\n"
+        assert kernels.keys() == ["b"]
+    finally:
+        kernels.shutdown()
+
+
+def test_kernel_is_created_outside_the_registry_lock(monkeypatch):
+    kernels = SessionKernelManager()
+    release = threading.Event()
+    original = kernels._create
+
+    def slow_create():
+        release.wait(10)
+        return original()
+
+    monkeypatch.setattr(kernels, "_create", slow_create)
+    try:
+        worker = threading.Thread(target=kernels.run, args=("slow", "pass"))
+        worker.start()
+        time.sleep(0.2)
+        # 别的会话在这段时间里仍然可以拿到注册表的锁
+        assert kernels._lock.acquire(timeout=1)
+        kernels._lock.release()
+        release.set()
+        worker.join()
+        assert kernels.keys() == ["slow"]
+    finally:
+        release.set()
+        kernels.shutdown()
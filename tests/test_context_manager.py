@@ -0,0 +1,132 @@
+# tests/test_context_manager.py
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from context_manager import (
+    SUMMARY_PREFIX,
+    ContextWindowManager,
+    estimate_tokens,
+    extractive_summarizer,
+)
+
+
+def _human(i):
+    return HumanMessage(content="x" * 10, id=f"h{i}")
+
+
+def _call(i):
+    # 正文为空，参数 JSON '[{"a": 1}]' 正好 10 个字符
+    return AIMessage(content="", id=f"a{i}", tool_calls=[{"name": "file_read", "args": {"a": 1}, "id": f"c{i}"}])
+
+
+def _result(i):
+    return ToolMessage(content="y" * 10, id=f"t{i}", name="file_read", tool_call_id=f"c{i}")
+
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous, messages, max_tokens):
+        self.calls.append((previous, [m.id for m in messages]))
+        return "S" * 5
+
+
+def _manager(summarizer=None, **kwargs):
+    # 一个字符算一个 token；每条消息另加 4 个 token 的固定开销，所以上面每条消息都是 14
+    options = dict(max_tokens=60, summary_max_tokens=20, token_counter=len, summarizer=summarizer)
+    options.update(kwargs)
+    return ContextWindowManager(**options)
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("你好，世界") == 5
+
+
+def test_token_counts_are_cached_by_message_id():
+    seen = []
+
+    def counter(text):
+        seen.append(text)
+        return len(text)
+
+    manager = _manager(token_counter=counter)
+    call = _call(1)
+    assert manager.count_tokens(call) == 14
+    assert manager.count_tokens(call) == 14
+    assert len(seen) == 2  # 正文和 tool_calls 参数各算一次，第二次直接命中缓存
+
+    anonymous = HumanMessage(content="hi")
+    assert manager.count_tokens(anonymous) == 6
+    assert anonymous.id is not None
+
+
+def test_tool_messages_stay_with_their_call():
+    history = [_human(1), _call(1), _result(1), _human(2), _call(2), _result(2)]
+    groups = ContextWindowManager.group(history)
+    assert [[m.id for m in g] for g in groups] == [["h1"], ["a1", "t1"], ["h2"], ["a2", "t2"]]
+
+
+def test_history_within_budget_is_sent_unchanged():
+    summarizer = RecordingSummarizer()
+    history = [_human(1), _call(1), _result(1)]
+    kept, summary = _manager(summarizer).compact(history)
+    assert kept == history
+    assert summary == {"text": "", "upto_id": None}
+    assert summarizer.calls == []
+
+
+def test_compact_folds_oldest_groups_incrementally():
+    summarizer = RecordingSummarizer()
+    manager = _manager(summarizer)
+    history = [_human(1), _call(1), _result(1), _human(2), _call(2)]  # 70 个 token > 60
+
+    kept, summary = manager.compact(history)
+    # 摘要预留 20，剩 40：从最新往前装 a2、h2，a1+t1 这一组整体折叠，不会拆开
+    assert [m.id for m in kept] == ["h2", "a2"]
+    assert summary == {"text": "SSSSS", "upto_id": "t1"}
+    assert summarizer.calls == [("", ["h1", "a1", "t1"])]
+
+    history += [_human(3), _call(3)]
+    kept, summary = manager.compact(history, summary)
+    # 已经折叠过的前缀不再交给 summarizer，只处理新折叠的部分
+    assert [m.id for m in kept] == ["h3", "a3"]
+    assert summary["upto_id"] == "a2"
+    assert summarizer.calls[-1] == ("SSSSS", ["h2", "a2"])
+
+
+def test_latest_group_is_kept_even_over_budget():
+    manager = _manager(RecordingSummarizer(), max_tokens=30, summary_max_tokens=20)
+    history = [_human(1), _call(2), _result(2)]
+    kept, summary = manager.compact(history)
+    assert [m.id for m in kept] == ["a2", "t2"]
+    assert summary["upto_id"] == "h1"
+
+
+def test_build_prepends_rolling_summary():
+    manager = _manager(RecordingSummarizer())
+    history = [_human(1), _call(1), _result(1), _human(2), _call(2)]
+
+    messages, summary = manager.build(history)
+    assert isinstance(messages[0], HumanMessage)
+    assert messages[0].content == f"{SUMMARY_PREFIX}\nSSSSS"
+    assert [m.id for m in messages[1:]] == ["h2", "a2"]
+
+    # 摘要随调用方的状态传递：另一个会话没有摘要，历史原样发送
+    other, other_summary = manager.build([_human(9)])
+    assert [m.id for m in other] == ["h9"] and other_summary["text"] == ""
+
+    # 调用方丢掉了已折叠的前缀时，剩下的都视为未折叠
+    again, _ = manager.build(history[3:], summary)
+    assert [m.id for m in again[1:]] == ["h2", "a2"]
+
+
+def test_extractive_summary_drops_oldest_points_over_budget():
+    messages = [HumanMessage(content=f"问题{i}") for i in range(5)] + [_call(1)]
+    text = extractive_summarizer("- 旧要点", messages, max_tokens=30)
+    lines = text.splitlines()
+    assert lines[-1] == "- AI: (调用工具: file_read)"
+    assert "- 旧要点" not in lines
+    assert sum(estimate_tokens(line) + 1 for line in lines) <= 30
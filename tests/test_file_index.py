@@ -0,0 +1,49 @@
+# tests/test_file_index.py
+import pytest
+
+from tool import file_index as fi
+from tool.file_index import FileIndexCache
+
+
+@pytest.fixture
+def cache():
+    return FileIndexCache()
+
+
+def _write(path, data: bytes):
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n", b"\r"])
+def test_line_endings_match_text_mode(cache, tmp_path, newline):
+    data = newline.join(f"line {i}".encode() for i in range(1, 6)) + newline
+    path = _write(tmp_path / "f.txt", data)
+
+    assert cache.read_lines(path, 2, 3).text == "line 2\nline 3\n"
+    whole = cache.read_lines(path)
+    assert whole.total == 5
+    assert whole.text.splitlines() == open(path, encoding="utf-8").read().splitlines()
+
+
+def test_cr_only_file_uses_sparse_checkpoints(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(fi, "CHECKPOINT_EVERY", 4)
+    path = _write(tmp_path / "old_mac.txt", b"\r".join(b"%d" % i for i in range(1, 21)))
+
+    result = cache.read_lines(path, 10, 12)
+    assert (result.text, result.start, result.end) == ("10\n11\n12\n", 10, 12)
+    assert cache.read_lines(path, 20, -1).text == "20"
+    assert cache.read_lines(path).total == 20
+
+
+def test_trailing_cr_is_resolved_after_append(cache, tmp_path):
+    target = tmp_path / "log.txt"
+    path = _write(target, b"a\r\nb\r")
+    first = cache.read_lines(path)
+    assert (first.text, first.total) == ("a\nb\n", 2)
+
+    # \r\n 的后半个 \n 是追加进来的：仍是同一行的结尾，不能多出一个空行
+    with open(path, "ab") as f:
+        f.write(b"\nc\r\n")
+    again = cache.read_lines(path)
+    assert (again.text, again.total) == ("a\nb\nc\n", 3)
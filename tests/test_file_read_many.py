@@ -0,0 +1,35 @@
+# tests/test_file_read_many.py
+import json
+
+from tool.tools import file_read_many
+
+
+def _read(paths, budget):
+    return json.loads(file_read_many.invoke({"paths": paths, "max_total_tokens": budget}))
+
+
+def test_reading_stops_at_the_first_truncated_file(tmp_path):
+    (tmp_path / "a.txt").write_text("short file\n", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("".join(f"line number {i} of a long file\n" for i in range(200)), encoding="utf-8")
+    (tmp_path / "c.txt").write_text("x\n", encoding="utf-8")
+    (tmp_path / "d.txt").write_text("y\n", encoding="utf-8")
+
+    result = _read([str(tmp_path / "*.txt")], budget=100)
+
+    a, b = result["files"]
+    assert a["content"] == "short file\n" and "truncated" not in a
+    assert b["truncated"] and b["next_range_start"] == b["range_end"] + 1
+    assert b["content"].startswith("line number 0 ")
+    # 截断之后剩下的小文件即使还放得下也不读，只列出路径
+    assert result["skipped"] == [str(tmp_path / "c.txt"), str(tmp_path / "d.txt")]
+
+
+def test_everything_fits_within_budget(tmp_path):
+    (tmp_path / "a.txt").write_text("one\n", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("two\n", encoding="utf-8")
+
+    result = _read([str(tmp_path / "a.txt"), {"path": str(tmp_path / "b.txt")}, str(tmp_path / "nope.txt")], budget=1000)
+
+    assert [f["content"] for f in result["files"]] == ["one\n", "two\n"]
+    assert "skipped" not in result
+    assert result["not_found"] == [str(tmp_path / "nope.txt")]
@@ -0,0 +1,40 @@
+# tests/test_file_write.py
+import pytest
+
+from tool.tools import file_write
+
+
+@pytest.mark.parametrize(
+    "mode, content, extra, expected",
+    [
+        ("append", "第三行\n", {}, "第一行\n第二行\n第三行\n"),
+        ("replace_lines", "新的第二行\n", {"start_line": 2, "end_line": 2}, "第一行\n新的第二行\n"),
+        ("patch", "@@ -1,2 +1,2 @@\n 第一行\n-第二行\n+改过的第二行\n", {}, "第一行\n改过的第二行\n"),
+    ],
+)
+def test_partial_writes_keep_gbk_encoding(tmp_path, mode, content, extra, expected):
+    target = tmp_path / "gbk.txt"
+    target.write_bytes("第一行\n第二行\n".encode("gbk"))
+
+    result = file_write.invoke({"path": str(target), "content": content, "mode": mode, **extra})
+
+    assert result.startswith("Successfully"), result
+    assert target.read_bytes() == expected.encode("gbk")
+
+
+def test_new_file_is_written_as_utf8(tmp_path):
+    target = tmp_path / "new.txt"
+    file_write.invoke({"path": str(target), "content": "你好\n", "mode": "append"})
+    assert target.read_bytes() == "你好\n".encode("utf-8")
+
+
+def test_unencodable_content_leaves_file_untouched(tmp_path):
+    target = tmp_path / "gbk.txt"
+    original = "第一行\n".encode("gbk")
+    target.write_bytes(original)
+
+    result = file_write.invoke({"path": str(target), "content": "🙂\n", "mode": "append"})
+
+    assert "cannot be encoded as gbk" in result
+    assert target.read_bytes() == original
+    assert [p.name for p in tmp_path.iterdir()] == ["gbk.txt"]
@@ -0,0 +1,38 @@
+# tests/test_grep.py
+import pytest
+
+from tool.grep import format_matches, grep
+
+
+def _lines(matches):
+    return [(m.path.rsplit("/", 1)[-1], m.line, m.text) for m in matches]
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "gbk", "utf-16"])
+def test_non_ascii_patterns_match_in_detected_encoding(tmp_path, encoding):
+    (tmp_path / "notes.txt").write_text("第一行\n配置项：超时\n第三行\n", encoding=encoding)
+
+    matches, truncated = grep(str(tmp_path), "超时", context=1)
+    assert not truncated
+    assert _lines(matches) == [("notes.txt", 2, "配置项：超时")]
+    assert format_matches(matches, str(tmp_path)).splitlines() == [
+        "notes.txt-1-第一行",
+        "notes.txt:2:配置项：超时",
+        "notes.txt-3-第三行",
+    ]
+
+
+def test_ascii_pattern_does_not_match_half_of_a_gbk_character(tmp_path):
+    # “丂” 的 GBK 编码是 0x81 0x40，后一个字节就是 ASCII 的 @
+    (tmp_path / "gbk.txt").write_bytes("丂\nuser@example.com\n".encode("gbk"))
+
+    matches, _ = grep(str(tmp_path), "@")
+    assert _lines(matches) == [("gbk.txt", 2, "user@example.com")]
+
+
+def test_binary_files_are_skipped(tmp_path):
+    (tmp_path / "blob.bin").write_bytes(b"\0\1needle\0")
+    (tmp_path / "a.txt").write_text("needle\n", encoding="utf-8")
+
+    matches, _ = grep(str(tmp_path), "needle")
+    assert _lines(matches) == [("a.txt", 1, "needle")]
@@ -0,0 +1,62 @@
+# tests/test_history.py
+import itertools
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import main
+
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    """
+    每次都发起一个 file_read 工具调用的假模型，让图一直跑到 MAX_ITERATIONS。
+    """
+    target = tmp_path / "note.txt"
+    target.write_text("hello\n", encoding="utf-8")
+    counter = itertools.count(1)
+
+    def respond(messages):
+        n = next(counter)
+        return AIMessage(
+            content=f"step {n}",
+            tool_calls=[{"name": "file_read", "args": {"path": str(target)}, "id": f"call-{n}"}],
+        )
+
+    model = RunnableLambda(respond)
+    monkeypatch.setattr(main, "_select_model", lambda state, messages: model)
+    return counter
+
+
+def _initial_state():
+    return {
+        "input": "read the note",
+        "chat_history": [],
+        "final_answer": None,
+        "last_tool_name": None,
+        "last_tool_result": None,
+        "input_id": None,
+        "context_summary": None,
+        "iteration": 0,
+    }
+
+
+def test_history_grows_linearly_over_ten_iterations(fake_model):
+    app = main.build_graph()
+    lengths = []
+    final = None
+    for final in app.stream(_initial_state(), {"recursion_limit": 100}, stream_mode="values"):
+        lengths.append(len(final["chat_history"]))
+
+    assert final["iteration"] == 10
+    # 第一次 LLM 调用写入用户输入 + AIMessage，之后每个节点（llm / tool）只追加一条消息
+    growth = [b - a for a, b in zip(lengths[1:], lengths[2:])]
+    assert lengths[:2] == [0, 2]
+    assert growth and set(growth) == {1}
+    # 10 次 LLM 调用 + 9 次工具调用 + 1 条用户输入
+    assert lengths[-1] == 1 + 10 + 9
+
+    ids = [m.id for m in final["chat_history"]]
+    assert None not in ids
+    assert len(ids) == len(set(ids))
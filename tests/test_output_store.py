@@ -0,0 +1,60 @@
+# tests/test_output_store.py
+from tool.output_store import ToolOutputStore
+
+
+def _store(**kwargs):
+    # 一个字符算一个 token，页大小好算
+    return ToolOutputStore(page_tokens=20, token_counter=len, **kwargs)
+
+
+TEXT = "".join(f"line {i:02d}\n" for i in range(10))  # 10 行，每行 8 个字符
+
+
+def test_small_output_is_returned_unchanged():
+    store = _store()
+    assert store.shape("shell_exec", "short") == ("short", None)
+
+
+def test_pages_split_on_line_boundaries_and_cover_everything():
+    store = _store()
+    first, handle = store.shape("shell_exec", TEXT)
+    assert first.startswith("line 00\nline 01\n")
+    assert "[Output page 1/5 of about 80 tokens." in first
+    assert f'tool_output_page(handle="{handle}", page=2)' in first
+
+    bodies = [first.split("\n[Output page")[0]]
+    for n in range(2, 6):
+        page = store.page(handle, n)
+        bodies.append(page.split("\n[Output page")[0])
+    assert "This is the last page." in page
+    assert "".join(bodies) == TEXT
+
+    assert "out of range" in store.page(handle, 6)
+    assert "Unknown or expired" in store.page("shell_exec-missing", 2)
+
+
+def test_long_single_line_is_cut_by_characters():
+    store = _store()
+    bounds = store.paginate("x" * 50)
+    assert bounds == [20, 40, 50]
+
+
+def test_handle_is_stable_for_identical_output():
+    store = _store()
+    first, handle = store.shape("shell_exec", TEXT)
+    # 重放同一个工具结果：写进上下文的内容逐字节相同，存储里也不重复保存
+    assert store.shape("shell_exec", TEXT) == (first, handle)
+    assert len(store._entries) == 1
+    assert store.shape("code_exec", TEXT)[1] != handle
+    assert store.shape("shell_exec", TEXT + "more\n")[1] != handle
+
+
+def test_old_outputs_are_evicted_lru():
+    store = _store(max_entries=2)
+    _, a = store.shape("t", TEXT)
+    _, b = store.shape("t", TEXT + "b\n")
+    store.page(a, 2)  # 用过的 a 变成最近使用
+    _, c = store.shape("t", TEXT + "c\n")
+    assert "Unknown or expired" in store.page(b, 2)
+    assert "Unknown" not in store.page(a, 2)
+    assert "Unknown" not in store.page(c, 2)
@@ -0,0 +1,50 @@
+# tests/test_registry.py
+import json
+
+import pytest
+
+from tool.registry import TOOL_MODULES, ToolRegistry
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "tool_schemas.json")
+
+
+def _cached_registry(cache_path):
+    # 直接写一份“旧”缓存，避免真的导入工具模块
+    registry = ToolRegistry(TOOL_MODULES, schema_cache_path=cache_path)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump({"stamp": registry._module_stamp(), "schemas": {"file_read": {"cached": True}}}, f)
+    return registry
+
+
+def _loads_cache(cache_path):
+    registry = ToolRegistry(TOOL_MODULES, schema_cache_path=cache_path)
+    registry._load_disk_cache()
+    return "file_read" in registry._schemas
+
+
+def test_disk_cache_is_reused_when_nothing_changed(cache_path):
+    _cached_registry(cache_path)
+    assert _loads_cache(cache_path)
+
+
+def test_disk_cache_tracks_schema_env(cache_path, monkeypatch):
+    monkeypatch.setenv("SANDBOX_EXEC_TIMEOUT", "120")
+    _cached_registry(cache_path)
+    monkeypatch.setenv("SANDBOX_EXEC_TIMEOUT", "30")
+    assert not _loads_cache(cache_path)
+
+
+def test_disk_cache_tracks_dependency_modules(cache_path):
+    registry = _cached_registry(cache_path)
+    stamp = registry._module_stamp()
+    assert "tool.sandbox_listing" in stamp["modules"]
+
+    with open(cache_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["stamp"]["modules"]["tool.sandbox_listing"] -= 1
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert not _loads_cache(cache_path)
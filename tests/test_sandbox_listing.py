@@ -0,0 +1,54 @@
+# tests/test_sandbox_listing.py
+import pytest
+
+from tool import sandbox_tools
+from tool.sandbox_backend import LocalBackend
+from tool.sandbox_listing import ListEntry, ListingCache, listing_cache
+from tool.sandbox_pool import SandboxPool
+
+
+def test_cache_is_keyed_by_sandbox_and_expires(clock):
+    cache = ListingCache(ttl=10, clock=clock)
+    loads = []
+
+    def loader(tag):
+        def load():
+            loads.append(tag)
+            return [ListEntry(tag, "file", 1)]
+        return load
+
+    assert cache.get("t", "sbx-1", ".", 1, loader("a"))[0].rel == "a"
+    assert cache.get("t", "sbx-1", ".", 1, loader("b"))[0].rel == "a"
+    # 同一会话换了沙箱实例：不复用旧实例的列表
+    assert cache.get("t", "sbx-2", ".", 1, loader("c"))[0].rel == "c"
+    clock.now = 11
+    assert cache.get("t", "sbx-1", ".", 1, loader("d"))[0].rel == "d"
+    cache.invalidate("t")
+    assert cache.get("t", "sbx-1", ".", 1, loader("e"))[0].rel == "e"
+    assert loads == ["a", "c", "d", "e"]
+
+
+@pytest.fixture
+def local_pool(monkeypatch, tmp_path, clock):
+    backend = LocalBackend(base_dir=str(tmp_path), memory_limit_mb=None)
+    pool = SandboxPool(backend.create, size=0, idle_timeout=60, clock=clock, background=False)
+    monkeypatch.setattr(sandbox_tools, "_pool", pool)
+    listing_cache.invalidate()
+    yield pool, clock
+    pool.shutdown()
+    listing_cache.invalidate()
+
+
+def test_listing_is_not_served_from_a_reaped_sandbox(local_pool):
+    pool, clock = local_pool
+    config = {"configurable": {"thread_id": "t"}}
+
+    pool.lease("t").files.write("/old.txt", "x")
+    first = sandbox_tools.sandbox_list_files.invoke({"path": "/"}, config)
+    assert "old.txt" in first
+
+    # 空闲回收后同一会话拿到的是新实例，列表缓存不能再给出旧实例的文件
+    clock.now = 120
+    assert pool.maintain()["expired"] == 1
+    second = sandbox_tools.sandbox_list_files.invoke({"path": "/"}, config)
+    assert "old.txt" not in second
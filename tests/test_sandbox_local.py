@@ -0,0 +1,88 @@
+# tests/test_sandbox_local.py
+import os
+
+import pytest
+
+from tool.sandbox_backend import LocalBackend, SandboxBackend
+from tool.sandbox_exec import run_streaming
+from tool.sandbox_listing import list_entries
+from tool.sandbox_local import LocalSandbox
+
+
+def test_absolute_paths_map_under_root(sbx):
+    sbx.files.write("/data/a.txt", "hello")
+    assert os.path.isfile(os.path.join(sbx.root, "data", "a.txt"))
+    assert sbx.files.read("data/a.txt") == "hello"
+    assert sbx.files.read("/data/../data/a.txt") == "hello"
+    assert sbx.files.exists("/data")
+    assert sbx.host_path("/") == sbx.root
+
+
+@pytest.mark.parametrize("path", ["..", "../outside.txt", "/../outside.txt", "data/../../outside.txt"])
+def test_paths_escaping_root_are_rejected(sbx, path):
+    with pytest.raises(PermissionError):
+        sbx.files.write(path, "x")
+    assert not os.path.exists(os.path.join(os.path.dirname(sbx.root), "outside.txt"))
+
+
+def test_listing_reports_sandbox_paths(sbx):
+    sbx.files.write("/proj/src/main.py", "print(1)\n")
+    sbx.files.write("/proj/README.md", "# hi\n")
+
+    raw = sbx.files.list("/proj", depth=2)
+    assert sorted(e.path for e in raw) == ["/proj/README.md", "/proj/src", "/proj/src/main.py"]
+    for path in ("/proj", "proj"):
+        assert [e.rel for e in list_entries(sbx, path, 2)] == ["README.md", "src", "src/main.py"]
+
+
+def test_commands_run_in_root(sbx):
+    sbx.files.make_dir("/sub")
+    assert sbx.commands.run("pwd").stdout.strip() == sbx.root
+    assert sbx.commands.run("pwd", cwd="/sub").stdout.strip() == os.path.join(sbx.root, "sub")
+    with pytest.raises(PermissionError):
+        sbx.commands.run("pwd", cwd="/..")
+
+
+def test_run_code_returns_last_expression(sbx):
+    execution = sbx.run_code("x = 20\nx + 1")
+    assert [r.text for r in execution.results] == ["21"]
+    assert execution.error is None
+    # 语句、None 值都不产生结果
+    assert sbx.run_code("y = x").results == []
+    assert sbx.run_code("None").results == []
+
+    result = run_streaming(sbx, "print('out')\n{'x': x}", timeout=30)
+    assert result.stdout == "out\n"
+    assert result.results == ["{'x': 20}"]
+
+    # 内核的工作目录是 root
+    assert sbx.run_code("import os; os.getcwd()").results[0].text == repr(sbx.root)
+
+
+def test_backend_interface_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        SandboxBackend()
+
+    class Partial(SandboxBackend):
+        def create(self):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+    backend = LocalBackend(base_dir=str(tmp_path), memory_limit_mb=None)
+    sandbox = backend.create()
+    assert sandbox.run_code("1 + 1").results[0].text == "2"
+    backend.retire(sandbox)
+    assert not sandbox.is_running()
+    assert not os.path.exists(sandbox.root)
+
+
+def test_sandbox_ids_are_never_reused(tmp_path):
+    ids = set()
+    for _ in range(20):
+        # 上一个实例被回收后，id() 可能落在同一个地址上；sandbox_id 不能跟着重复
+        sandbox = LocalSandbox(str(tmp_path))
+        ids.add(sandbox.sandbox_id)
+        del sandbox
+    assert len(ids) == 20
@@ -0,0 +1,178 @@
+# tests/test_sandbox_pool.py
+import itertools
+
+import pytest
+
+from tool.sandbox_pool import SandboxPool, SandboxPoolFull
+
+
+class FakeSandbox:
+    def __init__(self, n: int):
+        self.sandbox_id = f"fake-{n}"
+        self.alive = True
+        self.killed = False
+
+    def is_running(self) -> bool:
+        return self.alive
+
+    def kill(self) -> None:
+        self.alive = False
+        self.killed = True
+
+
+@pytest.fixture
+def created():
+    return []
+
+
+def make_pool(clock, created, **kwargs):
+    counter = itertools.count(1)
+
+    def factory():
+        sbx = FakeSandbox(next(counter))
+        created.append(sbx)
+        return sbx
+
+    options = dict(size=1, max_sessions=4, idle_timeout=600, evict_after=60, clock=clock, background=False)
+    options.update(kwargs)
+    return SandboxPool(factory, **options)
+
+
+def test_lease_is_sticky_per_thread(clock, created):
+    pool = make_pool(clock, created)
+    a = pool.lease("thread-a")
+    assert pool.lease("thread-a") is a
+    b = pool.lease("thread-b")
+    assert b is not a
+    assert pool.sandbox_for("thread-a") is a
+    assert pool.sandbox_for("missing") is None
+
+
+def test_warm_spares_are_used_and_refilled(clock, created):
+    pool = make_pool(clock, created, size=2)
+    pool.maintain()
+    assert pool.stats()["idle"] == 2
+    spares = list(created)
+
+    sbx = pool.lease("t")
+    assert sbx is spares[0]
+    assert len(created) == 2  # 领的是预热实例，没有冷启动
+    pool.maintain()
+    assert pool.stats() == {"idle": 2, "leased": 1, "creating": 0}
+
+
+def test_maintain_replaces_dead_instances(clock, created):
+    pool = make_pool(clock, created)
+    leased = pool.lease("t")
+    pool.maintain()
+    spare = pool._idle[0]
+
+    spare.alive = False
+    leased.alive = False
+    report = pool.maintain()
+
+    assert report == {"dead_idle": 1, "dead_leased": 1, "expired": 0, "kept_alive": 0}
+    assert spare.killed and leased.killed
+    assert pool.stats()["idle"] == 1 and pool._idle[0].alive
+    replacement = pool.lease("t")
+    assert replacement is not leased and replacement.alive
+
+
+def test_idle_leases_are_reaped(clock, created):
+    pool = make_pool(clock, created, size=0)
+    sbx = pool.lease("t")
+    clock.advance(599)
+    assert pool.maintain()["expired"] == 0
+    clock.advance(1)
+    assert pool.maintain()["expired"] == 1
+    assert sbx.killed
+    assert pool.sandbox_for("t") is None
+
+
+def test_leases_in_use_are_not_reaped(clock, created):
+    pool = make_pool(clock, created, size=0)
+    with pool.using("t") as sbx:
+        clock.advance(3600)
+        assert pool.maintain()["expired"] == 0
+        assert not sbx.killed
+    # 用完之后重新计时
+    clock.advance(599)
+    assert pool.maintain()["expired"] == 0
+    clock.advance(1)
+    assert pool.maintain()["expired"] == 1
+
+
+def test_full_pool_only_evicts_idle_leases(clock, created):
+    pool = make_pool(clock, created, size=0, max_sessions=2)
+    a = pool.lease("a")
+    pool.lease("b")
+
+    # 都是刚用过的：拒绝，而不是杀掉别人的沙箱
+    with pytest.raises(SandboxPoolFull):
+        pool.lease("c")
+    assert not a.killed
+    assert len(created) == 2
+
+    with pool.using("a"), pool.using("b") as b:
+        clock.advance(120)
+        # 都在执行中：照样拒绝
+        with pytest.raises(SandboxPoolFull):
+            pool.lease("c")
+    # a 和 b 都结束了，但都是刚用完的
+    with pytest.raises(SandboxPoolFull):
+        pool.lease("c")
+
+    clock.advance(60)
+    with pool.using("b"):
+        c = pool.lease("c")
+    # 收回的是空闲的 a，执行中的 b 不受影响
+    assert a.killed and not b.killed
+    assert pool.sandbox_for("a") is None
+    assert pool.sandbox_for("c") is c
+
+
+def test_shutdown_hands_instances_to_retire(clock, created):
+    retired = []
+    pool = make_pool(clock, created, size=1, retire=retired.append)
+    leased = pool.lease("t")
+    pool.maintain()
+    spare = pool._idle[0]
+
+    pool.shutdown()
+
+    assert set(map(id, retired)) == {id(leased), id(spare)}
+    assert not leased.killed and not spare.killed
+    with pytest.raises(RuntimeError):
+        pool.lease("t")
+
+
+def test_shutdown_without_retire_kills_everything(clock, created):
+    pool = make_pool(clock, created, size=1)
+    pool.maintain()
+    pool.lease("t")
+    pool.maintain()
+    pool.shutdown()
+    assert created and all(s.killed for s in created)
+
+
+def test_maintain_keeps_spares_and_idle_leases_alive(clock, created):
+    kept = []
+    pool = make_pool(clock, created, idle_timeout=600, keepalive=kept.append, keepalive_interval=100)
+    leased = pool.lease("a")
+    pool.maintain()
+    spare = pool._idle[0]
+    assert kept == []
+
+    # 平台存活时间比 idle_timeout 短：空闲等待的预热实例和没过期的租约都要定期续期
+    clock.advance(100)
+    assert pool.maintain()["kept_alive"] == 2
+    assert set(kept) == {leased, spare}
+
+    clock.advance(50)
+    assert pool.maintain()["kept_alive"] == 0
+
+    # 过期回收的租约不再续期
+    clock.advance(500)
+    kept.clear()
+    pool.maintain()
+    assert leased.killed and leased not in kept and spare in kept
@@ -0,0 +1,113 @@
+# tests/test_sandbox_ppio.py
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from tool import sandbox_ppio
+
+
+class FakeSDK:
+    """只实现 create_sandbox / collect_garbage 用到的那几个类方法。"""
+
+    def __init__(self, paused):
+        self.paused = paused
+        self.connected = []
+        self.killed = []
+        self.created = 0
+        self.on_kill = None
+        self.states = {}
+        self.create_args = []
+
+    def connect(self, sandbox_id, timeout=None):
+        self.connected.append((sandbox_id, timeout))
+        return SimpleNamespace(sandbox_id=sandbox_id)
+
+    def get_info(self, sandbox_id):
+        return SimpleNamespace(sandbox_id=sandbox_id, state=self.states.get(sandbox_id, "paused"))
+
+    def kill(self, sandbox_id):
+        if self.on_kill:
+            self.on_kill(sandbox_id)
+        self.killed.append(sandbox_id)
+
+    def create(self, metadata=None, timeout=None, auto_pause=None):
+        self.created += 1
+        self.create_args.append((timeout, auto_pause))
+        return SimpleNamespace(sandbox_id=f"new-{self.created}")
+
+
+def _ago(hours):
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
+
+
+def _info(sandbox_id, age_hours, paused_hours=None):
+    # 没给暂停时间时，按启动后立即暂停处理
+    paused = _ago(age_hours if paused_hours is None else paused_hours)
+    return SimpleNamespace(sandbox_id=sandbox_id, started_at=_ago(age_hours), end_at=paused)
+
+
+@pytest.fixture
+def sdk(monkeypatch, tmp_path):
+    fake = FakeSDK([])
+    state = SimpleNamespace(PAUSED="paused")
+    monkeypatch.setattr(sandbox_ppio, "_sdk", lambda: (fake, None, state))
+    monkeypatch.setattr(sandbox_ppio, "PAUSED_AT_PATH", str(tmp_path / "paused_at.json"))
+    monkeypatch.setattr(sandbox_ppio, "SANDBOX_LIFETIME", 900)
+    monkeypatch.setattr(sandbox_ppio, "list_paused", lambda: sorted(fake.paused, key=sandbox_ppio._started_at, reverse=True))
+    monkeypatch.setattr(sandbox_ppio, "_claimed", set())
+    monkeypatch.setattr(sandbox_ppio, "PAUSED_TTL", 24 * 3600)
+    return fake
+
+
+def test_create_resumes_newest_unexpired_instance(sdk):
+    sdk.paused = [_info("old", 30), _info("fresh", 1)]
+    assert sandbox_ppio.create_sandbox().sandbox_id == "fresh"
+    # 另一个只剩过期实例：不恢复，新建
+    assert sandbox_ppio.create_sandbox().sandbox_id == "new-1"
+    # 新建和恢复都带上存活时间，新建的实例到期自动暂停
+    assert sdk.connected == [("fresh", 900)]
+    assert sdk.create_args == [(900, True)]
+
+
+def test_ttl_counts_from_pause_time(sdk):
+    # 两天前创建、一直在用、一小时前才暂停：不算过期
+    sdk.paused = [_info("long-lived", 48, paused_hours=1), _info("stale", 30)]
+    assert sandbox_ppio.collect_garbage(ttl=24 * 3600, keep=4) == ["stale"]
+
+    # 本机暂停的实例按记下的暂停时间算，不看 end_at
+    pausing = SimpleNamespace(sandbox_id="long-lived", pause=lambda: None)
+    sandbox_ppio.pause_sandbox(pausing)
+    sdk.paused = [_info("long-lived", 48, paused_hours=30)]
+    assert sandbox_ppio.collect_garbage(ttl=24 * 3600, keep=4) == []
+    assert sandbox_ppio.create_sandbox().sandbox_id == "long-lived"
+    assert sandbox_ppio._load_paused_at() == {}
+
+
+def test_gc_skips_instances_resumed_since_listing(sdk):
+    sdk.paused = [_info("resumed", 30), _info("expired", 30)]
+    sdk.states["resumed"] = "running"
+
+    assert sandbox_ppio.collect_garbage(ttl=24 * 3600, keep=4) == ["expired"]
+    assert sdk.killed == ["expired"]
+
+
+def test_gc_skips_claimed_and_reclaims_expired(sdk):
+    sdk.paused = [_info("in-use", 48), _info("expired", 30), _info("fresh", 1)]
+    sandbox_ppio._claimed.add("in-use")
+
+    assert sandbox_ppio.collect_garbage(ttl=24 * 3600, keep=4) == ["expired"]
+    assert sdk.killed == ["expired"]
+    assert sandbox_ppio._claimed == {"in-use"}
+
+
+def test_gc_claims_before_killing(sdk):
+    sdk.paused = [_info("mine", 1), _info("surplus", 2)]
+    sandbox_ppio._claimed.add("mine")
+    resumed = []
+    # 在 GC 杀实例的过程中并发地创建沙箱：不能恢复正在被回收的那个
+    sdk.on_kill = lambda sandbox_id: resumed.append(sandbox_ppio.create_sandbox().sandbox_id)
+
+    assert sandbox_ppio.collect_garbage(keep=1) == ["surplus"]
+    assert resumed == ["new-1"]
+    assert sdk.connected == []
@@ -0,0 +1,131 @@
+# tests/test_sandbox_sync.py
+import os
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from tool import sandbox_sync as sync
+
+
+@pytest.fixture
+def remote():
+    # 沙箱里的路径；LocalSandbox 把它映射到自己的根目录下
+    return "/work"
+
+
+def _tree(root, files):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def _read_tree(root):
+    out = {}
+    for d, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(d, name)
+            out[os.path.relpath(path, root).replace(os.sep, "/")] = open(path, "rb").read()
+    return out
+
+
+FILES = {
+    "main.py": b"print('hi')\n",
+    "pkg/__init__.py": b"",
+    "pkg/util.py": b"def f():\n    return 1\n",
+    "data/notes.txt": "中文内容\n".encode("utf-8"),
+}
+
+
+def test_upload_then_download_round_trips(tmp_path, sbx, remote):
+    src = tmp_path / "src"
+    _tree(src, FILES)
+
+    up = sync.upload(sbx, str(src), remote)
+    assert sorted(up.transferred) == sorted(FILES)
+    assert up.bytes_transferred == sum(len(v) for v in FILES.values())
+    assert _read_tree(sbx.host_path(remote)) == FILES
+
+    back = tmp_path / "back"
+    down = sync.download(sbx, remote, str(back))
+    assert sorted(down.transferred) == sorted(FILES)
+    assert _read_tree(back) == FILES
+
+
+def test_second_sync_moves_nothing(tmp_path, sbx, remote):
+    src, back = tmp_path / "src", tmp_path / "back"
+    _tree(src, FILES)
+    sync.upload(sbx, str(src), remote)
+    sync.download(sbx, remote, str(back))
+
+    up = sync.upload(sbx, str(src), remote)
+    down = sync.download(sbx, remote, str(back))
+    for report in (up, down):
+        assert report.transferred == []
+        assert report.bytes_transferred == 0
+        assert report.archives == 0 and report.chunks == 0
+        assert report.unchanged == len(FILES)
+
+    (src / "pkg/util.py").write_bytes(b"def f():\n    return 2\n")
+    up = sync.upload(sbx, str(src), remote)
+    assert up.transferred == ["pkg/util.py"]
+
+
+def test_ignored_files_are_not_uploaded(tmp_path, sbx, remote):
+    src = tmp_path / "src"
+    _tree(src, {
+        ".gitignore": b"*.log\nbuild/\n",
+        "keep.py": b"x = 1\n",
+        "debug.log": b"noise\n",
+        "build/out.bin": b"\0" * 10,
+        "node_modules/dep/index.js": b"module.exports = 1\n",
+        "__pycache__/keep.cpython-311.pyc": b"\0",
+    })
+    (src / ".git").mkdir()
+
+    report = sync.upload(sbx, str(src), remote)
+
+    assert sorted(report.transferred) == [".gitignore", "keep.py"]
+    assert sorted(_read_tree(sbx.host_path(remote))) == [".gitignore", "keep.py"]
+
+
+def test_large_files_are_chunked(tmp_path, sbx, remote, monkeypatch):
+    monkeypatch.setattr(sync, "LARGE_FILE_BYTES", 1024)
+    monkeypatch.setattr(sync, "CHUNK_BYTES", 300)
+    big = os.urandom(2000)
+    src = tmp_path / "src"
+    _tree(src, {"big.bin": big, "small.txt": b"small\n"})
+
+    up = sync.upload(sbx, str(src), remote)
+    assert up.chunks == 7  # ceil(2000 / 300)
+    assert up.archives == 1  # small.txt 走 tar 包
+    assert _read_tree(sbx.host_path(remote)) == {"big.bin": big, "small.txt": b"small\n"}
+
+    back = tmp_path / "back"
+    down = sync.download(sbx, remote, str(back))
+    assert down.chunks >= 1
+    assert (back / "big.bin").read_bytes() == big
+
+
+def test_download_never_deletes_local_files(tmp_path, sbx, remote):
+    sbx.files.make_dir(remote)
+    back = tmp_path / "back"
+    _tree(back, {"work.py": b"precious\n"})
+
+    report = sync.download(sbx, remote, str(back))
+
+    assert report.transferred == [] and report.deleted == []
+    assert (back / "work.py").read_bytes() == b"precious\n"
+
+
+def test_remote_manifest_drops_escaping_paths():
+    listing = {
+        "ok/file.txt": ["a" * 64, 1],
+        "../outside.txt": ["b" * 64, 2],
+        "nested/../../outside.txt": ["c" * 64, 3],
+        "/etc/passwd": ["d" * 64, 4],
+    }
+    fake = SimpleNamespace(commands=SimpleNamespace(run=lambda cmd: SimpleNamespace(stdout=json.dumps(listing))))
+
+    assert sync.remote_manifest(fake, "/work") == {"ok/file.txt": ("a" * 64, 1)}
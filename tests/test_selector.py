@@ -0,0 +1,28 @@
+# tests/test_selector.py
+import pytest
+
+from tool.registry import TOOL_MODULES, ToolRegistry
+from tool.selector import CORE_TOOLS, ToolSelector
+
+
+@pytest.fixture(scope="module")
+def selector():
+    return ToolSelector(ToolRegistry(TOOL_MODULES, schema_cache_path=None), top_k=4)
+
+
+@pytest.mark.parametrize("query", [
+    "列出 workspace 目录下的所有文件",
+    "帮我把这个视频转成 gif",
+    "你好",
+])
+def test_core_tools_are_always_bound(selector, query):
+    chosen = selector.select(query)
+    assert set(CORE_TOOLS) <= set(chosen)
+
+
+def test_selection_is_a_subset_in_registry_order(selector):
+    chosen = selector.select("把结果上传到沙箱里运行", required=["tool_output_page"])
+    names = selector.registry.names()
+    assert len(chosen) < len(names)
+    assert "sandbox_sync" in chosen and "tool_output_page" in chosen
+    assert list(chosen) == [n for n in names if n in chosen]
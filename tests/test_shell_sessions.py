@@ -0,0 +1,88 @@
+# tests/test_shell_sessions.py
+import threading
+import time
+
+import pytest
+
+from tool.session_registry import SessionLimitError
+from tool.shell_sessions import ShellSessionRegistry, check_syntax
+
+
+@pytest.fixture
+def registry(tmp_path):
+    reg = ShellSessionRegistry(idle_timeout=0, max_sessions=2, cwd=str(tmp_path))
+    yield reg
+    reg.shutdown()
+
+
+def test_state_persists_between_commands(registry, tmp_path):
+    (tmp_path / "sub").mkdir()
+    assert registry.run("a", "cd sub && export GREETING=hi").exit_code == 0
+    result = registry.run("a", "pwd; echo $GREETING")
+    assert result.status == "ok"
+    assert result.output.splitlines() == [str(tmp_path / "sub"), "hi"]
+    # 另一个 key 是独立的 shell
+    assert registry.run("b", "pwd").output.strip() == str(tmp_path)
+
+
+def test_exit_code_and_output_are_reported(registry):
+    result = registry.run("a", "echo out; echo err >&2; false")
+    assert result.status == "ok"
+    assert result.exit_code == 1
+    assert result.output.splitlines() == ["out", "err"]
+
+
+def test_syntax_error_leaves_session_untouched(registry, tmp_path):
+    registry.run("a", "cd / && export KEEP=1")
+    start = time.monotonic()
+    result = registry.run("a", 'echo "unterminated', timeout=10)
+    assert time.monotonic() - start < 5
+    assert result.status == "syntax_error"
+    assert "unexpected EOF" in result.output
+    assert registry.run("a", "pwd; echo $KEEP").output.splitlines() == ["/", "1"]
+
+
+def test_check_syntax_accepts_valid_commands():
+    assert check_syntax("for i in 1 2; do echo $i; done") is None
+    assert check_syntax("cat <<EOF\nhello\nEOF") is None
+    assert check_syntax("if true; then echo x") is not None
+
+
+def test_timeout_kills_only_that_session(registry):
+    registry.run("b", "export B=1")
+    result = registry.run("a", "sleep 5", timeout=0.5)
+    assert result.status == "timeout"
+    assert registry.keys() == ["b"]
+    assert registry.run("b", "echo $B").output.strip() == "1"
+
+
+def test_full_registry_never_evicts_the_new_or_busy_sessions(tmp_path):
+    registry = ShellSessionRegistry(idle_timeout=0, max_sessions=1, cwd=str(tmp_path))
+    try:
+        busy = threading.Thread(target=registry.run, args=("a", "sleep 1"))
+        busy.start()
+        while not (registry.keys() and registry._sessions["a"].lock.locked()):
+            time.sleep(0.01)
+
+        with pytest.raises(SessionLimitError):
+            registry.run("b", "echo b")
+        assert registry.keys() == ["a"]
+
+        busy.join()
+        assert registry.run("b", "echo b").output.strip() == "b"
+        assert registry.keys() == ["b"]
+    finally:
+        registry.shutdown()
+
+
+def test_idle_sessions_are_reaped(tmp_path):
+    registry = ShellSessionRegistry(idle_timeout=60, max_sessions=4, cwd=str(tmp_path))
+    try:
+        registry.run("a", "true")
+        session = registry._sessions["a"]
+        assert registry.reap(now=time.monotonic()) == 0
+        assert registry.reap(now=time.monotonic() + 61) == 1
+        assert session.closed and not session.alive()
+        assert registry.keys() == []
+    finally:
+        registry.shutdown()
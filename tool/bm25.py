@@ -0,0 +1,92 @@
+# tool/bm25.py
+import re
+import math
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List
+
+# 英文/数字按词切分（下划线也当分隔符，file_read -> file, read）；中日韩文字按单字 + 相邻二字切分
+_WORD_RE = re.compile(r"[a-z0-9]+|[㐀-䶿一-鿿豈-﫿]+")
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+
+
+def tokenize(text: str, unigrams: bool = True) -> List[str]:
+    """
+    轻量分词，不依赖分词库：英文小写单词；中文连续片段拆成相邻二字组合，
+    unigrams=True 时再加上单字（召回更高，但单字噪声也更大）。
+    """
+    tokens: List[str] = []
+    for piece in _WORD_RE.findall(text.lower()):
+        if _CJK_RE.match(piece):
+            if unigrams or len(piece) == 1:
+                tokens.extend(piece)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+class BM25Index:
+    """
+    支持增量增删文档的 BM25 倒排索引。
+    文档 id 可以是任意可哈希对象；重复 add 同一个 id 会先移除旧内容。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_len: Dict[Hashable, int] = {}
+        self.doc_terms: Dict[Hashable, List[str]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.doc_len
+
+    def add(self, doc_id: Hashable, tokens: Iterable[str]) -> None:
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        counts = Counter(tokens)
+        length = sum(counts.values())
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_len[doc_id] = length
+        self.doc_terms[doc_id] = list(counts)
+        self._total_len += length
+
+    def remove(self, doc_id: Hashable) -> None:
+        length = self.doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_len -= length
+        for term in self.doc_terms.pop(doc_id, ()):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+
+    def idf(self, term: str) -> float:
+        n = len(self.doc_len)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, query_tokens: Iterable[str]) -> Dict[Hashable, float]:
+        """
+        对包含任一查询词的文档打分，返回 {doc_id: score}（不含零分文档）。
+        """
+        if not self.doc_len:
+            return {}
+        avg_len = self._total_len / len(self.doc_len) or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in set(query_tokens):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return scores
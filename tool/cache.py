@@ -0,0 +1,137 @@
+# tool/cache.py
+import os
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class ToolResultCache:
+    """
+    幂等工具的结果缓存（进程内 LRU）。
+    - 条目数和总字节数都有上限，超出时淘汰最久未使用的条目；
+    - 每个条目可以关联若干文件路径，写文件时按路径失效；
+    - 按工具统计命中 / 未命中次数。
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int, Tuple[str, ...]]]" = OrderedDict()
+        self._by_path: Dict[str, set] = {}
+        self._bytes = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, tool_name: str, field: str) -> None:
+        self._stats.setdefault(tool_name, {"hits": 0, "misses": 0})[field] += 1
+
+    def get(self, tool_name: str, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get((tool_name, key))
+            if entry is None:
+                self._count(tool_name, "misses")
+                return False, None
+            self._entries.move_to_end((tool_name, key))
+            self._count(tool_name, "hits")
+            return True, entry[0]
+
+    def put(self, tool_name: str, key: Hashable, value: Any, paths: Iterable[str] = ()) -> None:
+        size = len(value) if isinstance(value, (str, bytes)) else 64
+        if size > self.max_bytes:
+            return
+        paths = tuple(_normalize_path(p) for p in paths)
+        with self._lock:
+            self._remove((tool_name, key))
+            self._entries[(tool_name, key)] = (value, size, paths)
+            self._bytes += size
+            for p in paths:
+                self._by_path.setdefault(p, set()).add((tool_name, key))
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, full_key: Tuple[str, Hashable]) -> None:
+        entry = self._entries.pop(full_key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        for p in entry[2]:
+            keys = self._by_path.get(p)
+            if keys is not None:
+                keys.discard(full_key)
+                if not keys:
+                    del self._by_path[p]
+
+    def invalidate_path(self, path: str) -> int:
+        """
+        让与该路径关联的所有缓存条目失效，返回失效的条目数。
+        """
+        with self._lock:
+            keys = list(self._by_path.get(_normalize_path(path), ()))
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def invalidate_tool(self, tool_name: str) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == tool_name]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_path.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "tools": {name: dict(s) for name, s in self._stats.items()},
+            }
+
+
+def _normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.realpath(path))
+
+
+# 全局共享的工具结果缓存
+tool_cache = ToolResultCache()
+
+
+def idempotent(
+    key_fn: Callable[..., Optional[Hashable]],
+    paths_fn: Optional[Callable[..., Iterable[str]]] = None,
+    cache: ToolResultCache = tool_cache,
+):
+    """
+    把一个工具函数标记为幂等并缓存其结果。
+    key_fn 与工具函数参数相同，返回缓存键；返回 None 表示这次调用不走缓存。
+    paths_fn 返回结果依赖的文件路径，用于写文件时失效。
+    需要放在 @tool 装饰器的下面（先包装函数，再注册为工具）。
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = key_fn(*args, **kwargs)
+            except Exception:
+                key = None
+            if key is None:
+                return func(*args, **kwargs)
+            hit, value = cache.get(name, key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            paths = paths_fn(*args, **kwargs) if paths_fn else ()
+            cache.put(name, key, value, paths)
+            return value
+
+        return wrapper
+
+    return decorator
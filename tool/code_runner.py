@@ -0,0 +1,507 @@
+# tool/code_runner.py
+import os
+import io
+import ast
+import sys
+import math
+import signal
+import time
+import queue
+import atexit
+import threading
+import traceback
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .session_registry import Session, SessionLimitError, SessionRegistry
+
+try:
+    import resource  # 仅 POSIX 可用；Windows 上不设置 rlimit
+except ImportError:  # pragma: no cover
+    resource = None
+
+# forkserver 进程预先导入的常用模块：worker 从它 fork 出来，用户代码里 import 这些模块几乎零开销
+COMMON_PRELOAD = [
+    "json", "math", "re", "random", "datetime", "collections", "itertools",
+    "functools", "statistics", "decimal", "fractions", "string", "textwrap",
+]
+
+# 单次调用捕获输出的上限（字符数），防止失控的 print 把管道和提示词撑爆
+MAX_CAPTURE_CHARS = 1_000_000
+
+
+@dataclass
+class ExecResult:
+    """
+    一次代码执行的结构化结果。status: ok / error / timeout / crashed
+    """
+    status: str
+    stdout: str = ""
+    stderr: str = ""
+    error: Optional[str] = None
+    duration: float = 0.0
+    memory_mb: float = 0.0  # 执行结束时 worker 的常驻内存（RSS），会话内核据此判断是否需要回收
+    results: List[str] = field(default_factory=list)  # 请求带 results=True 时：最后一个表达式的值（repr）
+
+
+# --- worker 进程 ---
+
+class _CaptureStream(io.TextIOBase):
+    """
+    worker 内替换 sys.stdout / sys.stderr：累积输出，需要时把每段输出实时发回父进程。
+    """
+
+    def __init__(self, conn, name: str, stream: bool):
+        self.conn = conn
+        self.name = name
+        self.stream = stream
+        self.parts: List[str] = []
+        self.size = 0
+        self.truncated = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if not s:
+            return 0
+        if self.size < MAX_CAPTURE_CHARS:
+            piece = s[: MAX_CAPTURE_CHARS - self.size]
+            self.parts.append(piece)
+            self.size += len(piece)
+            if self.stream:
+                self.conn.send((self.name, piece))
+        else:
+            self.truncated = True
+        return len(s)
+
+    def getvalue(self) -> str:
+        value = "".join(self.parts)
+        if self.truncated:
+            value += f"\n[输出超过 {MAX_CAPTURE_CHARS} 字符，已截断]"
+        return value
+
+
+def _set_cpu_limit(seconds: Optional[int]) -> None:
+    if resource is None or not seconds:
+        return
+    # RLIMIT_CPU 是进程累计值：在已用 CPU 时间基础上再放宽 seconds 秒
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _cpu_limit_for(timeout: float) -> int:
+    # CPU 时间不可能超过墙钟时间：按本次调用的超时放宽，多留 1 秒余量
+    return math.ceil(timeout) + 1
+
+
+def _rss_mb() -> float:
+    """
+    当前进程的常驻内存（MB）。优先读 /proc/self/statm（当前值），否则退回 ru_maxrss（峰值）。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 的单位是字节，Linux 上是 KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _compile_request(source: str, want_result: bool):
+    """
+    编译要执行的代码；want_result=True 且最后一条语句是表达式时，把它拆出来单独 eval，
+    像 Jupyter 一样取到它的值。返回 (语句部分, 最后的表达式或 None)。
+    """
+    tree = ast.parse(source, "<code_exec>", "exec")
+    last = None
+    if want_result and tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = compile(ast.Expression(tree.body.pop().value), "<code_exec>", "eval")
+    return compile(tree, "<code_exec>", "exec"), last
+
+
+def _run_request(conn, request: Dict[str, Any], namespace: Dict[str, Any]) -> Dict[str, Any]:
+    stdout = _CaptureStream(conn, "stdout", request.get("stream", False))
+    stderr = _CaptureStream(conn, "stderr", request.get("stream", False))
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr
+    error = None
+    results: List[str] = []
+    start = time.perf_counter()
+    try:
+        _set_cpu_limit(request.get("cpu_limit"))
+        # 只在执行用户代码期间响应 SIGINT：中断当前代码（KeyboardInterrupt），worker 和变量保留
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        body, last = _compile_request(request["code"], request.get("results", False))
+        exec(body, namespace)
+        if last is not None:
+            value = eval(last, namespace)
+            if value is not None:
+                results.append(repr(value))
+    except BaseException as e:  # noqa: BLE001 —— 用户代码的任何异常（含 SystemExit）都只影响本次调用
+        error = f"{type(e).__name__}: {e}"
+        # 跳过 worker 自身的栈帧，只保留用户代码的 traceback
+        stderr.write("".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)))
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+    return {
+        "status": "error" if error else "ok",
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "error": error,
+        "duration": time.perf_counter() - start,
+        "memory_mb": _rss_mb(),
+        "results": results,
+    }
+
+
+def _worker_main(conn, memory_limit_mb: Optional[int], persistent: bool = False) -> None:
+    """
+    worker 主循环：每收到一个请求就执行一段代码，把结果发回去。
+    persistent=False 时每次都用全新的命名空间；True 时（会话内核）全局变量在多次调用间保留，
+    请求里带 reset=True 时先清空。
+    """
+    # 空闲时忽略 SIGINT：终端里按 Ctrl-C 会发给整个进程组，不能把等在 recv() 上的 worker 打死
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    namespace = None
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        if not persistent or request.get("reset") or namespace is None:
+            namespace = {"__name__": "__main__"}
+        result = _run_request(conn, request, namespace)
+        conn.send(("done", result))
+
+
+# --- 父进程侧的进程池 ---
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    def kill(self) -> None:
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+
+def _exchange(
+    worker: _Worker,
+    request: Dict[str, Any],
+    timeout: float,
+    on_output: Optional[Callable[[str, str], None]] = None,
+    start: Optional[float] = None,
+) -> Tuple[ExecResult, bool]:
+    """
+    把一个请求发给 worker 并收集结果，返回 (结果, worker 是否还能继续用)。
+    超时或 worker 异常退出时第二项为 False，由调用方负责 kill / 替换。
+    """
+    start = time.perf_counter() if start is None else start
+    deadline = start + timeout
+    chunks = {"stdout": [], "stderr": []}
+    try:
+        worker.conn.send(request)
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not worker.conn.poll(remaining):
+                return ExecResult(
+                    status="timeout",
+                    stdout="".join(chunks["stdout"]),
+                    stderr="".join(chunks["stderr"]),
+                    error=f"TimeoutError: 执行超过 {timeout}s，已终止",
+                    duration=time.perf_counter() - start,
+                ), False
+            kind, payload = worker.conn.recv()
+            if kind == "done":
+                return ExecResult(**payload), True
+            chunks[kind].append(payload)
+            if on_output is not None:
+                on_output(kind, payload)
+    except (EOFError, OSError, BrokenPipeError):
+        # worker 异常退出：超出 CPU / 内存限制被系统杀掉，或用户代码调用了 os._exit 等
+        worker.process.join(timeout=1)
+        exitcode = worker.process.exitcode
+        return ExecResult(
+            status="crashed",
+            stdout="".join(chunks["stdout"]),
+            stderr="".join(chunks["stderr"]),
+            error=f"WorkerCrashed: 执行进程异常退出（exitcode={exitcode}），可能超出了 CPU 或内存限制",
+            duration=time.perf_counter() - start,
+        ), False
+
+
+def _spawn_worker(ctx, memory_limit_mb: Optional[int], persistent: bool = False, name: str = "code-exec-worker") -> _Worker:
+    parent_conn, child_conn = ctx.Pipe()
+    process = ctx.Process(
+        target=_worker_main,
+        args=(child_conn, memory_limit_mb, persistent),
+        daemon=True,
+        name=name,
+    )
+    process.start()
+    child_conn.close()
+    return _Worker(process, parent_conn)
+
+
+def _stop_worker(worker: _Worker) -> None:
+    try:
+        worker.conn.send(None)
+    except (OSError, BrokenPipeError):
+        pass
+    worker.kill()
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        # '__main__' 也预加载：worker 从 forkserver fork 出来后不必各自再导入一遍主模块
+        ctx.set_forkserver_preload(["__main__", __name__] + COMMON_PRELOAD)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class CodeExecutorPool:
+    """
+    预热的代码执行进程池：
+    - 启动时就准备好 size 个空闲 worker（POSIX 上经 forkserver fork，常用模块已预导入）；
+    - 每次调用独立的墙钟超时、CPU 时间和内存 rlimit，stdout/stderr 分别捕获；
+      CPU 时间上限默认按本次调用的超时推出（cpu_limit 显式给定时用固定值）；
+    - 超时或崩溃的 worker 直接 kill，后台补一个新的，不影响其他调用。
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        timeout: float = 30,
+        cpu_limit: Optional[int] = None,
+        memory_limit_mb: Optional[int] = 2048,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = _mp_context()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        return _spawn_worker(self._ctx, self.memory_limit_mb)
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        if self._closed:
+            return
+
+        def refill():
+            if not self._closed:
+                self._idle.put(self._spawn())
+
+        threading.Thread(target=refill, daemon=True, name="code-exec-refill").start()
+
+    def run(
+        self,
+        code: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], None]] = None,
+    ) -> ExecResult:
+        """
+        在空闲 worker 中执行 code。on_output(stream_name, text) 非空时实时回调输出片段。
+        """
+        if self._closed:
+            raise RuntimeError("CodeExecutorPool 已关闭")
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return ExecResult(status="timeout", error=f"等待空闲 worker 超过 {timeout}s", duration=timeout)
+
+        cpu_limit = self.cpu_limit or _cpu_limit_for(timeout)
+        request = {"code": code, "cpu_limit": cpu_limit, "stream": on_output is not None}
+        result, reusable = _exchange(worker, request, timeout, on_output, start)
+        if reusable:
+            self._idle.put(worker)
+        else:
+            self._replace(worker)
+        return result
+
+    def shutdown(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            _stop_worker(worker)
+
+
+# --- 会话级持久内核 ---
+
+class _Kernel(Session):
+    def __init__(self, worker: _Worker):
+        super().__init__()  # lock：同一会话的调用串行执行，共享同一份全局变量
+        self.worker = worker
+
+
+class SessionKernelManager(SessionRegistry[_Kernel]):
+    """
+    按会话（session_id，一般是对话的 thread_id）维护常驻的 Python 内核：
+    - 同一会话的多次 code_exec 共享全局变量，import 过的模块、读进来的数据不必每步重来；
+    - 空闲超过 idle_timeout 秒、或执行后常驻内存超过 max_memory_mb 的内核会被回收；
+    - 会话数达到 max_sessions 时回收最久未使用的空闲内核，其余都在执行中时返回错误（见 SessionRegistry）；
+    - 超时 / 崩溃的内核直接 kill，下次调用自动新建（状态丢失，会在输出里提示）。
+    """
+
+    closed_message = "SessionKernelManager 已关闭"
+    reaper_name = "code-exec-reaper"
+
+    def __init__(
+        self,
+        timeout: float = 30,
+        cpu_limit: Optional[int] = None,
+        memory_limit_mb: Optional[int] = 2048,
+        max_memory_mb: float = 1024,
+        idle_timeout: float = 600,
+        max_sessions: int = 8,
+        reap_interval: float = 30,
+    ):
+        super().__init__(idle_timeout=idle_timeout, max_sessions=max_sessions, reap_interval=reap_interval)
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.max_memory_mb = max_memory_mb
+        self._ctx = _mp_context()
+
+    def _create(self) -> _Kernel:
+        return _Kernel(_spawn_worker(self._ctx, self.memory_limit_mb, persistent=True, name="code-exec-kernel"))
+
+    def _terminate(self, kernel: _Kernel) -> None:
+        _stop_worker(kernel.worker)
+
+    def _usable(self, kernel: _Kernel) -> bool:
+        return not kernel.closed and kernel.worker.process.is_alive()
+
+    def sessions(self) -> List[str]:
+        return self.keys()
+
+    def run(
+        self,
+        session_id: str,
+        code: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], None]] = None,
+        reset: bool = False,
+    ) -> ExecResult:
+        """
+        在 session_id 对应的内核里执行 code；reset=True 时先清空该会话的全局变量。
+        """
+        timeout = timeout or self.timeout
+        while True:
+            try:
+                kernel = self._acquire(session_id)
+            except SessionLimitError as e:
+                return ExecResult(status="error", error=f"SessionLimitError: {e}")
+            with kernel.lock:
+                if kernel.closed:
+                    # 拿到锁之前被回收了，重新取一个
+                    continue
+                request = {
+                    "code": code,
+                    "cpu_limit": self.cpu_limit or _cpu_limit_for(timeout),
+                    "stream": on_output is not None,
+                    "reset": reset,
+                }
+                result, reusable = _exchange(kernel.worker, request, timeout, on_output)
+                kernel.last_used = time.monotonic()
+                if not reusable:
+                    self.discard(session_id, kernel)
+                    result.stderr += "\n[会话内核已终止，之前定义的变量已丢失；下次调用将从空白状态开始]"
+                elif self.max_memory_mb and result.memory_mb > self.max_memory_mb:
+                    self.discard(session_id, kernel)
+                    result.stderr += (
+                        f"\n[会话内核内存 {result.memory_mb:.0f}MB 超过阈值 {self.max_memory_mb:.0f}MB，已回收；"
+                        "下次调用将从空白状态开始]"
+                    )
+                return result
+
+    def reset(self, session_id: str) -> bool:
+        """
+        丢弃会话的内核（下次调用重新创建），返回之前是否存在。
+        """
+        with self._lock:
+            kernel = self._sessions.get(session_id)
+        if kernel is None:
+            return False
+        with kernel.lock:
+            self.discard(session_id, kernel)
+        return True
+
+
+_pool: Optional[CodeExecutorPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_code_pool() -> CodeExecutorPool:
+    """
+    懒加载 + 单例：第一次执行代码时创建进程池，之后所有调用共享。
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CodeExecutorPool(
+                    size=int(os.getenv("CODE_EXEC_WORKERS", "2")),
+                    timeout=float(os.getenv("CODE_EXEC_TIMEOUT", "30")),
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+_kernels: Optional[SessionKernelManager] = None
+
+
+def get_kernel_manager() -> SessionKernelManager:
+    """
+    懒加载 + 单例：会话内核管理器，第一次有带 thread_id 的 code_exec 调用时创建。
+    """
+    global _kernels
+    if _kernels is None:
+        with _pool_lock:
+            if _kernels is None:
+                _kernels = SessionKernelManager(
+                    timeout=float(os.getenv("CODE_EXEC_TIMEOUT", "30")),
+                    max_memory_mb=float(os.getenv("CODE_KERNEL_MAX_MEMORY_MB", "1024")),
+                    idle_timeout=float(os.getenv("CODE_KERNEL_IDLE_TIMEOUT", "600")),
+                    max_sessions=int(os.getenv("CODE_KERNEL_MAX_SESSIONS", "8")),
+                )
+                atexit.register(_kernels.shutdown)
+    return _kernels
@@ -0,0 +1,167 @@
+# tool/file_edit.py
+import os
+import re
+import tempfile
+from typing import List, Optional, Tuple
+
+from .file_index import detect_encoding
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """unified diff 格式不对，或者某个 hunk 在文件里找不到对应位置。"""
+
+
+def read_text(path: str) -> Tuple[str, str]:
+    """
+    读取现有文件，返回 (文本, 编码)；编码与 file_read 的探测规则一致，写回时沿用，避免把 GBK 等文件转成 UTF-8。
+    文件不存在时返回 ("", "utf-8")：新文件按 UTF-8 写。
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return "", "utf-8"
+    encoding = detect_encoding(data, complete=True)
+    return data.decode(encoding, errors="replace"), encoding
+
+
+def atomic_write(path: str, text: str, encoding: str = "utf-8") -> None:
+    """
+    先写同目录下的临时文件再 os.replace 覆盖目标：任何时刻读到的都是完整的旧文件或完整的新文件。
+    已存在的文件保留原来的权限位。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        # newline="" 原样写出换行符，不做平台转换
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _newline_of(text: str) -> str:
+    return "\r\n" if "\r\n" in text else "\n"
+
+
+def replace_lines(original: str, start: int, end: int, content: str) -> str:
+    """
+    用 content 替换第 start..end 行（1 起，含两端）。end = start - 1 表示不删除任何行，在第 start 行前插入。
+    """
+    lines = original.splitlines(keepends=True)
+    if not 1 <= start <= len(lines) + 1:
+        raise ValueError(f"start_line {start} is out of range (file has {len(lines)} lines)")
+    if not start - 1 <= end <= len(lines):
+        raise ValueError(f"end_line {end} is out of range (start_line {start}, file has {len(lines)} lines)")
+    if content and not content.endswith(("\n", "\r")) and end < len(lines):
+        # 替换的不是文件末尾：补上换行，避免和下一行粘在一起
+        content += _newline_of(original)
+    return "".join(lines[:start - 1]) + content + "".join(lines[end:])
+
+
+def _parse_hunks(diff: str) -> List[Tuple[int, List[Tuple[str, str]]]]:
+    """
+    解析出 [(hunk 在原文件中的 0 起始位置, [(标记, 行文本)])]。
+    """
+    hunks: List[Tuple[int, List[Tuple[str, str]]]] = []
+    body: Optional[List[Tuple[str, str]]] = None
+    lines = diff.splitlines()
+    for i, line in enumerate(lines):
+        match = _HUNK_RE.match(line)
+        if match:
+            body = []
+            old_start, old_count = int(match.group(1)), int(match.group(2) or 1)
+            # 不删除任何行的 hunk（-a,0）表示插在第 a 行之后，其余 hunk 从第 a 行开始
+            hunks.append((old_start if old_count == 0 else old_start - 1, body))
+            continue
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            # 文件头（diff --git / --- / +++）不属于任何 hunk
+            body = None
+        if body is None:
+            continue
+        if line.startswith("\\"):
+            body.append(("\\", ""))
+        elif line[:1] in (" ", "-", "+"):
+            body.append((line[0], line[1:]))
+        elif line == "":
+            # 有些生成器会去掉空上下文行前面的空格；hunk 末尾的这种空行多半只是多余的换行，下面去掉
+            body.append(("~", ""))
+        else:
+            raise PatchError(f"unexpected line in hunk: {line!r}")
+    for _, body in hunks:
+        while body and body[-1][0] == "~":
+            body.pop()
+        body[:] = [(" " if tag == "~" else tag, text) for tag, text in body]
+    if not hunks:
+        raise PatchError("no hunks found; expected a unified diff with '@@ -a,b +c,d @@' headers")
+    return hunks
+
+
+def _locate(lines: List[str], old: List[str], expected: int, lo: int) -> Optional[int]:
+    """
+    在 lines[lo:] 里找与 old 逐行相同（忽略行尾换行符差异）的位置，从 expected 开始向两侧搜索。
+    """
+    hi = len(lines) - len(old)
+    if hi < lo:
+        return None
+    expected = min(max(expected, lo), hi)
+    stripped_old = [s.rstrip("\r\n") for s in old]
+
+    def matches(pos: int) -> bool:
+        return all(lines[pos + i].rstrip("\r\n") == s for i, s in enumerate(stripped_old))
+
+    for delta in range(0, max(expected - lo, hi - expected) + 1):
+        for pos in (expected - delta, expected + delta):
+            if lo <= pos <= hi and matches(pos):
+                return pos
+    return None
+
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """
+    把单文件的 unified diff 应用到 original 上。hunk 按顺序应用，
+    行号偏了也能在附近找到上下文；找不到时抛 PatchError，原文件不会被修改。
+    """
+    lines = original.splitlines(keepends=True)
+    newline = _newline_of(original)
+    out: List[str] = []
+    cursor = 0
+    shift = 0  # 前面的 hunk 实际位置与声明行号的偏差
+    for number, (start, body) in enumerate(_parse_hunks(diff), 1):
+        old = [text for tag, text in body if tag in (" ", "-")]
+        pos = _locate(lines, old, start + shift, cursor)
+        if pos is None:
+            raise PatchError(f"hunk #{number} (near line {start + 1}) does not match the current file content")
+        shift = pos - start
+        out.extend(lines[cursor:pos])
+        i = pos
+        last_tag = None
+        for tag, text in body:
+            if tag == " ":
+                out.append(lines[i])
+                i += 1
+            elif tag == "-":
+                i += 1
+            elif tag == "+":
+                out.append(text + newline)
+            elif tag == "\\" and last_tag == "+":
+                # "\ No newline at end of file" 紧跟在新增行后：这一行不带换行符
+                out[-1] = out[-1].rstrip("\r\n")
+            last_tag = tag
+        cursor = i
+    out.extend(lines[cursor:])
+    return "".join(out)
@@ -0,0 +1,216 @@
+# tool/file_index.py
+import os
+import re
+import mmap
+import codecs
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# 编码探测只看文件开头这么多字节
+SAMPLE_BYTES = 64 * 1024
+# 行偏移索引是稀疏的：每隔这么多行记一个起始偏移，内存占用约为 行数 / 128 * 8 字节
+CHECKPOINT_EVERY = 128
+# 追加写检测：比较已索引区域末尾这么多字节的摘要
+TAIL_CHECK_BYTES = 4096
+
+# 行结束符与文本模式 open() 的通用换行一致：\r\n、单独的 \r、\n（不含 \x0b、\u2028 等 splitlines 额外认的分隔符）
+_NEWLINE = re.compile(b"\r\n?|\n")
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_encoding(sample: bytes, complete: bool = False) -> str:
+    """
+    根据文件开头的字节样本判断编码：BOM > utf-8 > gbk > latin-1（latin-1 能解码任意字节）。
+    complete=False 表示样本可能在多字节字符中间被截断，末尾的半个字符不算错误。
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    for encoding in ("utf-8", "gbk"):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+@dataclass
+class LineRange:
+    text: str
+    start: int        # 实际返回的第一行（1 起）
+    end: int          # 实际返回的最后一行
+    total: Optional[int]  # 文件总行数；只读了开头一部分、还不知道时为 None
+
+
+class LineIndex:
+    """
+    单个文件的稀疏行偏移索引，按需增量扩展：
+    - 读前 50 行只扫描到第 51 行，不会扫描整个文件；
+    - 之后读更靠后的范围时从上次扫描停下的位置继续；
+    - 文件只是在末尾追加了内容（日志）时保留已有索引，只扫描新增部分。
+    """
+
+    def __init__(self, path: str, mtime_ns: int, size: int, encoding: str):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.encoding = encoding
+        self.checkpoints = array("q", [0])  # 第 1 + i*CHECKPOINT_EVERY 行的起始字节偏移
+        self.scanned_to = 0       # 已扫描到的位置：最后一个已知换行符之后（某一行的起始）
+        self.lines_scanned = 0    # scanned_to 之前的换行符个数
+        self.complete = False     # 是否已扫描到文件末尾
+        self.lock = threading.Lock()
+
+    @property
+    def total_lines(self) -> Optional[int]:
+        if not self.complete:
+            return None
+        # 最后一行没有换行符也算一行
+        return self.lines_scanned + (1 if self.size > self.scanned_to else 0)
+
+    def _extend(self, mm, until_line: Optional[int]) -> None:
+        """
+        继续扫描，直到已知换行数 >= until_line（None 表示扫描到文件末尾）。
+        """
+        if self.complete or (until_line is not None and self.lines_scanned >= until_line):
+            return
+        lines, pos = self.lines_scanned, self.scanned_to
+        reached = False
+        for match in _NEWLINE.finditer(mm, pos, self.size):
+            if match.end() == self.size and mm[match.start():match.end()] == b"\r":
+                # 文件末尾的 \r 可能是 \r\n 写了一半：先不算换行，追加内容后再判断
+                break
+            lines += 1
+            pos = match.end()
+            if lines % CHECKPOINT_EVERY == 0:
+                self.checkpoints.append(pos)
+            if until_line is not None and lines >= until_line:
+                reached = True
+                break
+        self.complete = not reached
+        self.lines_scanned, self.scanned_to = lines, pos
+
+    def grow(self, mtime_ns: int, size: int) -> None:
+        """
+        文件在末尾追加了内容：保留已扫描部分，之后从 scanned_to 继续。
+        """
+        self.mtime_ns, self.size = mtime_ns, size
+        self.complete = False
+
+    def _line_offset(self, mm, line: int) -> Optional[int]:
+        """
+        第 line 行（1 起）的起始偏移；超出文件末尾返回 None。
+        """
+        self._extend(mm, line - 1)
+        if self.lines_scanned < line - 1:
+            return None
+        if self.lines_scanned == line - 1 and self.complete and self.scanned_to >= self.size:
+            return None
+        cp = (line - 1) // CHECKPOINT_EVERY
+        offset = self.checkpoints[cp]
+        skip = (line - 1) - cp * CHECKPOINT_EVERY
+        if skip:
+            for i, match in enumerate(_NEWLINE.finditer(mm, offset, self.size), 1):
+                if i == skip:
+                    offset = match.end()
+                    break
+        return offset
+
+    def read_range(self, mm, start: int, end: int) -> LineRange:
+        """
+        读取 [start, end] 行（1 起，含两端；end=-1 表示到文件末尾）。
+        """
+        start = max(1, start)
+        with self.lock:
+            begin = self._line_offset(mm, start)
+            if begin is None:
+                return LineRange("", start, start - 1, self.total_lines)
+            if end == -1:
+                self._extend(mm, None)
+                stop = self.size
+                last = self.total_lines
+            else:
+                stop = self._line_offset(mm, end + 1)
+                if stop is None:
+                    stop = self.size
+                    last = self.total_lines
+                else:
+                    last = end
+            total = self.total_lines
+        text = mm[begin:stop].decode(self.encoding, errors="replace")
+        # 与文本模式 open() 一致：统一换行符
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return LineRange(text, start, last, total)
+
+    def tail_digest(self, mm) -> bytes:
+        lo = max(0, self.scanned_to - TAIL_CHECK_BYTES)
+        return hashlib.blake2b(mm[lo:self.scanned_to], digest_size=16).digest()
+
+
+class FileIndexCache:
+    """
+    按 (路径, mtime, size) 缓存 LineIndex（LRU）。文件被修改时丢弃旧索引，
+    只在末尾追加时沿用已有索引继续扫描。
+    """
+
+    def __init__(self, max_files: int = 64):
+        self.max_files = max_files
+        self._entries: "OrderedDict[str, Tuple[LineIndex, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index_for(self, path: str, st: os.stat_result, mm) -> LineIndex:
+        key = os.path.realpath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                index, digest = entry
+                if index.mtime_ns == st.st_mtime_ns and index.size == st.st_size:
+                    self._entries.move_to_end(key)
+                    return index
+                if st.st_size > index.size and digest and index.tail_digest(mm) == digest:
+                    # 只是追加了内容：已扫描部分的偏移仍然有效
+                    index.grow(st.st_mtime_ns, st.st_size)
+                    self._entries.move_to_end(key)
+                    return index
+            with open(path, "rb") as f:
+                sample = f.read(SAMPLE_BYTES)
+            index = LineIndex(key, st.st_mtime_ns, st.st_size, detect_encoding(sample, complete=st.st_size <= SAMPLE_BYTES))
+            self._entries[key] = (index, b"")
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+            return index
+
+    def read_lines(self, path: str, start: int = 1, end: int = -1) -> LineRange:
+        """
+        读取文件的 [start, end] 行。文件内容通过 mmap 按需访问，不会整体读入内存。
+        """
+        st = os.stat(path)
+        if st.st_size == 0:
+            return LineRange("", start, start - 1, 0)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = self._index_for(path, st, mm)
+            if index.encoding == "utf-16":
+                # UTF-16 的换行不是单字节 \n，没法按字节建索引：退回整体解码
+                lines = mm[:].decode("utf-16", errors="replace").splitlines(keepends=True)
+                stop = len(lines) if end == -1 else min(len(lines), end)
+                return LineRange("".join(lines[start - 1:stop]), start, stop, len(lines))
+            result = index.read_range(mm, start, end)
+            with self._lock:
+                key = index.path
+                if key in self._entries:
+                    self._entries[key] = (index, index.tail_digest(mm))
+            return result
+
+
+# 全局共享的行索引缓存
+file_index = FileIndexCache()
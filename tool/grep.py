@@ -0,0 +1,351 @@
+# tool/grep.py
+import os
+import re
+import mmap
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from .file_edit import read_text
+from .file_index import SAMPLE_BYTES, detect_encoding
+
+# 不管 .gitignore 怎么写都跳过的目录
+ALWAYS_SKIP = {".git", "__pycache__", ".cache", "node_modules", ".venv", "venv", ".mypy_cache", ".pytest_cache"}
+MAX_FILE_BYTES = 100 * 1024 * 1024
+MAX_LINE_CHARS = 300  # 单行结果的显示上限，防止压缩过的 js / 超长日志行撑爆输出
+GREP_WORKERS = 8
+
+
+@dataclass
+class GrepMatch:
+    path: str
+    line: int
+    text: str
+    before: List[Tuple[int, str]] = field(default_factory=list)
+    after: List[Tuple[int, str]] = field(default_factory=list)
+
+
+# --- .gitignore ---
+
+def _translate(pattern: str) -> str:
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                out.append(re.escape("["))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    .gitignore 规则（支持 !取反、目录专用的结尾 /、带 / 的锚定模式和 **）。
+    每个目录的规则 = 父目录规则 + 本目录 .gitignore，后出现的规则优先。
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, "re.Pattern", bool, bool]] = ()):
+        self.rules = list(rules)
+
+    @staticmethod
+    def parse(base: str, text: str) -> List[Tuple[str, "re.Pattern", bool, bool]]:
+        rules = []
+        for raw in text.splitlines():
+            line = raw.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            body = _translate(line)
+            regex = re.compile(("^" if anchored else "^(?:.*/)?") + body + "$")
+            rules.append((base, regex, negate, dir_only))
+        return rules
+
+    def child(self, dirpath: str) -> "IgnoreRules":
+        try:
+            with open(os.path.join(dirpath, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                extra = self.parse(dirpath, f.read())
+        except OSError:
+            return self
+        return IgnoreRules(self.rules + extra)
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            rel = os.path.relpath(path, base).replace(os.sep, "/")
+            if rel.startswith("../"):
+                continue
+            if regex.match(rel):
+                result = not negate
+        return result
+
+
+def _gitignore_root(start: str) -> IgnoreRules:
+    """
+    从搜索起点往上找到仓库根（有 .git 的目录），加载沿途各级 .gitignore。
+    """
+    chain = []
+    d = os.path.abspath(start)
+    while True:
+        chain.append(d)
+        if os.path.isdir(os.path.join(d, ".git")):
+            break
+        parent = os.path.dirname(d)
+        if parent == d:
+            chain = [os.path.abspath(start)]
+            break
+        d = parent
+    rules = IgnoreRules()
+    # 起点目录自己的 .gitignore 在遍历时加载
+    for directory in reversed(chain[1:]):
+        rules = rules.child(directory)
+    return rules
+
+
+# --- 扫描 ---
+
+def _decode(line) -> str:
+    text = line.decode("utf-8", errors="replace") if isinstance(line, bytes) else line
+    text = text.rstrip("\r")
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + " …"
+    return text
+
+
+def _context(buf, start: int, end: int, line_no: int, n: int) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]]]:
+    nl = b"\n" if isinstance(buf, (bytes, mmap.mmap)) else "\n"
+    before: List[Tuple[int, str]] = []
+    pos = start
+    for i in range(1, n + 1):
+        if pos <= 0:
+            break
+        prev_start = buf.rfind(nl, 0, pos - 1) + 1
+        before.append((line_no - i, _decode(buf[prev_start:pos - 1])))
+        pos = prev_start
+    before.reverse()
+    after: List[Tuple[int, str]] = []
+    pos = end
+    size = len(buf)
+    for i in range(1, n + 1):
+        if pos >= size:
+            break
+        nxt = buf.find(nl, pos + 1)
+        nxt = size if nxt < 0 else nxt
+        after.append((line_no + i, _decode(buf[pos + 1:nxt])))
+        pos = nxt
+    return before, after
+
+
+def _search(path: str, buf, regex: "re.Pattern", context: int, limit: Optional[int]) -> List[GrepMatch]:
+    """
+    在整个缓冲区（mmap 的字节，或解码后的文本）上跑正则，每行最多记一次。
+    """
+    nl = b"\n" if isinstance(buf, (bytes, mmap.mmap)) else "\n"
+    matches: List[GrepMatch] = []
+    counted_to, line_no = 0, 1
+    pos = 0
+    while pos <= len(buf):
+        m = regex.search(buf, pos)
+        if m is None:
+            break
+        start = buf.rfind(nl, 0, m.start()) + 1
+        end = buf.find(nl, m.start())
+        end = len(buf) if end < 0 else end
+        line_no += buf[counted_to:start].count(nl)
+        counted_to = start
+        before, after = _context(buf, start, end, line_no, context) if context else ([], [])
+        matches.append(GrepMatch(path, line_no, _decode(buf[start:end]), before, after))
+        if limit is not None and len(matches) >= limit:
+            break
+        pos = end + 1
+    return matches
+
+
+@lru_cache(maxsize=32)
+def _text_regex(regex: "re.Pattern") -> "re.Pattern":
+    # 按 utf-8 字节编译的正则换成等价的文本正则，用来搜索解码后的 GBK 等文件
+    return re.compile(regex.pattern.decode("utf-8"), regex.flags)
+
+
+def scan_file(path: str, regex: "re.Pattern", context: int = 0, limit: Optional[int] = None) -> List[GrepMatch]:
+    """
+    用 mmap 在文件字节上跑正则，每行最多记一次；二进制文件（开头有 NUL）跳过。
+    编码探测规则与 file_read 一致：UTF-8 文件直接搜字节；GBK、UTF-16 等文件先整体解码再搜文本
+    （GBK 双字节的后一个字节可能落在 ASCII 范围，按字节搜会误中半个汉字）。
+    """
+    try:
+        size = os.path.getsize(path)
+        if size == 0 or size > MAX_FILE_BYTES:
+            return []
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            encoding = detect_encoding(mm[:SAMPLE_BYTES], complete=size <= SAMPLE_BYTES)
+            if encoding == "utf-16":
+                # 带 BOM 的 UTF-16 里到处是 NUL，不能当二进制跳过
+                return _search(path, read_text(path)[0], _text_regex(regex), context, limit)
+            if mm.find(b"\0", 0, 8192) >= 0:
+                return []
+            if encoding in ("utf-8", "utf-8-sig"):
+                return _search(path, mm, regex, context, limit)
+        return _search(path, read_text(path)[0], _text_regex(regex), context, limit)
+    except (OSError, ValueError):
+        return []
+
+
+def grep(
+    root: str,
+    pattern: str,
+    globs: Sequence[str] = (),
+    ignore_case: bool = False,
+    context: int = 0,
+    max_results: int = 50,
+    workers: int = GREP_WORKERS,
+) -> Tuple[List[GrepMatch], bool]:
+    """
+    在 root（目录或单个文件）下并行搜索 pattern，返回 (按路径、行号排序的结果, 是否因达到 max_results 提前停止)。
+    目录遍历和文件扫描都在线程池里做；.gitignore 中忽略的路径不搜索；
+    globs 非空时只搜索文件名（或相对路径）匹配其中任一模式的文件。
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    regex = re.compile(pattern.encode("utf-8"), flags)
+    root = os.path.abspath(root)
+
+    def wanted(path: str) -> bool:
+        if not globs:
+            return True
+        rel = os.path.relpath(path, root).replace(os.sep, "/")
+        name = os.path.basename(path)
+        return any(fnmatch.fnmatch(name, g) or fnmatch.fnmatch(rel, g) for g in globs)
+
+    if os.path.isfile(root):
+        found = scan_file(root, regex, context, max_results)
+        return found, len(found) >= max_results
+
+    results: List[GrepMatch] = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    pending = [0]
+    done = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grep")
+
+    def submit(fn, *args):
+        with lock:
+            pending[0] += 1
+        executor.submit(run, fn, *args)
+
+    def run(fn, *args):
+        try:
+            if not stop.is_set():
+                fn(*args)
+        finally:
+            with lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    done.set()
+
+    def scan(path: str) -> None:
+        remaining = max_results - len(results)
+        if remaining <= 0:
+            stop.set()
+            return
+        found = scan_file(path, regex, context, remaining)
+        if found:
+            with lock:
+                results.extend(found)
+                if len(results) >= max_results:
+                    stop.set()
+
+    def walk(directory: str, rules: IgnoreRules) -> None:
+        rules = rules.child(directory)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if stop.is_set():
+                return
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir and entry.name in ALWAYS_SKIP:
+                continue
+            if rules.ignored(entry.path, is_dir):
+                continue
+            if is_dir:
+                submit(walk, entry.path, rules)
+            elif entry.is_file() and wanted(entry.path):
+                submit(scan, entry.path)
+
+    submit(walk, root, _gitignore_root(root))
+    done.wait()
+    executor.shutdown(wait=False)
+
+    results.sort(key=lambda m: (m.path, m.line))
+    truncated = len(results) >= max_results
+    return results[:max_results], truncated
+
+
+def format_matches(matches: Sequence[GrepMatch], root: str) -> str:
+    """
+    ripgrep 风格输出：匹配行 `路径:行号:内容`，上下文行 `路径-行号-内容`，
+    带上下文时不相邻的片段之间用 -- 分隔。
+    """
+    root = os.path.abspath(root)
+    base = root if os.path.isdir(root) else os.path.dirname(root)
+    # 同一文件里的上下文可能互相重叠，按行号合并；既是匹配行又是上下文行时按匹配行显示
+    by_file: "dict[str, dict[int, Tuple[str, str]]]" = {}
+    for m in matches:
+        rows = by_file.setdefault(m.path, {})
+        for no, text in m.before + m.after:
+            rows.setdefault(no, ("-", text))
+        rows[m.line] = (":", m.text)
+
+    with_context = any(m.before or m.after for m in matches)
+    out: List[str] = []
+    for path, rows in by_file.items():
+        rel = os.path.relpath(path, base)
+        prev = None
+        for no in sorted(rows):
+            if with_context and out and (prev is None or no > prev + 1):
+                out.append("--")
+            sep, text = rows[no]
+            out.append(f"{rel}{sep}{no}{sep}{text}")
+            prev = no
+    return "\n".join(out)
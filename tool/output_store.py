@@ -0,0 +1,131 @@
+# tool/output_store.py
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from context_manager import estimate_tokens
+
+# 单个工具结果写进上下文的 token 上限；超出的部分分页保存，按需用 tool_output_page 取
+PAGE_TOKENS = int(os.getenv("TOOL_OUTPUT_PAGE_TOKENS", "1500"))
+
+
+class ToolOutputStore:
+    """
+    大工具输出的分页存储：
+    - shape() 按 token 估算结果大小，超过一页就切成若干页（尽量在换行处切），
+      只返回第一页和续读提示，完整输出以 handle 为键保存；
+      handle 由工具名和内容哈希得到，同样的输出总是同一个 handle，重放时写进上下文的内容逐字节不变；
+    - page() 取后续页；
+    - 保存的输出按 LRU 淘汰，条目数和总字符数都有上限。
+    """
+
+    def __init__(
+        self,
+        page_tokens: int = PAGE_TOKENS,
+        max_entries: int = 64,
+        max_chars: int = 32 * 1024 * 1024,
+        token_counter: Callable[[str], int] = estimate_tokens,
+    ):
+        self.page_tokens = page_tokens
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.token_counter = token_counter
+        self._entries: "OrderedDict[str, Tuple[str, str, List[int], int]]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def paginate(self, text: str) -> List[int]:
+        """
+        返回每页的结束偏移（最后一个等于 len(text)）。按行累计 token，单行超过一页时按字符硬切。
+        """
+        bounds: List[int] = []
+        page_start = pos = 0
+        tokens = 0
+        for line in text.splitlines(keepends=True):
+            line_tokens = self.token_counter(line)
+            if tokens and tokens + line_tokens > self.page_tokens:
+                bounds.append(pos)
+                page_start, tokens = pos, 0
+            while line_tokens > self.page_tokens:
+                # 超长单行：按比例估算能放下的字符数
+                cut = max(1, len(line) * self.page_tokens // line_tokens)
+                pos += cut
+                bounds.append(pos)
+                line = line[cut:]
+                line_tokens = self.token_counter(line)
+                page_start = pos
+            pos += len(line)
+            tokens += line_tokens
+        if pos > page_start or not bounds:
+            bounds.append(pos)
+        return bounds
+
+    def shape(self, tool_name: str, text: str) -> Tuple[str, Optional[str]]:
+        """
+        返回 (写进上下文的内容, handle)。不超过一页时原样返回，handle 为 None。
+        """
+        total = self.token_counter(text)
+        if total <= self.page_tokens:
+            return text, None
+        bounds = self.paginate(text)
+        if len(bounds) <= 1:
+            return text, None
+        handle = f"{tool_name}-{hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()[:8]}"
+        with self._lock:
+            if handle in self._entries:
+                # 同样的输出已经存过：只刷新 LRU 顺序
+                self._entries.move_to_end(handle)
+                return self._render(handle, text, bounds, total, 1), handle
+            self._entries[handle] = (tool_name, text, bounds, total)
+            self._chars += len(text)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+                _, (_, old, _, _) = self._entries.popitem(last=False)
+                self._chars -= len(old)
+        return self._render(handle, text, bounds, total, 1), handle
+
+    def page(self, handle: str, page: int) -> str:
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is not None:
+                self._entries.move_to_end(handle)
+        if entry is None:
+            return f"Error: Unknown or expired output handle '{handle}'."
+        _, text, bounds, total = entry
+        if not 1 <= page <= len(bounds):
+            return f"Error: Page {page} is out of range; output '{handle}' has {len(bounds)} pages."
+        return self._render(handle, text, bounds, total, page)
+
+    @staticmethod
+    def _render(handle: str, text: str, bounds: List[int], total: int, page: int) -> str:
+        start = bounds[page - 2] if page > 1 else 0
+        body = text[start:bounds[page - 1]]
+        pages = len(bounds)
+        if page < pages:
+            cursor = f'Call tool_output_page(handle="{handle}", page={page + 1}) to read the next page.'
+        else:
+            cursor = "This is the last page."
+        return f"{body}\n[Output page {page}/{pages} of about {total} tokens. {cursor}]"
+
+
+# 全局共享的输出分页存储
+output_store = ToolOutputStore()
+
+
+class ToolOutputPageInput(BaseModel):
+    """Input for tool_output_page tool."""
+    handle: str = Field(description="The output handle shown at the end of a paginated tool result.")
+    page: int = Field(default=2, description="The page number to fetch (1-indexed).")
+
+
+@tool(args_schema=ToolOutputPageInput)
+def tool_output_page(handle: str, page: int = 2) -> str:
+    """
+    Fetches another page of a large tool output that was paginated.
+    Use it only when the earlier pages did not contain what you need.
+    """
+    return output_store.page(handle, page)
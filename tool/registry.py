@@ -0,0 +1,159 @@
+# tool/registry.py
+import os
+import json
+import importlib
+import importlib.util
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 工具名 -> 定义它的模块（顺序即绑定给 LLM 的顺序，保持固定以便前缀缓存命中）。
+# 模块只在第一次真正需要某个工具对象时才导入。
+TOOL_MODULES: Dict[str, str] = {
+    "file_read": "tool.tools",
+    "file_read_many": "tool.tools",
+    "file_write": "tool.tools",
+    "file_grep": "tool.tools",
+    "shell_exec": "tool.tools",
+    "search_info": "tool.tools",
+    "code_exec": "tool.tools",
+    "plan_task": "tool.tools",
+    "sandbox_code_exec": "tool.sandbox_tools",
+    "sandbox_list_files": "tool.sandbox_tools",
+    "sandbox_sync": "tool.sandbox_tools",
+    "sandbox_kill": "tool.sandbox_tools",
+    "tool_output_page": "tool.output_store",
+}
+
+# 不定义工具、但常量会写进工具 schema 的模块（比如 sandbox_list_files 描述里的深度和分页上限）
+SCHEMA_DEPENDENCIES: Tuple[str, ...] = ("tool.sandbox_listing",)
+# 会改变 schema 的环境变量（参数默认值取自它们）
+SCHEMA_ENV: Tuple[str, ...] = ("SANDBOX_EXEC_TIMEOUT",)
+
+SCHEMA_CACHE_PATH = os.path.join(".cache", "tool_schemas.json")
+
+
+class ToolRegistry:
+    """
+    按名字索引的工具注册表：
+    - get(name) 是一次字典查找，对应模块在第一次调用时才导入；
+    - schemas() 返回 OpenAI 格式的工具 schema，内存中按工具组合缓存，
+      并落盘缓存（以工具模块及其依赖模块文件的 mtime、以及影响 schema 的环境变量校验），
+      冷启动时无需导入工具模块就能 bind_tools。
+    """
+
+    def __init__(
+        self,
+        modules: Dict[str, str],
+        schema_cache_path: Optional[str] = SCHEMA_CACHE_PATH,
+        dependencies: Sequence[str] = SCHEMA_DEPENDENCIES,
+        env: Sequence[str] = SCHEMA_ENV,
+    ):
+        self._modules = dict(modules)
+        self._dependencies = tuple(dependencies)
+        self._env = tuple(env)
+        self._tools: Dict[str, Any] = {}
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._schema_lists: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        self._schema_cache_path = schema_cache_path
+        self._disk_loaded = False
+        self._lock = threading.RLock()
+
+    def names(self) -> List[str]:
+        return list(self._modules)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._modules
+
+    # --- 工具对象 ---
+
+    def get(self, name: str) -> Optional[Any]:
+        """
+        按名字取工具对象，不存在返回 None。
+        """
+        tool = self._tools.get(name)
+        if tool is not None:
+            return tool
+        module_name = self._modules.get(name)
+        if module_name is None:
+            return None
+        with self._lock:
+            if name not in self._tools:
+                module = importlib.import_module(module_name)
+                # 同一个模块里的工具一次性登记，后面都是 O(1) 查找
+                for tool_name, mod in self._modules.items():
+                    if mod == module_name:
+                        self._tools[tool_name] = getattr(module, tool_name)
+        return self._tools[name]
+
+    def tools(self, names: Optional[Sequence[str]] = None) -> List[Any]:
+        return [self.get(n) for n in (names or self.names())]
+
+    # --- schema ---
+
+    def _module_stamp(self) -> Dict[str, Any]:
+        modules = {}
+        for module_name in sorted(set(self._modules.values()) | set(self._dependencies)):
+            spec = importlib.util.find_spec(module_name)
+            modules[module_name] = os.stat(spec.origin).st_mtime_ns if spec and spec.origin else 0
+        return {"modules": modules, "env": {name: os.getenv(name) for name in self._env}}
+
+    def _load_disk_cache(self) -> None:
+        self._disk_loaded = True
+        if not self._schema_cache_path or not os.path.exists(self._schema_cache_path):
+            return
+        try:
+            with open(self._schema_cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("stamp") == self._module_stamp():
+                self._schemas.update(data.get("schemas", {}))
+        except (OSError, ValueError):
+            pass
+
+    def _save_disk_cache(self) -> None:
+        if not self._schema_cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._schema_cache_path) or ".", exist_ok=True)
+            tmp = f"{self._schema_cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"stamp": self._module_stamp(), "schemas": self._schemas}, f, ensure_ascii=False)
+            os.replace(tmp, self._schema_cache_path)
+        except OSError:
+            pass
+
+    def _schema(self, name: str) -> Tuple[Dict[str, Any], bool]:
+        if not self._disk_loaded:
+            self._load_disk_cache()
+        cached = self._schemas.get(name)
+        if cached is not None:
+            return cached, False
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+
+        cached = convert_to_openai_tool(self.get(name))
+        self._schemas[name] = cached
+        return cached, True
+
+    def schema(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            schema, built = self._schema(name)
+            if built:
+                self._save_disk_cache()
+            return schema
+
+    def schemas(self, names: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        一组工具的 schema 列表（顺序与 names 一致），同一组合只构造一次。
+        """
+        key = tuple(names or self.names())
+        schemas = self._schema_lists.get(key)
+        if schemas is None:
+            with self._lock:
+                results = [self._schema(n) for n in key]
+                if any(built for _, built in results):
+                    self._save_disk_cache()
+            schemas = [schema for schema, _ in results]
+            self._schema_lists[key] = schemas
+        return schemas
+
+
+registry = ToolRegistry(TOOL_MODULES)
@@ -0,0 +1,114 @@
+# tool/sandbox_backend.py
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Type
+
+
+class SandboxBackend(ABC):
+    """
+    沙箱后端接口：沙箱池通过它创建实例、在进程退出时处理实例、回收过期资源。
+    实例本身需要提供 files / commands / run_code / is_running / kill（与 PPIO Sandbox 同形）。
+    """
+
+    name = ""
+
+    @abstractmethod
+    def create(self) -> Any:
+        """创建（或恢复）一个可以直接执行代码的实例。"""
+
+    @abstractmethod
+    def retire(self, sbx: Any) -> None:
+        """进程退出时处理仍存活的实例。"""
+
+    @abstractmethod
+    def collect_garbage(self) -> None:
+        """回收之前的进程遗留的实例。"""
+
+    # 实例有平台侧存活时间时，沙箱池每隔这么多秒对所有实例调用一次 keep_alive；0 表示不需要
+    keepalive_interval: float = 0
+
+    def keep_alive(self, sbx: Any) -> None:
+        """延长实例在平台上的存活时间。"""
+
+
+class PPIOBackend(SandboxBackend):
+    """
+    PPIO 云沙箱：实例带元数据标签，退出时暂停，下次启动恢复；过期的暂停实例按 TTL 回收。
+    实例在平台上有存活时间（SANDBOX_LIFETIME），由沙箱池定期续期。需要 PPIO_API_KEY。
+    """
+
+    name = "ppio"
+
+    def create(self) -> Any:
+        from . import sandbox_ppio
+        return sandbox_ppio.create_sandbox()
+
+    def retire(self, sbx: Any) -> None:
+        from . import sandbox_ppio
+        sandbox_ppio.pause_sandbox(sbx)
+
+    def collect_garbage(self) -> None:
+        from . import sandbox_ppio
+        sandbox_ppio.collect_garbage()
+
+    @property
+    def keepalive_interval(self) -> float:
+        # 在存活时间过去三分之一时续期，留出几次维护失败的余量
+        from . import sandbox_ppio
+        return sandbox_ppio.SANDBOX_LIFETIME / 3
+
+    def keep_alive(self, sbx: Any) -> None:
+        from . import sandbox_ppio
+        sandbox_ppio.keep_alive(sbx)
+
+
+class LocalBackend(SandboxBackend):
+    """
+    本地后端：每个实例是一个专属临时目录 + 一个从 forkserver fork 出来的常驻 Python 进程，
+    不需要网络和 API key，冷启动是毫秒级，适合离线开发、压测和基准测试。
+    """
+
+    name = "local"
+
+    def __init__(self, base_dir: Optional[str] = None, memory_limit_mb: Optional[int] = 2048):
+        self.base_dir = base_dir
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = None
+
+    def create(self) -> Any:
+        from .code_runner import _mp_context
+        from .sandbox_local import LocalSandbox
+
+        if self._ctx is None:
+            self._ctx = _mp_context()
+        root = tempfile.mkdtemp(prefix="sandbox-", dir=self.base_dir)
+        sbx = LocalSandbox(root, private=True, ctx=self._ctx, memory_limit_mb=self.memory_limit_mb)
+        # 预热池里的实例要能直接执行代码：内核在创建时就准备好
+        sbx.start_kernel()
+        return sbx
+
+    def retire(self, sbx: Any) -> None:
+        # 本地实例没法跨进程保留：直接销毁，专属目录一并删除
+        sbx.kill()
+
+    def collect_garbage(self) -> None:
+        # 实例随进程一起结束，没有需要回收的远端资源
+        pass
+
+
+BACKENDS: Dict[str, Type[SandboxBackend]] = {
+    PPIOBackend.name: PPIOBackend,
+    LocalBackend.name: LocalBackend,
+}
+
+
+def make_backend(name: Optional[str] = None) -> SandboxBackend:
+    """
+    按名字创建后端；不指定时读环境变量 SANDBOX_BACKEND（ppio / local，默认 ppio）。
+    """
+    name = (name or os.getenv("SANDBOX_BACKEND", PPIOBackend.name)).strip().lower()
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"未知的沙箱后端 {name!r}，可选：{', '.join(BACKENDS)}") from None
@@ -0,0 +1,172 @@
+# tool/sandbox_exec.py
+import json
+import time
+import queue
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# 超时 / 取消后等远端响应 SIGINT、把执行收尾的时间
+INTERRUPT_GRACE = 5.0
+# 中断沙箱里正在执行的代码：给 Jupyter 内核发 SIGINT，和 notebook 的“中断”按钮一样，内核里已有的变量保留
+INTERRUPT_COMMAND = "pkill -INT -f ipykernel"
+
+
+@dataclass
+class SandboxRunResult:
+    stdout: str = ""
+    stderr: str = ""
+    results: List[str] = field(default_factory=list)  # 最后一个表达式的值等（文本形式）
+    error: Optional[Dict[str, str]] = None            # {"name", "value", "traceback"}
+    duration: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["duration"] = round(self.duration, 3)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def interrupt_sandbox(sbx: Any) -> None:
+    # 后端自带中断能力（本地沙箱）时直接用，否则在沙箱里给内核发信号
+    interrupt = getattr(sbx, "interrupt", None)
+    try:
+        if callable(interrupt):
+            interrupt()
+        else:
+            sbx.commands.run(INTERRUPT_COMMAND, timeout=10)
+    except Exception:
+        # pkill 没匹配到进程时退出码为 1，也算成功：代码已经结束了
+        pass
+
+
+# session_id -> 正在执行的代码的取消事件
+_active: Dict[str, List[threading.Event]] = {}
+_active_lock = threading.Lock()
+
+
+def cancel_running(session_id: Optional[str] = None) -> int:
+    """
+    取消 session_id（None 表示所有会话）正在沙箱里执行的代码，返回取消的个数。
+    """
+    with _active_lock:
+        events = [e for sid, evs in _active.items() if session_id in (None, sid) for e in evs]
+    for event in events:
+        event.set()
+    return len(events)
+
+
+def _message_text(message: Any) -> str:
+    return getattr(message, "line", message if isinstance(message, str) else str(message))
+
+
+def run_streaming(
+    sbx: Any,
+    code: str,
+    timeout: float = 60,
+    on_stdout: Optional[Callable[[str], None]] = None,
+    on_stderr: Optional[Callable[[str], None]] = None,
+    session_id: str = "default",
+    cancel: Optional[threading.Event] = None,
+    interrupt: Callable[[Any], None] = interrupt_sandbox,
+) -> SandboxRunResult:
+    """
+    在沙箱里执行代码，stdout / stderr 一产生就交给回调，而不是等整段执行完。
+    - run_code 在后台线程里跑，输出片段经队列转回调用线程再调用回调，
+      所以回调运行在调用方（工具）的上下文里，可以直接发 LangGraph 自定义事件；
+    - 超过 timeout 秒或 cancel 被触发（包括 cancel_running()）时中断远端执行，
+      并在 INTERRUPT_GRACE 秒内等它收尾。
+    """
+    cancel = cancel or threading.Event()
+    events: "queue.Queue[tuple]" = queue.Queue()
+    outcome: Dict[str, Any] = {}
+    result = SandboxRunResult()
+
+    def worker():
+        try:
+            outcome["execution"] = sbx.run_code(
+                code,
+                on_stdout=lambda m: events.put(("stdout", _message_text(m))),
+                on_stderr=lambda m: events.put(("stderr", _message_text(m))),
+                # 这里是两条输出之间的读超时，只作兜底；真正的截止时间由下面的等待循环控制
+                timeout=timeout + INTERRUPT_GRACE,
+            )
+        except BaseException as e:
+            outcome["exception"] = e
+        finally:
+            events.put(("done", None))
+
+    stdout: List[str] = []
+    stderr: List[str] = []
+
+    def drain(block_for: float) -> bool:
+        """处理队列里的输出，返回后台线程是否已结束。"""
+        try:
+            kind, text = events.get(timeout=block_for) if block_for > 0 else events.get_nowait()
+        except queue.Empty:
+            return False
+        while True:
+            if kind == "done":
+                return True
+            if kind == "stdout":
+                stdout.append(text)
+                if on_stdout:
+                    on_stdout(text)
+            else:
+                stderr.append(text)
+                if on_stderr:
+                    on_stderr(text)
+            try:
+                kind, text = events.get_nowait()
+            except queue.Empty:
+                return False
+
+    with _active_lock:
+        _active.setdefault(session_id, []).append(cancel)
+    start = time.monotonic()
+    thread = threading.Thread(target=worker, daemon=True, name="sandbox-run")
+    thread.start()
+    finished = False
+    try:
+        deadline = start + timeout
+        while not finished:
+            if cancel.is_set() or time.monotonic() >= deadline:
+                break
+            finished = drain(min(0.1, max(0.0, deadline - time.monotonic())))
+        if not finished:
+            result.cancelled = cancel.is_set()
+            result.timed_out = not result.cancelled
+            interrupt(sbx)
+            grace_end = time.monotonic() + INTERRUPT_GRACE
+            while not finished and time.monotonic() < grace_end:
+                finished = drain(min(0.1, grace_end - time.monotonic()))
+    finally:
+        with _active_lock:
+            evs = _active.get(session_id, [])
+            if cancel in evs:
+                evs.remove(cancel)
+            if not evs:
+                _active.pop(session_id, None)
+
+    result.duration = time.monotonic() - start
+    result.stdout = "".join(stdout)
+    result.stderr = "".join(stderr)
+    execution = outcome.get("execution")
+    if execution is not None:
+        result.results = [r.text for r in getattr(execution, "results", []) if getattr(r, "text", None)]
+        error = getattr(execution, "error", None)
+        if error is not None:
+            result.error = {"name": error.name, "value": error.value, "traceback": error.traceback}
+    elif "exception" in outcome:
+        e = outcome["exception"]
+        result.error = {"name": type(e).__name__, "value": str(e), "traceback": ""}
+    if result.timed_out or result.cancelled:
+        reason = f"timed out after {timeout}s" if result.timed_out else "cancelled"
+        stopped = "interrupted" if finished else "interrupt sent, but the execution did not stop in time"
+        result.error = {
+            "name": "TimeoutError" if result.timed_out else "Cancelled",
+            "value": f"Execution {reason}; {stopped}.",
+            "traceback": (result.error or {}).get("traceback", ""),
+        }
+    return result
@@ -0,0 +1,137 @@
+# tool/sandbox_listing.py
+import os
+import time
+import fnmatch
+import posixpath
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 目录列表缓存的有效期（秒）；沙箱里有写操作时会提前失效
+LIST_TTL = float(os.getenv("SANDBOX_LIST_TTL", "10"))
+MAX_DEPTH = 5
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class ListEntry:
+    rel: str    # 相对于被列出目录的路径
+    type: str   # file / dir / ...
+    size: int
+
+
+def list_entries(sbx: Any, path: str, depth: int) -> List[ListEntry]:
+    """
+    调用沙箱的 files.list(path, depth) 并整理成按相对路径排序的列表。
+    """
+    raw = sbx.files.list(path, depth=depth)
+    if not raw:
+        return []
+    paths = [posixpath.normpath(e.path) for e in raw]
+    if posixpath.isabs(path):
+        base = posixpath.normpath(path)
+    else:
+        # 相对路径由沙箱解析（PPIO 相对用户主目录）：第一层条目的父目录就是被列出的目录
+        base = posixpath.dirname(min(paths, key=lambda p: p.count("/")))
+    out = []
+    for entry, full in zip(raw, paths):
+        kind = getattr(entry.type, "value", entry.type)
+        out.append(ListEntry(posixpath.relpath(full, base), str(kind or "file"), int(getattr(entry, "size", 0) or 0)))
+    out.sort(key=lambda e: e.rel)
+    return out
+
+
+def _human_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "K", "M", "G"):
+        if value < 1024 or unit == "G":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{size}B"
+
+
+def format_listing(
+    path: str,
+    entries: List[ListEntry],
+    pattern: Optional[str],
+    cursor: int,
+    page_size: int,
+    next_call: Callable[[int], str],
+) -> str:
+    """
+    按 glob 过滤、分页后输出紧凑的表格：类型、大小、相对路径（目录以 / 结尾）。
+    """
+    if pattern:
+        entries = [
+            e for e in entries
+            if fnmatch.fnmatch(e.rel, pattern) or fnmatch.fnmatch(posixpath.basename(e.rel), pattern)
+        ]
+    total = len(entries)
+    page = entries[cursor:cursor + page_size]
+    if not page:
+        if total == 0:
+            return f"{path}: no entries" + (f" matching {pattern!r}" if pattern else "") + "."
+        return f"{path}: cursor {cursor} is past the end ({total} entries)."
+    dirs = sum(1 for e in entries if e.type == "dir")
+    header = f"{path}: {total} entries ({dirs} dirs, {total - dirs} files), showing {cursor + 1}-{cursor + len(page)}"
+    lines = [header, "type  size    path"]
+    for e in page:
+        size = "-" if e.type == "dir" else _human_size(e.size)
+        name = e.rel + "/" if e.type == "dir" else e.rel
+        lines.append(f"{e.type[:4]:<5} {size:>7} {name}")
+    if cursor + len(page) < total:
+        lines.append(f"[More entries. Call {next_call(cursor + len(page))} for the next page.]")
+    return "\n".join(lines)
+
+
+class ListingCache:
+    """
+    目录列表的短期缓存：键为 (会话, 沙箱 id, 路径, 深度)，glob 过滤和分页都在缓存结果上做，
+    翻页、换个过滤条件再看一遍都不用再请求沙箱。
+    键里带沙箱 id：沙箱池回收、收回或替换了会话的实例后，新实例不会读到旧实例的列表。
+    会话里任何可能改动文件的操作（执行代码、同步、关闭沙箱）都应调用 invalidate。
+    """
+
+    def __init__(self, ttl: float = LIST_TTL, max_entries: int = 128, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: Dict[Tuple[str, str, str, int], Tuple[float, List[ListEntry]]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        session_id: str,
+        sandbox_id: str,
+        path: str,
+        depth: int,
+        load: Callable[[], List[ListEntry]],
+    ) -> List[ListEntry]:
+        key = (session_id, sandbox_id, path, depth)
+        now = self.clock()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+        entries = load()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, entries)
+            if len(self._entries) > self.max_entries:
+                # 先丢过期的，还不够就丢最早过期的
+                for k in sorted(self._entries, key=lambda k: self._entries[k][0]):
+                    if len(self._entries) <= self.max_entries:
+                        break
+                    del self._entries[k]
+        return entries
+
+    def invalidate(self, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == session_id]:
+                    del self._entries[key]
+
+
+# 全局共享的目录列表缓存
+listing_cache = ListingCache()
@@ -0,0 +1,267 @@
+# tool/sandbox_local.py
+import os
+import signal
+import shutil
+import threading
+import uuid
+import subprocess
+from dataclasses import dataclass, field
+from typing import IO, Any, Callable, Iterator, List, Optional, Union
+
+from .code_runner import _exchange, _mp_context, _spawn_worker, _stop_worker
+
+STREAM_CHUNK = 64 * 1024
+
+
+@dataclass
+class LocalCommandResult:
+    stdout: str
+    stderr: str
+    exit_code: int
+    error: Optional[str] = None
+
+
+class LocalCommandError(RuntimeError):
+    """命令以非零退出码结束（对应 PPIO 的 CommandExitException）。"""
+
+    def __init__(self, result: LocalCommandResult):
+        super().__init__(f"Command exited with code {result.exit_code} and error:\n{result.stderr}")
+        self.stdout = result.stdout
+        self.stderr = result.stderr
+        self.exit_code = result.exit_code
+
+
+@dataclass
+class LocalEntryInfo:
+    name: str
+    path: str
+    type: str  # "file" / "dir"
+    size: int
+
+
+@dataclass
+class LocalOutputMessage:
+    line: str
+    error: bool = False
+
+
+@dataclass
+class LocalResult:
+    text: str  # 最后一个表达式的值（repr），对应 PPIO Execution.results 里的 Result.text
+
+
+@dataclass
+class LocalExecutionError:
+    name: str
+    value: str
+    traceback: str
+
+
+@dataclass
+class LocalExecution:
+    results: List[LocalResult] = field(default_factory=list)
+    error: Optional[LocalExecutionError] = None
+
+
+def _resolve(root: str, path: str) -> str:
+    """
+    沙箱路径 -> 本机路径：root 就是沙箱里的 "/"，绝对路径和相对路径都落在 root 下；
+    规范化之后跳出 root 的路径（比如 "../x"）直接拒绝。
+    """
+    resolved = os.path.normpath(os.path.join(root, path.lstrip("/")))
+    if resolved != root and not resolved.startswith(root.rstrip(os.sep) + os.sep):
+        raise PermissionError(f"路径超出沙箱根目录：{path}")
+    return resolved
+
+
+class _LocalFiles:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _resolve(self, path: str) -> str:
+        return _resolve(self.root, path)
+
+    def _sandbox_path(self, path: str) -> str:
+        # 返回给调用方的路径与 PPIO 一样是沙箱里的绝对路径
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return "/" if rel == "." else "/" + rel
+
+    def read(self, path: str, format: str = "text") -> Union[str, bytearray, Iterator[bytes]]:
+        path = self._resolve(path)
+        if format == "stream":
+            def chunks() -> Iterator[bytes]:
+                with open(path, "rb") as f:
+                    while True:
+                        block = f.read(STREAM_CHUNK)
+                        if not block:
+                            return
+                        yield block
+            if not os.path.isfile(path):
+                raise FileNotFoundError(path)
+            return chunks()
+        with open(path, "rb") as f:
+            data = f.read()
+        return bytearray(data) if format == "bytes" else data.decode("utf-8", errors="replace")
+
+    def write(self, path: str, data: Union[str, bytes, IO]) -> LocalEntryInfo:
+        path = self._resolve(path)
+        # 与 PPIO 一致：父目录不存在时自动创建
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            if isinstance(data, str):
+                f.write(data.encode("utf-8"))
+            elif isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
+        return LocalEntryInfo(os.path.basename(path), self._sandbox_path(path), "file", os.path.getsize(path))
+
+    def list(self, path: str, depth: int = 1) -> List[LocalEntryInfo]:
+        return self._list(self._resolve(path), depth)
+
+    def _list(self, path: str, depth: int) -> List[LocalEntryInfo]:
+        out: List[LocalEntryInfo] = []
+        for entry in sorted(os.scandir(path), key=lambda e: e.name):
+            is_dir = entry.is_dir(follow_symlinks=False)
+            size = 0 if is_dir else entry.stat(follow_symlinks=False).st_size
+            out.append(LocalEntryInfo(entry.name, self._sandbox_path(entry.path), "dir" if is_dir else "file", size))
+            if is_dir and depth > 1:
+                out.extend(self._list(entry.path, depth - 1))
+        return out
+
+    def exists(self, path: str) -> bool:
+        path = self._resolve(path)
+        return os.path.exists(path)
+
+    def remove(self, path: str) -> None:
+        path = self._resolve(path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def make_dir(self, path: str) -> bool:
+        path = self._resolve(path)
+        if os.path.isdir(path):
+            return False
+        os.makedirs(path)
+        return True
+
+
+class _LocalCommands:
+    def __init__(self, root: str):
+        self.root = root
+
+    def run(self, cmd: str, cwd: Optional[str] = None, envs: Optional[dict] = None, timeout: float = 60) -> LocalCommandResult:
+        # 工作目录和文件接口用同一个根：cwd 是沙箱路径，默认就是 root（沙箱里的 "/"）
+        env = dict(os.environ, **(envs or {}))
+        proc = subprocess.run(
+            ["bash", "-c", cmd], cwd=_resolve(self.root, cwd or "/"), env=env,
+            capture_output=True, text=True, timeout=timeout,
+        )
+        result = LocalCommandResult(proc.stdout, proc.stderr, proc.returncode)
+        if proc.returncode != 0:
+            raise LocalCommandError(result)
+        return result
+
+
+class LocalSandbox:
+    """
+    本机上的沙箱：提供与 PPIO Sandbox 相同形状的 files / commands / run_code / is_running / kill 接口。
+    - root 相当于沙箱里的 "/"：files 接口的绝对路径和相对路径都映射到 root 下，跳出 root 的路径被拒绝，
+      命令和内核的工作目录也是 root；private=True 时 root 是专属的临时目录，kill 时删除；
+    - run_code 在常驻的 Python 内核进程里执行（经 code_runner 的 forkserver fork 出来，启动只要几毫秒），
+      全局变量在多次调用间保留，最后一个表达式的值放在 results 里，interrupt() 相当于 Jupyter 的“中断”。
+    这不是安全边界：命令和用户代码里写的绝对路径仍然是本机路径。要把沙箱路径拼进命令时用 host_path() 转换。
+    用于离线跑通、压测和基准测试沙箱相关的逻辑。
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        private: bool = False,
+        ctx: Any = None,
+        memory_limit_mb: Optional[int] = 2048,
+    ):
+        self.root = os.path.realpath(root or os.getcwd())
+        self.private = private
+        self.sandbox_id = f"local-{uuid.uuid4().hex}"
+        self.files = _LocalFiles(self.root)
+        self.commands = _LocalCommands(self.root)
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = ctx
+        self._worker = None
+        self._kernel_lock = threading.Lock()
+        self._running = True
+
+    def host_path(self, path: str) -> str:
+        """
+        沙箱路径对应的本机路径：命令在本机上执行，拼进命令行的沙箱路径要先经过它转换。
+        """
+        return _resolve(self.root, path)
+
+    def start_kernel(self) -> None:
+        """
+        准备好 Python 内核（run_code 第一次调用时也会自动准备），工作目录切到 root。
+        """
+        if self._worker is not None:
+            return
+        if self._ctx is None:
+            self._ctx = _mp_context()
+        worker = _spawn_worker(self._ctx, self.memory_limit_mb, persistent=True, name="sandbox-kernel")
+        setup = {"code": f"__import__('os').chdir({self.root!r})", "reset": True}
+        result, ok = _exchange(worker, setup, timeout=30)
+        if not ok or result.status != "ok":
+            _stop_worker(worker)
+            raise RuntimeError(f"本地沙箱内核启动失败：{result.error}")
+        self._worker = worker
+
+    def run_code(
+        self,
+        code: str,
+        on_stdout: Optional[Callable[[LocalOutputMessage], None]] = None,
+        on_stderr: Optional[Callable[[LocalOutputMessage], None]] = None,
+        timeout: Optional[float] = None,
+        **_: Any,
+    ) -> LocalExecution:
+        if not self._running:
+            raise RuntimeError(f"沙箱 {self.sandbox_id} 已关闭")
+
+        def on_output(kind: str, text: str) -> None:
+            callback = on_stdout if kind == "stdout" else on_stderr
+            if callback is not None:
+                callback(LocalOutputMessage(text, error=kind == "stderr"))
+
+        with self._kernel_lock:
+            self.start_kernel()
+            request = {"code": code, "stream": True, "results": True}
+            result, reusable = _exchange(self._worker, request, timeout or 300, on_output)
+            if not reusable:
+                # 超时或内核崩溃：丢掉这个内核，下次调用重新准备（之前的变量丢失）
+                _stop_worker(self._worker)
+                self._worker = None
+        error = None
+        if result.error:
+            name, _, value = result.error.partition(": ")
+            start = result.stderr.rfind("Traceback (most recent call last)")
+            error = LocalExecutionError(name, value, result.stderr[start:] if start >= 0 else "")
+        return LocalExecution(results=[LocalResult(text) for text in result.results], error=error)
+
+    def interrupt(self) -> None:
+        """
+        给正在执行的内核发 SIGINT：当前代码以 KeyboardInterrupt 结束，内核和变量保留。
+        """
+        worker = self._worker
+        if worker is not None and worker.process.is_alive():
+            os.kill(worker.process.pid, signal.SIGINT)
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def kill(self) -> None:
+        self._running = False
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            _stop_worker(worker)
+        if self.private:
+            shutil.rmtree(self.root, ignore_errors=True)
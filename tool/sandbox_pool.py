@@ -0,0 +1,334 @@
+# tool/sandbox_pool.py
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+class SandboxPoolFull(RuntimeError):
+    """会话数已达上限，且没有可以腾出来的租约（都在执行中或刚用过）。"""
+
+
+class _Lease:
+    def __init__(self, sandbox: Any, now: float):
+        self.sandbox = sandbox
+        self.last_used = now
+        self.healthy = True
+        self.in_use = 0  # 正在使用这个沙箱的调用数（见 SandboxPool.using）
+
+
+class SandboxPool:
+    """
+    沙箱池：
+    - 始终保留 size 个预热好的空闲实例，新会话直接领用，不必等冷启动；
+    - 每个会话（conversation / thread id）租用一个独立实例，同一会话的调用总是落在同一个沙箱上；
+    - maintain() 做一轮健康检查、空闲回收和补充预热：挂掉的空闲实例被替换，
+      挂掉的租用实例解除租约（下次调用换新实例），空闲超过 idle_timeout 的租约被回收；
+    - 会话数达到 max_sessions 时，只腾出没有调用在执行、且至少 evict_after 秒没用过的租约，
+      找不到就抛 SandboxPoolFull，不会把正在执行代码的沙箱杀掉；
+    - start() 启动后台线程定期调用 maintain()。
+
+    factory 负责创建沙箱，clock 提供单调时间，二者都可以注入，
+    所以可以用本地的假 Sandbox（有 is_running() / kill() 即可）完整地测试池的行为。
+    retire 决定 shutdown 时怎么处理仍存活的实例（默认 kill；PPIO 下是暂停，留给下次启动恢复）。
+    keepalive 用于实例在平台上有存活时间的后端：maintain() 每隔 keepalive_interval 秒对所有空闲和租用中的实例调用一次，
+    空闲等待、或租用后一段时间没用的实例不会在 idle_timeout 之前被平台回收。
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 1,
+        max_sessions: int = 8,
+        idle_timeout: float = 600,
+        evict_after: float = 60,
+        health_interval: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+        background: bool = True,
+        retire: Optional[Callable[[Any], None]] = None,
+        retire_timeout: float = 30,
+        keepalive: Optional[Callable[[Any], None]] = None,
+        keepalive_interval: float = 0,
+    ):
+        self.factory = factory
+        self.retire = retire
+        self.retire_timeout = retire_timeout
+        self.keepalive = keepalive
+        self.keepalive_interval = keepalive_interval
+        self.size = size
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.evict_after = evict_after
+        self.health_interval = health_interval
+        self.clock = clock
+        self.background = background
+        self._idle: Deque[Any] = deque()
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._creating = 0
+        self._kept_alive_at = clock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # --- 沙箱操作（都是网络调用，不能在持锁时做） ---
+
+    @staticmethod
+    def _healthy(sandbox: Any) -> bool:
+        try:
+            return bool(sandbox.is_running())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _kill(sandbox: Any) -> None:
+        try:
+            sandbox.kill()
+        except Exception:
+            pass
+
+    # --- 租用 ---
+
+    def lease(self, session_id: str) -> Any:
+        """
+        返回会话 session_id 的沙箱：已有租约直接复用，否则领一个预热实例（没有就现建一个）。
+        会话数已满且腾不出租约时抛 SandboxPoolFull。
+        """
+        return self._acquire(session_id, hold=False).sandbox
+
+    def _acquire(self, session_id: str, hold: bool) -> _Lease:
+        # hold=True 时在同一把锁内把租约标记为使用中，领到和标记之间不会被别的会话收回
+        evicted: List[Any] = []
+        full: Optional[SandboxPoolFull] = None
+        sandbox = None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SandboxPool 已关闭")
+            lease = self._leases.get(session_id)
+            if lease is not None and lease.healthy:
+                return self._touch(session_id, lease, hold)
+            if lease is not None:
+                del self._leases[session_id]
+                evicted.append(lease.sandbox)
+            try:
+                # 先腾位置再领实例：满了就直接拒绝，不白白消耗一个预热实例
+                evicted.extend(self._make_room())
+                sandbox = self._idle.popleft() if self._idle else None
+            except SandboxPoolFull as e:
+                full = e
+        self._kill_all(evicted)
+        if full is not None:
+            raise full
+
+        if sandbox is None:
+            sandbox = self.factory()  # 冷启动，放在锁外
+
+        evicted = []
+        with self._lock:
+            existing = self._leases.get(session_id)
+            if existing is not None and existing.healthy:
+                # 同一会话的并发调用抢先拿到了租约：把这个实例放回空闲队列
+                self._idle.append(sandbox)
+                return self._touch(session_id, existing, hold)
+            try:
+                # 创建期间别的会话可能占掉了位置
+                evicted.extend(self._make_room())
+            except SandboxPoolFull:
+                self._idle.append(sandbox)
+                raise
+            lease = self._leases[session_id] = _Lease(sandbox, self.clock())
+            if hold:
+                lease.in_use += 1
+        self._kill_all(evicted)
+        self._refill_async()
+        return lease
+
+    def _touch(self, session_id: str, lease: _Lease, hold: bool) -> _Lease:
+        # 调用方已持有 self._lock
+        lease.last_used = self.clock()
+        if hold:
+            lease.in_use += 1
+        self._leases.move_to_end(session_id)
+        return lease
+
+    def _make_room(self) -> List[Any]:
+        """
+        调用方已持有 self._lock：为一个新租约腾出位置，返回被收回的沙箱（由调用方在锁外销毁）。
+        按最久未用的顺序收回没有调用在执行、且空闲至少 evict_after 秒的租约；不够时什么都不收回。
+        """
+        need = len(self._leases) - self.max_sessions + 1
+        if need <= 0:
+            return []
+        now = self.clock()
+        candidates = [
+            session_id for session_id, lease in self._leases.items()
+            if lease.in_use == 0 and now - lease.last_used >= self.evict_after
+        ][:need]
+        if len(candidates) < need:
+            raise SandboxPoolFull(
+                f"沙箱池已满：{len(self._leases)} 个会话都在执行中或最近 {self.evict_after:.0f}s 内用过，"
+                "请稍后再试，或调大 max_sessions"
+            )
+        return [self._leases.pop(session_id).sandbox for session_id in candidates]
+
+    @contextmanager
+    def using(self, session_id: str) -> Iterator[Any]:
+        """
+        租用会话的沙箱并在 with 块内标记为使用中：期间它不会因会话数已满被收回，也不会被空闲回收。
+        """
+        lease = self._acquire(session_id, hold=True)
+        try:
+            yield lease.sandbox
+        finally:
+            with self._lock:
+                lease.in_use -= 1
+                lease.last_used = self.clock()
+
+    def _keep_alive_all(self, sandboxes: List[Any]) -> None:
+        for sandbox in sandboxes:
+            try:
+                self.keepalive(sandbox)
+            except Exception:
+                # 续期失败（网络抖动或实例已经挂了）：挂掉的由健康检查处理，其余下一轮再续
+                pass
+
+    def _kill_all(self, sandboxes: List[Any]) -> None:
+        for sandbox in sandboxes:
+            self._kill(sandbox)
+
+    def release(self, session_id: str) -> bool:
+        """
+        结束会话的租约并销毁它的沙箱，返回之前是否有租约。
+        """
+        with self._lock:
+            lease = self._leases.pop(session_id, None)
+        if lease is None:
+            return False
+        self._kill(lease.sandbox)
+        return True
+
+    def sandbox_for(self, session_id: str) -> Optional[Any]:
+        """
+        会话当前租用的沙箱（没有租约时返回 None，不会创建）。
+        """
+        with self._lock:
+            lease = self._leases.get(session_id)
+            return lease.sandbox if lease is not None else None
+
+    # --- 预热 / 维护 ---
+
+    def _refill(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) + self._creating >= self.size:
+                    return
+                self._creating += 1
+            try:
+                sandbox = self.factory()
+            except Exception:
+                # 创建失败（网络、配额等）：这一轮先放弃，下次维护时再试
+                with self._lock:
+                    self._creating -= 1
+                return
+            with self._lock:
+                self._creating -= 1
+                closed = self._closed
+                if not closed:
+                    self._idle.append(sandbox)
+            if closed:
+                self._kill(sandbox)
+                return
+
+    def _refill_async(self) -> None:
+        if not self.background:
+            return
+        threading.Thread(target=self._refill, daemon=True, name="sandbox-refill").start()
+
+    def maintain(self) -> Dict[str, int]:
+        """
+        一轮维护：健康检查、回收空闲租约、补充预热实例。返回各类处理的数量。
+        """
+        now = self.clock()
+        with self._lock:
+            idle = list(self._idle)
+            leases: List[Tuple[str, _Lease]] = list(self._leases.items())
+
+        dead_idle = [s for s in idle if not self._healthy(s)]
+        expired, dead = [], []
+        for session_id, lease in leases:
+            if lease.in_use:
+                # 正在执行的调用可能超过 idle_timeout；挂掉的由调用方自己发现，结束后再处理
+                continue
+            if now - lease.last_used >= self.idle_timeout:
+                expired.append((session_id, lease))
+            elif not self._healthy(lease.sandbox):
+                dead.append((session_id, lease))
+
+        to_kill = list(dead_idle)
+        to_keep: List[Any] = []
+        with self._lock:
+            for sandbox in dead_idle:
+                try:
+                    self._idle.remove(sandbox)
+                except ValueError:
+                    pass
+            for session_id, lease in expired + dead:
+                # 检查期间租约可能已被使用或替换，只处理还是同一个、且确实过期/挂掉的
+                current = self._leases.get(session_id)
+                if current is not lease or lease.in_use:
+                    continue
+                if (session_id, lease) in expired and self.clock() - lease.last_used < self.idle_timeout:
+                    continue
+                lease.healthy = False
+                del self._leases[session_id]
+                to_kill.append(lease.sandbox)
+            if self.keepalive is not None and now - self._kept_alive_at >= self.keepalive_interval:
+                self._kept_alive_at = now
+                to_keep = list(self._idle) + [lease.sandbox for lease in self._leases.values()]
+        self._kill_all(to_kill)
+        self._keep_alive_all(to_keep)
+        self._refill()
+        return {"dead_idle": len(dead_idle), "expired": len(expired), "dead_leased": len(dead), "kept_alive": len(to_keep)}
+
+    def start(self) -> None:
+        """
+        启动后台维护线程，并立即开始预热。
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            self._refill()
+            while not self._stop.wait(self.health_interval):
+                try:
+                    self.maintain()
+                except Exception:
+                    pass
+
+        self._thread = threading.Thread(target=loop, daemon=True, name="sandbox-pool")
+        self._thread.start()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "leased": len(self._leases), "creating": self._creating}
+
+    def shutdown(self) -> None:
+        """
+        停止后台线程并处理所有实例（空闲的和租用中的）：有 retire 时并行调用它，最多等 retire_timeout 秒，否则直接销毁。
+        """
+        self._stop.set()
+        with self._lock:
+            self._closed = True
+            sandboxes = list(self._idle) + [lease.sandbox for lease in self._leases.values()]
+            self._idle.clear()
+            self._leases.clear()
+        if self.retire is None:
+            self._kill_all(sandboxes)
+            return
+        threads = [threading.Thread(target=self.retire, args=(s,), daemon=True) for s in sandboxes]
+        for t in threads:
+            t.start()
+        deadline = time.monotonic() + self.retire_timeout
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
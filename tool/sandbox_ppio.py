@@ -0,0 +1,200 @@
+# tool/sandbox_ppio.py
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+
+if TYPE_CHECKING:
+    from ppio_sandbox.code_interpreter import Sandbox
+
+# 暂停的沙箱最多保留多久（秒），以及最多保留几个；超出的由 collect_garbage 回收
+PAUSED_TTL = float(os.getenv("SANDBOX_PAUSED_TTL", str(24 * 3600)))
+MAX_PAUSED = int(os.getenv("SANDBOX_MAX_PAUSED", "4"))
+# 实例在平台上的存活时间（秒）：新建和恢复时都带上，到期自动暂停而不是被杀掉（SDK 默认 300 秒后直接销毁）
+SANDBOX_LIFETIME = int(os.getenv("SANDBOX_LIFETIME", "3600"))
+
+# 本机暂停实例的时间：SDK 不能在创建后修改元数据，暂停时间只能记在本地
+PAUSED_AT_PATH = os.path.join(".cache", "sandbox_paused_at.json")
+
+# 本进程已经接管的沙箱 id：并发创建时不会两次恢复同一个暂停实例
+_claimed: Set[str] = set()
+_claim_lock = threading.Lock()
+
+
+def sandbox_metadata() -> Dict[str, str]:
+    """
+    打在每个沙箱上的标签：同一个应用、同一个工作目录创建的沙箱才会被恢复复用。
+    """
+    workspace = hashlib.sha1(os.path.abspath(os.getcwd()).encode("utf-8")).hexdigest()[:12]
+    return {"app": "openmanus-agent", "workspace": workspace}
+
+
+def _sdk():
+    from dotenv import load_dotenv
+    from ppio_sandbox.code_interpreter import Sandbox, SandboxQuery, SandboxState
+
+    load_dotenv()
+    if not os.getenv("PPIO_API_KEY"):
+        raise RuntimeError(
+            "环境变量 PPIO_API_KEY 未设置，请在 .env 中添加 PPIO_API_KEY=xxx"
+        )
+    return Sandbox, SandboxQuery, SandboxState
+
+
+def list_paused() -> List[Any]:
+    """
+    列出带本应用标签的暂停实例（SandboxInfo），按启动时间从新到旧排序。
+    """
+    Sandbox, SandboxQuery, SandboxState = _sdk()
+    paginator = Sandbox.list(query=SandboxQuery(state=[SandboxState.PAUSED], metadata=sandbox_metadata()))
+    infos = list(paginator.next_items())
+    while paginator.has_next:
+        infos.extend(paginator.next_items())
+    return sorted(infos, key=_started_at, reverse=True)
+
+
+def _as_utc(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _started_at(info: Any) -> datetime:
+    return _as_utc(getattr(info, "started_at", None)) or datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _load_paused_at() -> Dict[str, str]:
+    try:
+        with open(PAUSED_AT_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_paused_at(data: Dict[str, str]) -> None:
+    try:
+        os.makedirs(os.path.dirname(PAUSED_AT_PATH) or ".", exist_ok=True)
+        tmp = f"{PAUSED_AT_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, PAUSED_AT_PATH)
+    except OSError:
+        pass
+
+
+def _record_paused(sandbox_id: str, when: Optional[datetime]) -> None:
+    with _claim_lock:
+        data = _load_paused_at()
+        if when is not None:
+            data[sandbox_id] = when.isoformat()
+        elif data.pop(sandbox_id, None) is None:
+            return
+        _save_paused_at(data)
+
+
+def _paused_at(info: Any, recorded: Dict[str, str]) -> datetime:
+    """
+    实例被暂停的时间：本机暂停的用记下的时间；平台到期自动暂停的用 end_at（即到期时间）；
+    都没有时退回到启动时间。
+    """
+    for value in (recorded.get(info.sandbox_id), getattr(info, "end_at", None)):
+        paused = _as_utc(value)
+        if paused is not None:
+            return paused
+    return _started_at(info)
+
+
+def _expired(info: Any, ttl: float, now: datetime, recorded: Dict[str, str]) -> bool:
+    # TTL 从暂停时算起：长期使用、刚暂停的实例不会因为创建得早就被回收
+    return (now - _paused_at(info, recorded)).total_seconds() > ttl
+
+
+def create_sandbox() -> "Sandbox":
+    """
+    优先恢复一个带本应用标签、未过期的暂停实例（装过的包、写过的文件都还在），没有才新建。
+    过期的实例不恢复，留给 collect_garbage 回收。
+    """
+    Sandbox, _, _ = _sdk()
+    try:
+        paused = list_paused()
+    except Exception:
+        paused = []
+    now = datetime.now(timezone.utc)
+    recorded = _load_paused_at()
+    for info in paused:
+        if _expired(info, PAUSED_TTL, now, recorded):
+            continue
+        with _claim_lock:
+            if info.sandbox_id in _claimed:
+                continue
+            _claimed.add(info.sandbox_id)
+        try:
+            # 对暂停的实例 connect 会自动恢复运行，存活时间从现在重新计算
+            sbx = Sandbox.connect(info.sandbox_id, timeout=SANDBOX_LIFETIME)
+        except Exception:
+            # 已被别的进程恢复后杀掉、或者快照已过期：换下一个
+            continue
+        _record_paused(info.sandbox_id, None)
+        return sbx
+    sbx = Sandbox.create(metadata=sandbox_metadata(), timeout=SANDBOX_LIFETIME, auto_pause=True)
+    with _claim_lock:
+        _claimed.add(sbx.sandbox_id)
+    return sbx
+
+
+def pause_sandbox(sbx: Any) -> None:
+    """
+    进程退出时暂停而不是杀掉实例，下次启动由 create_sandbox 恢复；暂停失败就杀掉，不留下无人管理的实例。
+    """
+    try:
+        sbx.pause()
+        _record_paused(sbx.sandbox_id, datetime.now(timezone.utc))
+    except Exception:
+        try:
+            sbx.kill()
+        except Exception:
+            pass
+
+
+def keep_alive(sbx: Any) -> None:
+    """
+    把实例的存活时间重新设为 SANDBOX_LIFETIME：沙箱池定期对还在用的实例调用，空闲等待的实例不会被平台到期暂停。
+    """
+    sbx.set_timeout(SANDBOX_LIFETIME)
+
+
+def collect_garbage(ttl: float = PAUSED_TTL, keep: int = MAX_PAUSED) -> List[str]:
+    """
+    回收过期的暂停实例：暂停超过 ttl 秒的，以及按启动时间排在 keep 个之后的。返回被回收的 id。
+    只处理暂停状态的实例：杀之前再查一次状态，列出之后被其他进程恢复的实例不受影响。
+    """
+    Sandbox, _, SandboxState = _sdk()
+    now = datetime.now(timezone.utc)
+    recorded = _load_paused_at()
+    reclaimed = []
+    for rank, info in enumerate(list_paused()):
+        if rank < keep and not _expired(info, ttl, now, recorded):
+            continue
+        # 先在锁内认领再杀：认领期间 create_sandbox 不会去恢复这个实例
+        with _claim_lock:
+            if info.sandbox_id in _claimed:
+                continue
+            _claimed.add(info.sandbox_id)
+        try:
+            if Sandbox.get_info(info.sandbox_id).state != SandboxState.PAUSED:
+                continue
+            Sandbox.kill(info.sandbox_id)
+            reclaimed.append(info.sandbox_id)
+        except Exception:
+            pass
+        finally:
+            with _claim_lock:
+                _claimed.discard(info.sandbox_id)
+    for sandbox_id in reclaimed:
+        _record_paused(sandbox_id, None)
+    return reclaimed
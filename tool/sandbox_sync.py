@@ -0,0 +1,293 @@
+# tool/sandbox_sync.py
+import io
+import os
+import json
+import uuid
+import shlex
+import functools
+import hashlib
+import tarfile
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .grep import ALWAYS_SKIP, IgnoreRules, _gitignore_root
+
+# 小于这个大小的文件打进 tar 包批量传输，更大的单独分块传
+LARGE_FILE_BYTES = int(os.getenv("SANDBOX_SYNC_LARGE_FILE_BYTES", str(4 * 1024 * 1024)))
+# 单个 tar 包里未压缩文件的总大小上限
+BATCH_BYTES = 32 * 1024 * 1024
+# 大文件分块上传时每块的大小
+CHUNK_BYTES = 4 * 1024 * 1024
+HASH_BLOCK = 1024 * 1024
+
+# 在沙箱里计算目录清单（相对路径 -> [sha256, 大小]）的脚本，用沙箱自带的 python3 跑
+_REMOTE_MANIFEST = r"""
+import hashlib, json, os, sys
+root, skip = sys.argv[1], set(json.loads(sys.argv[2]))
+out = {}
+if os.path.isdir(root):
+    for d, dirs, files in os.walk(root):
+        dirs[:] = [x for x in dirs if x not in skip]
+        for name in files:
+            p = os.path.join(d, name)
+            if os.path.islink(p) or not os.path.isfile(p):
+                continue
+            h = hashlib.sha256()
+            with open(p, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            out[os.path.relpath(p, root).replace(os.sep, "/")] = [h.hexdigest(), os.path.getsize(p)]
+print(json.dumps(out))
+"""
+
+Manifest = Dict[str, Tuple[str, int]]
+
+
+@dataclass
+class SyncReport:
+    direction: str
+    transferred: List[str] = field(default_factory=list)
+    bytes_transferred: int = 0
+    unchanged: int = 0
+    deleted: List[str] = field(default_factory=list)
+    archives: int = 0   # 批量传输用的 tar 包个数
+    chunks: int = 0     # 大文件分块传输的块数
+
+    def summary(self, source: str, target: str) -> str:
+        verb = "上传" if self.direction == "upload" else "下载"
+        parts = [
+            f"{verb}完成：{source} -> {target}",
+            f"传输 {len(self.transferred)} 个文件（{self.bytes_transferred / 1024:.1f} KB，{self.archives} 个 tar 包，{self.chunks} 个分块）",
+            f"未变化 {self.unchanged} 个",
+        ]
+        if self.deleted:
+            parts.append(f"删除 {len(self.deleted)} 个")
+        lines = ["，".join(parts)]
+        lines += [f"  + {rel}" for rel in self.transferred[:20]]
+        if len(self.transferred) > 20:
+            lines.append(f"  ...（另有 {len(self.transferred) - 20} 个）")
+        lines += [f"  - {rel}" for rel in self.deleted[:20]]
+        return "\n".join(lines)
+
+
+# --- 本地清单 ---
+
+# realpath -> (mtime_ns, size, sha256)：文件没变就不重新计算哈希
+_hash_cache: Dict[str, Tuple[int, int, str]] = {}
+_hash_lock = threading.Lock()
+
+
+def file_digest(path: str) -> Tuple[str, int]:
+    st = os.stat(path)
+    key = os.path.realpath(path)
+    with _hash_lock:
+        cached = _hash_cache.get(key)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2], st.st_size
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hash_cache[key] = (st.st_mtime_ns, st.st_size, digest)
+    return digest, st.st_size
+
+
+def local_manifest(root: str) -> Manifest:
+    """
+    本地目录的清单；.gitignore 忽略的文件和 ALWAYS_SKIP 目录不算在内。root 是单个文件时清单里只有它自己。
+    """
+    root = os.path.abspath(root)
+    if os.path.isfile(root):
+        return {os.path.basename(root): file_digest(root)}
+    out: Manifest = {}
+
+    def walk(directory: str, rules: IgnoreRules) -> None:
+        rules = rules.child(directory)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if (is_dir and entry.name in ALWAYS_SKIP) or rules.ignored(entry.path, is_dir):
+                continue
+            if is_dir:
+                walk(entry.path, rules)
+            elif entry.is_file(follow_symlinks=False):
+                out[os.path.relpath(entry.path, root).replace(os.sep, "/")] = file_digest(entry.path)
+
+    if os.path.isdir(root):
+        walk(root, _gitignore_root(root))
+    return out
+
+
+def _shell_path(sbx: Any, path: str) -> str:
+    # 本地沙箱的命令直接在本机上执行，拼进命令行的沙箱路径要换成本机路径；PPIO 沙箱里两者相同
+    host_path = getattr(sbx, "host_path", None)
+    return host_path(path) if callable(host_path) else path
+
+
+def _quote(sbx: Any, path: str) -> str:
+    return shlex.quote(_shell_path(sbx, path))
+
+
+def remote_manifest(sbx: Any, root: str) -> Manifest:
+    root = _shell_path(sbx, root)
+    cmd = f"python3 -c {shlex.quote(_REMOTE_MANIFEST)} {shlex.quote(root)} {shlex.quote(json.dumps(sorted(ALWAYS_SKIP)))}"
+    result = sbx.commands.run(cmd)
+    return {
+        rel: (digest, size)
+        for rel, (digest, size) in json.loads(result.stdout or "{}").items()
+        # 下载时这些相对路径会拼到本地目录上，不接受能跳出目录的路径
+        if not rel.startswith("/") and ".." not in rel.split("/")
+    }
+
+
+def _batches(rels: Iterable[str], manifest: Manifest) -> List[List[str]]:
+    batches: List[List[str]] = [[]]
+    total = 0
+    for rel in rels:
+        size = manifest[rel][1]
+        if batches[-1] and total + size > BATCH_BYTES:
+            batches.append([])
+            total = 0
+        batches[-1].append(rel)
+        total += size
+    return [b for b in batches if b]
+
+
+def _remote_path(root: str, rel: str) -> str:
+    return root.rstrip("/") + "/" + rel
+
+
+def _run_quoted(sbx: Any, template: str, paths: List[str], per_call: int = 200) -> None:
+    for i in range(0, len(paths), per_call):
+        sbx.commands.run(template.format(" ".join(shlex.quote(p) for p in paths[i:i + per_call])))
+
+
+# --- 上传 ---
+
+def _upload_large(sbx: Any, local: str, remote: str, report: SyncReport) -> None:
+    """
+    大文件逐块写到沙箱的临时目录，全部到齐后再拼成目标文件：内存里任何时候只有一块。
+    """
+    staging = f"/tmp/.sandbox_sync-{uuid.uuid4().hex}"
+    count = 0
+    with open(local, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_BYTES), b""):
+            sbx.files.write(f"{staging}/{count:06d}", block)
+            count += 1
+    q = functools.partial(_quote, sbx)
+    if count:
+        sbx.commands.run(f"mkdir -p {q(os.path.dirname(remote))} && cat {q(staging)}/* > {q(remote)}; status=$?; rm -rf {q(staging)}; exit $status")
+    else:
+        sbx.files.write(remote, b"")
+    report.chunks += count
+
+
+def upload(sbx: Any, local_root: str, remote_root: str, delete: bool = False) -> SyncReport:
+    """
+    把本地目录（或单个文件）同步到沙箱的 remote_root 目录下，只传内容哈希有变化的文件。
+    delete=True 时删除沙箱里本地已不存在的文件。
+    """
+    local_root = os.path.abspath(local_root)
+    base = os.path.dirname(local_root) if os.path.isfile(local_root) else local_root
+    local = local_manifest(local_root)
+    remote = remote_manifest(sbx, remote_root)
+    report = SyncReport("upload")
+
+    changed = sorted(rel for rel, (digest, _) in local.items() if remote.get(rel, ("",))[0] != digest)
+    report.unchanged = len(local) - len(changed)
+    small = [rel for rel in changed if local[rel][1] < LARGE_FILE_BYTES]
+    large = [rel for rel in changed if local[rel][1] >= LARGE_FILE_BYTES]
+
+    q = functools.partial(_quote, sbx)
+    for batch in _batches(small, local):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+            for rel in batch:
+                tar.add(os.path.join(base, rel), arcname=rel, recursive=False)
+        archive = f"/tmp/.sandbox_sync-{uuid.uuid4().hex}.tar.gz"
+        sbx.files.write(archive, buf.getvalue())
+        sbx.commands.run(f"mkdir -p {q(remote_root)} && tar -xzf {q(archive)} -C {q(remote_root)}; status=$?; rm -f {q(archive)}; exit $status")
+        report.archives += 1
+    for rel in large:
+        _upload_large(sbx, os.path.join(base, rel), _remote_path(remote_root, rel), report)
+
+    report.transferred = changed
+    report.bytes_transferred = sum(local[rel][1] for rel in changed)
+    if delete and os.path.isdir(local_root):
+        report.deleted = sorted(set(remote) - set(local))
+        _run_quoted(sbx, "rm -f -- {}", [_shell_path(sbx, _remote_path(remote_root, rel)) for rel in report.deleted])
+    return report
+
+
+# --- 下载 ---
+
+def _write_local(path: str, blocks: Iterable[bytes]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.sync-{uuid.uuid4().hex[:8]}"
+    try:
+        with open(tmp, "wb") as f:
+            for block in blocks:
+                f.write(block)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def download(sbx: Any, remote_root: str, local_root: str) -> SyncReport:
+    """
+    把沙箱的 remote_root 目录同步到本地 local_root，只取内容哈希有变化的文件。
+    只新增和覆盖，从不删除本地文件：远端目录写错或为空时，删除会清空本地工作区。
+    """
+    local_root = os.path.abspath(local_root)
+    remote = remote_manifest(sbx, remote_root)
+    report = SyncReport("download")
+
+    changed = []
+    for rel, (digest, _) in sorted(remote.items()):
+        path = os.path.join(local_root, rel)
+        if not (os.path.isfile(path) and file_digest(path)[0] == digest):
+            changed.append(rel)
+    report.unchanged = len(remote) - len(changed)
+    small = [rel for rel in changed if remote[rel][1] < LARGE_FILE_BYTES]
+    large = [rel for rel in changed if remote[rel][1] >= LARGE_FILE_BYTES]
+
+    q = functools.partial(_quote, sbx)
+    for batch in _batches(small, remote):
+        token = uuid.uuid4().hex
+        listing, archive = f"/tmp/.sandbox_sync-{token}.list", f"/tmp/.sandbox_sync-{token}.tar.gz"
+        sbx.files.write(listing, "\0".join(batch))
+        sbx.commands.run(f"tar -czf {q(archive)} -C {q(remote_root)} --null -T {q(listing)}; status=$?; rm -f {q(listing)}; exit $status")
+        try:
+            data = bytes(sbx.files.read(archive, format="bytes"))
+        finally:
+            sbx.commands.run(f"rm -f {q(archive)}")
+        wanted = set(batch)
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+            for member in tar:
+                # 只解出清单里列出的普通文件，防止 ../ 之类的路径写到 local_root 外面
+                if member.isfile() and member.name in wanted:
+                    _write_local(os.path.join(local_root, member.name), [tar.extractfile(member).read()])
+        report.archives += 1
+    for rel in large:
+        blocks = sbx.files.read(_remote_path(remote_root, rel), format="stream")
+        counted = []
+
+        def counting(it=blocks):
+            for block in it:
+                counted.append(len(block))
+                yield block
+
+        _write_local(os.path.join(local_root, rel), counting())
+        report.chunks += len(counted)
+
+    report.transferred = changed
+    report.bytes_transferred = sum(remote[rel][1] for rel in changed)
+    return report
@@ -1,34 +1,79 @@
 # tool/sandbox_tools.py
-from dotenv import load_dotenv
-from ppio_sandbox.code_interpreter import Sandbox
+from typing import TYPE_CHECKING, Literal, Optional
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks.manager import dispatch_custom_event
 from pydantic import BaseModel, Field
 import os
+import atexit
 import threading
 
-load_dotenv()
+from .sandbox_pool import SandboxPool, SandboxPoolFull
+from .sandbox_backend import SandboxBackend, make_backend
+from . import sandbox_sync as sync
+from .sandbox_exec import run_streaming
+from .sandbox_listing import MAX_DEPTH, MAX_PAGE_SIZE, format_listing, list_entries, listing_cache
 
-# --- 1. 全局单例 Sandbox（避免每次调用都新建一个实例耗时又烧钱） ---
+if TYPE_CHECKING:
+    from ppio_sandbox.code_interpreter import Sandbox
 
-_sbx = None
-_sbx_lock = threading.Lock()
+# --- 1. 沙箱池（每个对话租用一个实例，另外保留预热实例，避免每次调用都新建一个又慢又烧钱） ---
 
+_backend: Optional[SandboxBackend] = None
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
 
-def get_sandbox() -> Sandbox:
+# 没有 thread_id 的调用（比如直接 invoke 工具）共用这个会话
+DEFAULT_SESSION = "default"
+DEFAULT_EXEC_TIMEOUT = float(os.getenv("SANDBOX_EXEC_TIMEOUT", "120"))
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """
+    懒加载 + 单例：第一次使用沙箱时按 SANDBOX_BACKEND 选择后端（ppio / local），创建沙箱池并启动后台维护线程。
+    PPIO 后端的实例优先从上次进程退出时暂停的沙箱恢复，退出时再暂停；过期的暂停实例在后台回收。
+    实例在平台上的存活时间由维护线程定期续期，SANDBOX_IDLE_TIMEOUT 可以比它长。
     """
-    懒加载 + 单例：第一次调用时创建 PPIO Sandbox，后续复用。
+    global _backend, _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _backend = make_backend()
+                _pool = SandboxPool(
+                    _backend.create,
+                    size=int(os.getenv("SANDBOX_POOL_SIZE", "1")),
+                    max_sessions=int(os.getenv("SANDBOX_MAX_SESSIONS", "8")),
+                    idle_timeout=float(os.getenv("SANDBOX_IDLE_TIMEOUT", "600")),
+                    evict_after=float(os.getenv("SANDBOX_EVICT_AFTER", "60")),
+                    health_interval=float(os.getenv("SANDBOX_HEALTH_INTERVAL", "30")),
+                    retire=_backend.retire,
+                    keepalive=_backend.keep_alive if _backend.keepalive_interval else None,
+                    keepalive_interval=_backend.keepalive_interval,
+                )
+                threading.Thread(target=_collect_garbage, daemon=True, name="sandbox-gc").start()
+                _pool.start()
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def _collect_garbage() -> None:
+    try:
+        _backend.collect_garbage()
+    except Exception:
+        pass
+
+
+def _session_id(config: Optional[RunnableConfig]) -> str:
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    return DEFAULT_SESSION if thread_id is None else str(thread_id)
+
+
+def get_sandbox(session_id: str = DEFAULT_SESSION) -> "Sandbox":
     """
-    global _sbx
-    if _sbx is None:
-        with _sbx_lock:
-            if _sbx is None:
-                api_key = os.getenv("PPIO_API_KEY")
-                if not api_key:
-                    raise RuntimeError(
-                        "环境变量 PPIO_API_KEY 未设置，请在 .env 中添加 PPIO_API_KEY=xxx"
-                    )
-                _sbx = Sandbox.create()
-    return _sbx
+    返回会话 session_id 租用的沙箱；同一对话的多次调用总是落在同一个实例上。
+    工具内部用 get_sandbox_pool().using(session_id)，执行期间租约不会被收回。
+    """
+    return get_sandbox_pool().lease(session_id)
 
 
 # --- 2. 定义工具入参 schema（方便 Tongyi 做 function calling） ---
@@ -38,57 +83,173 @@ class SandboxCodeExecArgs(BaseModel):
         ...,
         description="要在沙箱中执行的完整 Python 代码字符串，比如 print('hello world')",
     )
+    timeout: float = Field(
+        DEFAULT_EXEC_TIMEOUT,
+        description="最长执行时间（秒），超时后中断执行",
+    )
+
+
+def _emit_tool_output(text: str) -> None:
+    # 在工具运行上下文里把输出片段作为自定义事件发出去；没有父 run（直接调用函数）时忽略
+    try:
+        dispatch_custom_event("tool_output", {"tool": "sandbox_code_exec", "text": text})
+    except RuntimeError:
+        pass
 
 
 # --- 3. LangChain 工具：给 LLM 调用的入口 ---
 
 @tool("sandbox_code_exec", args_schema=SandboxCodeExecArgs)
-def sandbox_code_exec(code: str) -> str:
+def sandbox_code_exec(code: str, timeout: float = DEFAULT_EXEC_TIMEOUT, config: RunnableConfig = None) -> str:
     """
-    在 PPIO 沙箱中执行一段 Python 代码，返回执行日志（转成字符串）。
+    在沙箱中执行一段 Python 代码，同一对话的多次调用共享变量。输出边执行边流式推送，
+    返回 JSON：stdout、stderr、results（表达式的值）、error（name/value/traceback）、duration 等。
     """
-    sbx = get_sandbox()
-    execution = sbx.run_code(code)
-
-    logs = getattr(execution, "logs", "")
-    # 防止 logs 不是字符串（比如 Logs 对象）
-    if not isinstance(logs, str):
-        logs = str(logs)
-
-    return logs or "[sandbox 无输出]"
-
-
-
-# --- 4.（可选）列出沙箱文件的工具 ---
+    session_id = _session_id(config)
+    try:
+        with get_sandbox_pool().using(session_id) as sbx:
+            try:
+                result = run_streaming(
+                    sbx,
+                    code,
+                    timeout=timeout,
+                    on_stdout=_emit_tool_output,
+                    on_stderr=_emit_tool_output,
+                    session_id=session_id,
+                )
+            finally:
+                # 代码可能改动任何文件：这个会话的目录列表缓存作废
+                listing_cache.invalidate(session_id)
+    except SandboxPoolFull as e:
+        return f"Error: {e}"
+    return result.to_json()
+
+
+# --- 4. 列出沙箱文件的工具（分页 + 短期缓存） ---
 
 class SandboxListFilesArgs(BaseModel):
     path: str = Field(
-        "/",
-        description="要列出的目录路径，默认为根目录 '/'",
+        ".",
+        description="要列出的目录路径，默认为沙箱的工作目录 '.'",
+    )
+    depth: int = Field(
+        1,
+        description=f"递归深度，1 表示只列出直接子项，最大 {MAX_DEPTH}",
+    )
+    glob: Optional[str] = Field(
+        None,
+        description="只保留名字或相对路径匹配该通配符的条目，比如 '*.py'",
+    )
+    cursor: int = Field(
+        0,
+        description="分页游标：从第几个条目开始（结果末尾会给出下一页的游标）",
+    )
+    page_size: int = Field(
+        100,
+        description=f"每页最多返回的条目数，最大 {MAX_PAGE_SIZE}",
     )
 
 
 @tool("sandbox_list_files", args_schema=SandboxListFilesArgs)
-def sandbox_list_files(path: str = "/") -> str:
+def sandbox_list_files(
+    path: str = ".",
+    depth: int = 1,
+    glob: Optional[str] = None,
+    cursor: int = 0,
+    page_size: int = 100,
+    config: RunnableConfig = None,
+) -> str:
     """
-    列出沙箱文件系统中某个目录下的文件。
+    列出沙箱文件系统中某个目录下的文件，输出 类型 / 大小 / 相对路径 的表格，条目多时分页。
     """
-    sbx = get_sandbox()
-    files = sbx.files.list(path)
-    return f"目录 {path} 下的文件：{files}"
+    session_id = _session_id(config)
+    depth = min(max(1, depth), MAX_DEPTH)
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    cursor = max(0, cursor)
+    try:
+        with get_sandbox_pool().using(session_id) as sbx:
+            entries = listing_cache.get(
+                session_id, sbx.sandbox_id, path, depth, lambda: list_entries(sbx, path, depth)
+            )
+    except SandboxPoolFull as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: 无法列出 {path}：{e}"
+
+    def next_call(next_cursor: int) -> str:
+        args = [f"path={path!r}", f"depth={depth}"]
+        if glob:
+            args.append(f"glob={glob!r}")
+        args += [f"cursor={next_cursor}", f"page_size={page_size}"]
+        return f"sandbox_list_files({', '.join(args)})"
+
+    return format_listing(path, entries, glob, cursor, page_size, next_call)
+
+
+# --- 5. 本地与沙箱之间同步目录 ---
+
+class SandboxSyncArgs(BaseModel):
+    local_path: str = Field(
+        ...,
+        description="本地目录（上传时也可以是单个文件），比如 tool/test",
+    )
+    remote_path: str = Field(
+        ...,
+        description="沙箱中的目标目录（绝对路径），比如 /home/user/tool/test",
+    )
+    direction: Literal["upload", "download"] = Field(
+        "upload",
+        description="upload：本地 -> 沙箱；download：沙箱 -> 本地",
+    )
+    delete: bool = Field(
+        False,
+        description="仅用于 upload：为 True 时删除沙箱里有、本地没有的文件，使两边完全一致。download 从不删除本地文件",
+    )
 
 
-# --- 5.（可选）提供一个关闭沙箱的工具 ---
+@tool("sandbox_sync", args_schema=SandboxSyncArgs)
+def sandbox_sync(
+    local_path: str,
+    remote_path: str,
+    direction: str = "upload",
+    delete: bool = False,
+    config: RunnableConfig = None,
+) -> str:
+    """
+    在本地和沙箱之间同步目录树：按内容哈希比较，只传有变化的文件。
+    在沙箱里运行本地脚本之前先用它把代码上传过去，跑完后再把结果下载回来。
+    """
+    if direction == "upload" and not os.path.exists(local_path):
+        return f"Error: 本地路径不存在：{local_path}"
+    if direction == "download" and delete:
+        return "Error: delete 只能用于 upload；download 只新增和覆盖本地文件，不会删除"
+    session_id = _session_id(config)
+    try:
+        with get_sandbox_pool().using(session_id) as sbx:
+            if direction == "upload":
+                try:
+                    report = sync.upload(sbx, local_path, remote_path, delete=delete)
+                finally:
+                    listing_cache.invalidate(session_id)
+                return report.summary(local_path, remote_path)
+            report = sync.download(sbx, remote_path, local_path)
+            return report.summary(remote_path, local_path)
+    except SandboxPoolFull as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: 同步失败：{e}"
+
+
+# --- 6.（可选）提供一个关闭沙箱的工具 ---
 
 @tool("sandbox_kill")
-def sandbox_kill() -> str:
+def sandbox_kill(config: RunnableConfig = None) -> str:
     """
-    关闭当前沙箱实例，一般用于长时间会话结束后手动释放资源。
-    再次调用 sandbox 工具时会自动重新创建。
+    关闭当前对话的沙箱实例，一般用于长时间会话结束后手动释放资源。
+    再次调用 sandbox 工具时会自动重新分配。
     """
-    global _sbx
-    if _sbx is not None:
-        _sbx.kill()
-        _sbx = None
-        return "当前 PPIO Sandbox 已关闭，后续调用会自动重新创建。"
+    session_id = _session_id(config)
+    listing_cache.invalidate(session_id)
+    if _pool is not None and _pool.release(session_id):
+        return "当前沙箱已关闭，后续调用会自动重新创建。"
     return "当前没有活跃的 Sandbox 实例。"
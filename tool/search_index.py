@@ -0,0 +1,269 @@
+# tool/search_index.py
+import os
+import time
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .bm25 import BM25Index, tokenize
+
+# 默认检索 workspace/，SEARCH_CORPORA 环境变量可以追加更多目录（os.pathsep 分隔）
+DEFAULT_ROOTS = ["workspace"]
+INDEX_PATH = os.path.join(".cache", "search_index.pkl")
+INDEX_VERSION = 1
+
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".rst", ".py", ".json", ".csv", ".log", ".yaml", ".yml",
+    ".ini", ".cfg", ".toml", ".html", ".htm", ".xml", ".js", ".ts",
+}
+SKIP_DIRS = {".git", "__pycache__", ".cache", "node_modules", ".venv", "venv"}
+MAX_FILE_BYTES = 5 * 1024 * 1024
+
+# 一个段落（检索单位）的目标长度（字符数）
+PASSAGE_CHARS = 600
+SNIPPET_CHARS = 240
+
+_query_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="search")
+
+
+@dataclass
+class SearchHit:
+    path: str
+    line: int
+    score: float
+    snippet: str
+
+
+def _read_text(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"\0" in data[:4096]:
+        return None  # 二进制文件
+    for encoding in ("utf-8", "gbk"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _split_passages(text: str) -> List[Tuple[int, str]]:
+    """
+    按行累积切成约 PASSAGE_CHARS 字符的段落，返回 [(起始行号, 段落文本)]。
+    """
+    passages: List[Tuple[int, str]] = []
+    buf: List[str] = []
+    size = 0
+    start = 1
+    for lineno, line in enumerate(text.splitlines(), 1):
+        if not buf:
+            start = lineno
+        buf.append(line)
+        size += len(line) + 1
+        if size >= PASSAGE_CHARS:
+            passages.append((start, "\n".join(buf)))
+            buf, size = [], 0
+    if buf and "".join(buf).strip():
+        passages.append((start, "\n".join(buf)))
+    return passages
+
+
+def _snippet(text: str, terms: Sequence[str]) -> str:
+    """
+    取段落中第一个命中词附近的一小段文字作为摘要。
+    """
+    lowered = text.lower()
+    hits = [i for i in (lowered.find(t) for t in terms) if i >= 0]
+    pos = min(hits) if hits else 0
+    begin = max(0, pos - SNIPPET_CHARS // 3)
+    end = min(len(text), begin + SNIPPET_CHARS)
+    snippet = " ".join(text[begin:end].split())
+    return ("…" if begin > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    """
+    本地全文检索：对若干根目录下的文本文件建立 BM25 段落索引。
+    - 索引落盘（pickle），启动时加载；
+    - refresh() 只对 mtime / size 变化的文件重新切分和索引，删除的文件从索引中移除；
+    - generation 在索引内容变化时递增，可用于结果缓存的失效。
+    """
+
+    def __init__(
+        self,
+        roots: Sequence[str],
+        index_path: Optional[str] = INDEX_PATH,
+        refresh_interval: float = 1.0,
+    ):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.index_path = index_path
+        self.refresh_interval = refresh_interval
+        self.generation = 0
+        self._bm25 = BM25Index()
+        self._files: Dict[str, Tuple[int, int, int]] = {}  # path -> (mtime_ns, size, 段落数)
+        self._passages: Dict[Tuple[str, int], Tuple[int, str]] = {}  # (path, 序号) -> (行号, 文本)
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self._load()
+
+    # --- 持久化 ---
+
+    def _load(self) -> None:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("roots") != self.roots:
+            return
+        self._bm25 = data["bm25"]
+        self._files = data["files"]
+        self._passages = data["passages"]
+        self.generation = data["generation"]
+
+    def _save(self) -> None:
+        if not self.index_path:
+            return
+        data = {
+            "version": INDEX_VERSION,
+            "roots": self.roots,
+            "generation": self.generation,
+            "bm25": self._bm25,
+            "files": self._files,
+            "passages": self._passages,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    # --- 增量索引 ---
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        found: Dict[str, Tuple[int, int]] = {}
+        for root in self.roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+                for name in filenames:
+                    if os.path.splitext(name)[1].lower() not in TEXT_EXTENSIONS:
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    if st.st_size <= MAX_FILE_BYTES:
+                        found[path] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def _remove_file(self, path: str) -> None:
+        _, _, count = self._files.pop(path)
+        for i in range(count):
+            self._bm25.remove((path, i))
+            self._passages.pop((path, i), None)
+
+    def _index_file(self, path: str, stamp: Tuple[int, int]) -> None:
+        try:
+            text = _read_text(path)
+        except OSError:
+            return
+        passages = _split_passages(text) if text else []
+        for i, (line, passage) in enumerate(passages):
+            # 文件名也参与检索，便于按文件名找到文档
+            self._bm25.add((path, i), tokenize(f"{os.path.basename(path)}\n{passage}"))
+            self._passages[(path, i)] = (line, passage)
+        self._files[path] = (stamp[0], stamp[1], len(passages))
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        同步索引与磁盘内容，返回索引是否有变化。两次刷新间隔小于 refresh_interval 时直接跳过。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return False
+            self._last_refresh = now
+            found = self._scan()
+            changed = False
+            for path in list(self._files):
+                if path not in found:
+                    self._remove_file(path)
+                    changed = True
+            for path, stamp in found.items():
+                old = self._files.get(path)
+                if old is not None and old[:2] == stamp:
+                    continue
+                if old is not None:
+                    self._remove_file(path)
+                self._index_file(path, stamp)
+                changed = True
+            if changed:
+                self.generation += 1
+                self._save()
+            return changed
+
+    # --- 查询 ---
+
+    def _search_one(self, query: str, limit: int) -> List[Tuple[Tuple[str, int], float]]:
+        scores = self._bm25.score(tokenize(query))
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+    def search(self, queries: Sequence[str], top_k: int = 5) -> List[SearchHit]:
+        """
+        多个查询变体并行检索，用 RRF（倒数排名融合）合并排名，同一段落 / 内容相同的段落只保留一次。
+        """
+        self.refresh()
+        queries = [q for q in queries if q.strip()]
+        if not queries:
+            return []
+        with self._lock:
+            per_query = list(_query_executor.map(lambda q: self._search_one(q, top_k * 4), queries))
+            fused: Dict[Tuple[str, int], float] = {}
+            for ranked in per_query:
+                for rank, (doc_id, _) in enumerate(ranked):
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (60 + rank)
+
+            terms = sorted({t for q in queries for t in tokenize(q, unigrams=False)}, key=len, reverse=True)
+            hits: List[SearchHit] = []
+            seen_text = set()
+            for doc_id, score in sorted(fused.items(), key=lambda kv: kv[1], reverse=True):
+                line, text = self._passages[doc_id]
+                fingerprint = " ".join(text.split())
+                if fingerprint in seen_text:
+                    continue
+                seen_text.add(fingerprint)
+                hits.append(SearchHit(doc_id[0], line, score, _snippet(text, terms)))
+                if len(hits) >= top_k:
+                    break
+            return hits
+
+
+def _configured_roots() -> List[str]:
+    roots = list(DEFAULT_ROOTS)
+    extra = os.getenv("SEARCH_CORPORA", "")
+    roots.extend(p for p in extra.split(os.pathsep) if p)
+    return roots
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """
+    懒加载 + 单例：第一次检索时加载（或建立）磁盘索引。
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex(_configured_roots())
+    return _index
@@ -0,0 +1,94 @@
+# tool/selector.py
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .bm25 import BM25Index, tokenize
+from .registry import ToolRegistry, registry
+
+# 工具描述大多是英文，用户输入多是中文：给每个工具补一些中英文关键词，参与检索
+TOOL_HINTS: Dict[str, str] = {
+    "file_read": "读取 读 查看 打开 文件 内容 路径 read open view file path py txt md csv json log",
+    "file_read_many": "读取 多个 批量 所有 全部 文件 目录 通配 read many multiple files glob all",
+    "file_write": "写入 写 保存 生成 文档 文件 总结 输出 追加 修改 替换 补丁 save write append edit patch file document",
+    "file_grep": "查找 搜索 定位 匹配 正则 哪个文件 哪一行 代码 函数 定义 grep regex find search pattern line",
+    "shell_exec": "命令 终端 shell 执行 运行 安装 pdf 转换 语音 command terminal install",
+    "search_info": "搜索 查找 检索 查询 资料 信息 网络 search find lookup information",
+    "code_exec": "代码 python 计算 数据 处理 执行 运行 脚本 code compute script",
+    "plan_task": "计划 规划 步骤 拆解 任务 plan steps",
+    "sandbox_code_exec": "沙箱 sandbox 代码 运行 执行 python 脚本 隔离 远程",
+    "sandbox_list_files": "沙箱 sandbox 文件 目录 列表 列出 递归 通配 翻页 list directory tree glob ls",
+    "sandbox_sync": "沙箱 sandbox 上传 下载 同步 拷贝 传 文件 目录 代码 upload download sync copy",
+    "sandbox_kill": "沙箱 sandbox 关闭 释放 销毁 kill close",
+    "tool_output_page": "下一页 翻页 分页 剩余 输出 继续 page next output",
+}
+
+# 每轮都绑定的核心工具：检索打分漏掉时（比如“列出 workspace 目录下的所有文件”），模型仍能读文件、跑命令和代码
+CORE_TOOLS: Tuple[str, ...] = ("plan_task", "file_read", "shell_exec", "code_exec")
+
+# 输入里出现文件路径（带扩展名或盘符/目录分隔符）时，基本都需要先读文件
+_PATH_RE = re.compile(r"[A-Za-z]:[\\/]|[\w.-]+\.(?:py|txt|md|csv|json|log|yaml|yml|ini|cfg|html|js|ts)\b")
+
+
+class ToolSelector:
+    """
+    按当前输入给工具打分，只把最相关的 top-k 个工具绑定给 LLM，减少每轮发送的 schema token。
+    索引建立在工具名、描述、参数描述和 TOOL_HINTS 上，纯本地计算，不调用模型。
+    """
+
+    def __init__(
+        self,
+        tool_registry: ToolRegistry = registry,
+        top_k: int = 4,
+        always: Sequence[str] = CORE_TOOLS,
+        min_score: float = 0.5,
+        relative_cutoff: float = 0.2,
+    ):
+        self.registry = tool_registry
+        self.top_k = top_k
+        self.always = tuple(always)
+        self.min_score = min_score
+        self.relative_cutoff = relative_cutoff
+        self._index: Optional[BM25Index] = None
+
+    def _build_index(self) -> BM25Index:
+        index = BM25Index()
+        for schema in self.registry.schemas():
+            fn = schema["function"]
+            name = fn["name"]
+            params = fn.get("parameters", {}).get("properties", {})
+            text = " ".join(
+                [name, name, fn.get("description", ""), TOOL_HINTS.get(name, "")]
+                + [f"{p} {spec.get('description', '')}" for p, spec in params.items()]
+            )
+            index.add(name, tokenize(text, unigrams=False))
+        return index
+
+    def rank(self, query: str) -> List[Tuple[str, float]]:
+        if self._index is None:
+            self._index = self._build_index()
+        scores = self._index.score(tokenize(query, unigrams=False))
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+    def select(self, query: str, required: Iterable[str] = ()) -> Tuple[str, ...]:
+        """
+        返回本轮要绑定的工具名（按注册表顺序，保证同一组合的 schema 顺序固定）。
+        always 里的核心工具和 required 里的工具（比如本轮已经调用过的）一定会保留；
+        得分低于最高分 relative_cutoff 倍的工具视为噪声丢弃；
+        没有任何工具得分达到 min_score 时退回完整工具集。
+        """
+        all_names = self.registry.names()
+        if self.top_k <= 0 or self.top_k >= len(all_names):
+            return tuple(all_names)
+
+        ranked = self.rank(query)
+        if not ranked or ranked[0][1] < self.min_score:
+            return tuple(all_names)
+        cutoff = max(self.min_score, ranked[0][1] * self.relative_cutoff)
+        ranked = [(name, score) for name, score in ranked if score >= cutoff]
+
+        chosen = {name for name, _ in ranked[: self.top_k]}
+        chosen.update(n for n in self.always if n in self.registry)
+        chosen.update(n for n in required if n in self.registry)
+        if _PATH_RE.search(query) and "file_read" in self.registry:
+            chosen.add("file_read")
+        return tuple(n for n in all_names if n in chosen)
@@ -0,0 +1,194 @@
+# tool/session_registry.py
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Generic, Hashable, List, Optional, Tuple, TypeVar
+
+
+class SessionLimitError(RuntimeError):
+    """会话数已达上限，而其余会话都在执行中，腾不出位置。"""
+
+
+class Session:
+    """
+    常驻会话的公共状态：lock 让同一会话的调用串行执行，closed 表示已被回收（拿到锁后要先检查）。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.closed = False
+
+
+S = TypeVar("S", bound=Session)
+
+
+class SessionRegistry(ABC, Generic[S]):
+    """
+    按 key 维护常驻会话（Python 内核、shell 等）的通用部分：
+    - 第一次用到某个 key 时新建会话，之后复用；新建在锁外进行，慢的启动不会挡住其他会话；
+    - 会话数达到 max_sessions 时按最久未用的顺序回收空闲会话（正在执行的和当前 key 自己不动），
+      腾不出位置时抛 SessionLimitError；
+    - 空闲超过 idle_timeout 秒、或已经失效的会话由后台线程回收。
+    子类实现 _create / _terminate，需要时覆盖 _usable。
+    """
+
+    closed_message = "SessionRegistry 已关闭"
+    reaper_name = "session-reaper"
+
+    def __init__(self, idle_timeout: float, max_sessions: int, reap_interval: float):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.reap_interval = reap_interval
+        self._sessions: "OrderedDict[Hashable, S]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+        self._closed = False
+
+    @abstractmethod
+    def _create(self) -> S:
+        """启动一个新会话（在锁外调用）。"""
+
+    @abstractmethod
+    def _terminate(self, session: S) -> None:
+        """结束会话的进程（在锁外调用）。"""
+
+    def _usable(self, session: S) -> bool:
+        return not session.closed
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._sessions)
+
+    # --- 取会话 ---
+
+    def _acquire(self, key: Hashable) -> S:
+        with self._lock:
+            self._check_open()
+            session = self._sessions.get(key)
+            if session is not None and self._usable(session):
+                self._sessions.move_to_end(key)
+                return session
+            # 先确认有位置再去启动新会话，满了就直接拒绝
+            evicted = self._make_room(key)
+        self._stop_all(evicted)
+
+        created = self._create()
+        with self._lock:
+            existing = self._sessions.get(key)
+            if not self._closed and existing is not None and self._usable(existing):
+                # 同一 key 的并发调用抢先建好了：用它的，丢掉自己这个
+                self._sessions.move_to_end(key)
+                session, discard = existing, [created]
+            else:
+                try:
+                    self._check_open()
+                    # 启动期间别的 key 可能占掉了位置
+                    discard = self._make_room(key)
+                except RuntimeError:
+                    self._terminate(created)
+                    raise
+                if existing is not None:
+                    discard.append(self._detach(key, existing))
+                self._sessions[key] = session = created
+                self._start_reaper()
+        self._stop_all(discard)
+        return session
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError(self.closed_message)
+
+    def _make_room(self, key: Hashable) -> List[S]:
+        """
+        调用方已持有 self._lock：为 key 的新会话腾出位置，返回被回收的会话（由调用方在锁外结束进程）。
+        只回收不在执行中的其他会话；不够时什么都不回收，抛 SessionLimitError。
+        """
+        others = [k for k in self._sessions if k != key]
+        need = len(others) - self.max_sessions + 1
+        if need <= 0:
+            return []
+        victims: List[Tuple[Hashable, S]] = []
+        for k in others:
+            if len(victims) == need:
+                break
+            session = self._sessions[k]
+            if session.lock.acquire(blocking=False):
+                victims.append((k, session))
+        try:
+            if len(victims) < need:
+                raise SessionLimitError(
+                    f"会话数已达上限 {self.max_sessions}，其余会话都在执行中；请稍后再试，或调大会话上限"
+                )
+            return [self._detach(k, session) for k, session in victims]
+        finally:
+            for _, session in victims:
+                session.lock.release()
+
+    def _detach(self, key: Hashable, session: S) -> S:
+        # 调用方已持有 self._lock（以及会话自己的锁，或确定它没在执行）：标记回收并移出表
+        session.closed = True
+        if self._sessions.get(key) is session:
+            del self._sessions[key]
+        return session
+
+    def _stop_all(self, sessions: List[S]) -> None:
+        for session in sessions:
+            self._terminate(session)
+
+    # --- 回收 ---
+
+    def discard(self, key: Hashable, session: Optional[S] = None) -> bool:
+        """
+        回收 key 的会话（给了 session 时只在它仍是当前会话时回收），返回是否回收了。
+        调用方不能持有 self._lock；持有会话锁与否都可以。
+        """
+        with self._lock:
+            current = self._sessions.get(key)
+            if current is None or (session is not None and current is not session):
+                return False
+            self._detach(key, current)
+        self._terminate(current)
+        return True
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """
+        回收空闲超时或已经失效的会话，返回回收的数量。
+        """
+        now = time.monotonic() if now is None else now
+        reaped = []
+        with self._lock:
+            for key, session in list(self._sessions.items()):
+                if self._usable(session) and now - session.last_used < self.idle_timeout:
+                    continue
+                if session.lock.acquire(blocking=False):
+                    try:
+                        reaped.append(self._detach(key, session))
+                    finally:
+                        session.lock.release()
+        self._stop_all(reaped)
+        return len(reaped)
+
+    def _start_reaper(self) -> None:
+        # 调用方已持有 self._lock
+        if self._reaper is not None or not self.idle_timeout:
+            return
+
+        def loop():
+            while not self._stop.wait(self.reap_interval):
+                self.reap()
+
+        self._reaper = threading.Thread(target=loop, daemon=True, name=self.reaper_name)
+        self._reaper.start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._closed = True
+            sessions = [self._detach(key, session) for key, session in list(self._sessions.items())]
+        self._stop_all(sessions)
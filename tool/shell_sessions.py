@@ -0,0 +1,346 @@
+# tool/shell_sessions.py
+import os
+import time
+import uuid
+import queue
+import codecs
+import atexit
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass
+from typing import Callable, Hashable, List, Optional
+
+from .session_registry import Session, SessionRegistry
+
+# 返回给模型的输出上限（字符数）；超出时保留首尾，完整输出落盘到 SPILL_DIR
+MAX_OUTPUT_CHARS = 20_000
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "agent_shell_output")
+
+
+@dataclass
+class ShellResult:
+    """
+    一条命令的执行结果。status: ok / timeout / crashed / syntax_error（命令没有执行，会话不受影响）
+    output 是（可能被截断的）stdout+stderr；spill_path 非空时完整输出保存在该文件里。
+    """
+    status: str
+    output: str = ""
+    exit_code: Optional[int] = None
+    duration: float = 0.0
+    truncated: bool = False
+    spill_path: Optional[str] = None
+
+
+def _find_shell() -> List[str]:
+    bash = shutil.which("bash")
+    if bash:
+        return [bash, "--noprofile", "--norc"]
+    sh = shutil.which("sh")
+    if sh:
+        return [sh]
+    raise RuntimeError("找不到可用的 POSIX shell（bash / sh），shell_exec 无法使用")
+
+
+def check_syntax(command: str, timeout: float = 5) -> Optional[str]:
+    """
+    用 shell 的 -n（只解析不执行）检查命令语法，返回错误信息；没问题时返回 None。
+    引号没闭合之类的命令送进常驻 shell 会一直等后续输入直到超时，整个会话被杀掉，所以先在外面检查。
+    """
+    try:
+        proc = subprocess.run(
+            _find_shell() + ["-n", "-c", command],
+            stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        # 检查本身出问题时不拦截，交给会话执行
+        return None
+    if proc.returncode == 0:
+        return None
+    return proc.stderr.decode("utf-8", errors="replace").strip() or f"syntax error (exit code {proc.returncode})"
+
+
+def _partial_suffix(text: str, marker: str) -> int:
+    """
+    text 末尾与 marker 开头重合的最大长度。
+    """
+    for k in range(min(len(marker), len(text)), 0, -1):
+        if marker.startswith(text[-k:]):
+            return k
+    return 0
+
+
+class _OutputBuffer:
+    """
+    累积一条命令的输出：内存里只保留前后各一半 max_chars，超出部分写进落盘文件。
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.head: List[str] = []
+        self.head_size = 0
+        self.tail = ""
+        self.total = 0
+        self._spill = None
+        self.spill_path: Optional[str] = None
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        self.total += len(text)
+        if self._spill is not None:
+            self._spill.write(text)
+            self.tail = (self.tail + text)[-(self.max_chars // 2):]
+            return
+        self.head.append(text)
+        self.head_size += len(text)
+        if self.head_size > self.max_chars:
+            self._start_spill()
+
+    def _start_spill(self) -> None:
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        fd, self.spill_path = tempfile.mkstemp(prefix="shell_", suffix=".log", dir=SPILL_DIR)
+        self._spill = os.fdopen(fd, "w", encoding="utf-8", errors="replace")
+        full = "".join(self.head)
+        self._spill.write(full)
+        half = self.max_chars // 2
+        self.head, self.head_size = [full[:half]], half
+        self.tail = full[-half:]
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+
+    def getvalue(self) -> str:
+        if self.spill_path is None:
+            return "".join(self.head)
+        omitted = self.total - self.head_size - len(self.tail)
+        return (
+            f"{''.join(self.head)}\n"
+            f"[... 省略 {omitted} 字符，完整输出已保存到 {self.spill_path} ...]\n"
+            f"{self.tail}"
+        )
+
+
+class ShellSession(Session):
+    """
+    一个常驻的 shell 进程：cd、环境变量、shell 变量在多条命令之间保留，不必每条命令新开进程。
+    命令通过 stdin 写入，用带随机 token 的结束标记回传退出码；stdout/stderr 合并后实时读取。
+    """
+
+    def __init__(self, cwd: Optional[str] = None, env: Optional[dict] = None):
+        super().__init__()  # lock：同一会话的命令串行执行
+        self._token = uuid.uuid4().hex
+        popen_kwargs = {}
+        if os.name == "posix":
+            # 独立进程组：超时时连同子进程一起杀掉
+            popen_kwargs["start_new_session"] = True
+        self.process = subprocess.Popen(
+            _find_shell(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+            env=env,
+            bufsize=0,
+            **popen_kwargs,
+        )
+        self._chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True, name="shell-reader")
+        self._reader.start()
+
+    def _read_loop(self) -> None:
+        fd = self.process.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b""
+            if not data:
+                self._chunks.put(None)
+                return
+            self._chunks.put(data)
+
+    def alive(self) -> bool:
+        return not self.closed and self.process.poll() is None
+
+    def run(
+        self,
+        command: str,
+        timeout: float = 30,
+        on_output: Optional[Callable[[str], None]] = None,
+        max_output_chars: int = MAX_OUTPUT_CHARS,
+    ) -> ShellResult:
+        """
+        执行一条命令直到结束或超时。超时后整个会话被杀掉（status="timeout"），调用方应丢弃它。
+        """
+        marker = f"__SHELL_DONE_{self._token}__"
+        # 花括号在当前 shell 里执行（cd / export 会保留）；stdin 接 /dev/null，防止命令读走后面的结束标记
+        script = f"{{\n{command}\n}} < /dev/null\nprintf '\\n{marker}%s\\n' \"$?\"\n"
+        start = time.perf_counter()
+        deadline = start + timeout
+        buffer = _OutputBuffer(max_output_chars)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        status, exit_code = "crashed", None
+        try:
+            self.process.stdin.write(script.encode("utf-8"))
+            self.process.stdin.flush()
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    status = "timeout"
+                    break
+                try:
+                    data = self._chunks.get(timeout=remaining)
+                except queue.Empty:
+                    status = "timeout"
+                    break
+                if data is None:
+                    break
+                pending += decoder.decode(data)
+                idx = pending.find(marker)
+                if idx >= 0:
+                    end = pending.find("\n", idx)
+                    if end < 0:
+                        continue
+                    # 结束标记前多打印的那个换行不属于命令输出
+                    text = pending[:idx]
+                    text = text[:-1] if text.endswith("\n") else text
+                    buffer.write(text)
+                    if on_output is not None and text:
+                        on_output(text)
+                    exit_code = int(pending[idx + len(marker):end] or -1)
+                    status = "ok"
+                    break
+                # 末尾可能是半个结束标记（含前面的换行），先留着，其余部分立即输出
+                safe = len(pending) - _partial_suffix(pending, "\n" + marker)
+                if safe > 0:
+                    text, pending = pending[:safe], pending[safe:]
+                    buffer.write(text)
+                    if on_output is not None:
+                        on_output(text)
+        except (OSError, BrokenPipeError):
+            status = "crashed"
+        self.last_used = time.monotonic()
+
+        if status != "ok":
+            if pending:
+                buffer.write(pending)
+            self.kill()
+            if status == "crashed":
+                exit_code = self.process.returncode
+        buffer.close()
+        return ShellResult(
+            status=status,
+            output=buffer.getvalue(),
+            exit_code=exit_code,
+            duration=time.perf_counter() - start,
+            truncated=buffer.spill_path is not None,
+            spill_path=buffer.spill_path,
+        )
+
+    def kill(self) -> None:
+        self.closed = True
+        if self.process.poll() is None:
+            try:
+                if os.name == "posix":
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                else:  # pragma: no cover
+                    self.process.kill()
+            except (OSError, ProcessLookupError):
+                pass
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class ShellSessionRegistry(SessionRegistry[ShellSession]):
+    """
+    按 key（一般是 (thread_id, session)）管理常驻 shell：
+    - 第一次用到某个 key 时启动 shell，之后复用；
+    - 空闲超过 idle_timeout 秒的会话由后台线程回收；
+    - 会话数达到 max_sessions 时回收最久未使用的空闲会话，其余都在执行中时抛 SessionLimitError；
+    - 超时 / 崩溃的会话直接丢弃，下次调用自动新建（cd、环境变量等状态会丢失）；
+      语法错误的命令在送进会话之前就被拦下，不会拖到超时把会话杀掉。
+    """
+
+    closed_message = "ShellSessionRegistry 已关闭"
+    reaper_name = "shell-reaper"
+
+    def __init__(
+        self,
+        idle_timeout: float = 900,
+        max_sessions: int = 16,
+        reap_interval: float = 60,
+        cwd: Optional[str] = None,
+    ):
+        super().__init__(idle_timeout=idle_timeout, max_sessions=max_sessions, reap_interval=reap_interval)
+        self.cwd = cwd
+
+    def _create(self) -> ShellSession:
+        return ShellSession(cwd=self.cwd)
+
+    def _terminate(self, session: ShellSession) -> None:
+        session.kill()
+
+    def _usable(self, session: ShellSession) -> bool:
+        return session.alive()
+
+    def run(
+        self,
+        key: Hashable,
+        command: str,
+        timeout: float = 30,
+        on_output: Optional[Callable[[str], None]] = None,
+    ) -> ShellResult:
+        error = check_syntax(command)
+        if error is not None:
+            return ShellResult(status="syntax_error", output=error, exit_code=2)
+        while True:
+            session = self._acquire(key)
+            with session.lock:
+                if session.closed:
+                    # 拿到锁之前被回收了，重新取一个
+                    continue
+                result = session.run(command, timeout=timeout, on_output=on_output)
+                if result.status != "ok":
+                    self.discard(key, session)
+                return result
+
+    def close(self, key: Hashable) -> bool:
+        with self._lock:
+            session = self._sessions.get(key)
+        if session is None:
+            return False
+        with session.lock:
+            self.discard(key, session)
+        return True
+
+
+_registry: Optional[ShellSessionRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_shell_registry() -> ShellSessionRegistry:
+    """
+    懒加载 + 单例：第一次执行 shell 命令时创建，进程退出时杀掉所有会话。
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ShellSessionRegistry(
+                    idle_timeout=float(os.getenv("SHELL_IDLE_TIMEOUT", "900")),
+                    max_sessions=int(os.getenv("SHELL_MAX_SESSIONS", "16")),
+                )
+                atexit.register(_registry.shutdown)
+    return _registry
@@ -1,13 +1,21 @@
 import os
-from typing import List
+import re
+import glob as globlib
+from typing import List, Literal, Union
 import json
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks.manager import dispatch_custom_event
 from pydantic import BaseModel, Field
-from .sandbox_tools import (
-    sandbox_code_exec,
-    sandbox_list_files,
-    sandbox_kill,
-)
+from .cache import idempotent, tool_cache
+from .code_runner import get_code_pool, get_kernel_manager
+from .shell_sessions import get_shell_registry
+from .search_index import get_search_index
+from .file_index import file_index
+from .grep import format_matches, grep
+from .file_edit import PatchError, apply_unified_diff, atomic_write, read_text, replace_lines
+from context_manager import estimate_tokens
 # --- Pydantic Schemas for Tool Inputs ---
 
 class FileReadInput(BaseModel):
@@ -16,24 +24,52 @@ class FileReadInput(BaseModel):
     range_start: int = Field(default=1, description="The starting line number (1-indexed).")
     range_end: int = Field(default=-1, description="The ending line number (-1 means to the end of the file).")
 
+class FileReadSpec(BaseModel):
+    """One file (or glob) with an optional line range, for file_read_many."""
+    path: str = Field(description="File path or glob pattern (e.g. 'workspace/*.txt', 'tool/**/*.py').")
+    range_start: int = Field(default=1, description="The starting line number (1-indexed).")
+    range_end: int = Field(default=-1, description="The ending line number (-1 means to the end of the file).")
+
+class FileReadManyInput(BaseModel):
+    """Input for file_read_many tool."""
+    paths: List[Union[str, FileReadSpec]] = Field(description="Files to read: plain paths or globs, or objects with a path/glob and a line range.")
+    max_total_tokens: int = Field(default=4000, description="Total budget for the returned contents. Reading stops at the first file that exceeds it: that file is truncated and the remaining files are listed as skipped, to be read in a follow-up call.")
+
 class FileWriteInput(BaseModel):
     """Input for file_write tool."""
-    path: str = Field(description="The absolute path to the file to write to. If the file exists, it will be overwritten.")
-    content: str = Field(description="The full content to write to the file.")
+    path: str = Field(description="The absolute path to the file to write to.")
+    content: str = Field(description="For 'overwrite': the full file content. For 'append': the text to add at the end. For 'replace_lines': the new text for the line range. For 'patch': a unified diff of the file.")
+    mode: Literal["overwrite", "append", "replace_lines", "patch"] = Field(
+        default="overwrite",
+        description="How to write. Prefer 'append', 'replace_lines' or 'patch' to change part of an existing file instead of resending all of it.",
+    )
+    start_line: int = Field(default=1, description="For 'replace_lines': the first line to replace (1-indexed).")
+    end_line: int = Field(default=-1, description="For 'replace_lines': the last line to replace (inclusive). Use start_line - 1 to insert before start_line without deleting anything.")
+
+class FileGrepInput(BaseModel):
+    """Input for file_grep tool."""
+    pattern: str = Field(description="Python regular expression to search for, e.g. 'def \\w+_exec' or 'TODO'.")
+    path: str = Field(default=".", description="Directory (searched recursively) or single file to search.")
+    glob: List[str] = Field(default_factory=list, description="Only search files whose name or relative path matches one of these globs, e.g. ['*.py', 'docs/**/*.md'].")
+    ignore_case: bool = Field(default=False, description="Case-insensitive matching.")
+    context_lines: int = Field(default=0, description="Number of lines of context to show before and after each match.")
+    max_results: int = Field(default=50, description="Stop after this many matching lines.")
 
 class ShellExecInput(BaseModel):
     """Input for shell_exec tool."""
     command: str = Field(description="The shell command to execute. Use '&&' to chain commands. For Layer 2 tools, the command should be the utility name followed by arguments (e.g., 'manus-md-to-pdf input.md output.pdf').")
-    session: str = Field(default="default", description="The unique identifier for the shell session.")
-    timeout: int = Field(default=30, description="Timeout in seconds for the command execution.")
+    session: str = Field(default="default", description="The unique identifier for the shell session. Commands in the same session share the working directory and environment variables.")
+    timeout: int = Field(default=30, description="Timeout in seconds for the command execution. The session is terminated when it is exceeded.")
 
 class SearchInfoInput(BaseModel):
     """Input for search_info tool."""
-    queries: List[str] = Field(description="Up to 3 query variants that express the same search intent.")
+    queries: List[str] = Field(description="Up to 3 query variants that express the same search intent. Keywords work best.")
 
 class CodeExecInput(BaseModel):
     """Input for code_exec tool (Layer 3)."""
-    code: str = Field(description="The Python code to execute. The code will be run in a separate process. Use 'print()' to output results.")
+    code: str = Field(description="The Python code to execute. The code will be run in a separate process. Use 'print()' to output results. Variables, imports and loaded data persist between calls in the same conversation.")
+    timeout: int = Field(default=30, description="Wall-clock timeout in seconds. The execution is killed when it is exceeded.")
+    reset: bool = Field(default=False, description="Clear all variables and imports of this conversation's interpreter before running the code.")
 
 
 class PlanTaskInput(BaseModel):
@@ -44,130 +80,293 @@ class PlanTaskInput(BaseModel):
                     "Each step should be a short, actionable instruction."
     )
 
+# file_read_many 一次最多读多少个文件、单个文件最多读多少行
+READ_MANY_MAX_FILES = 50
+READ_MANY_MAX_LINES = 2000
+_read_many_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="read-many")
+
+# --- Cache keys for idempotent tools ---
+
+def _file_read_key(path: str, range_start: int = 1, range_end: int = -1):
+    # 文件内容变了 mtime/size 就会变，旧条目自然不再命中；文件不存在时返回 None，不走缓存
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_mtime_ns, st.st_size, range_start, range_end)
+
+
+def _search_info_key(queries: List[str]):
+    # 大小写、空白、顺序、重复都不影响检索意图；索引代数变了（文件有增删改）旧结果自然失效
+    index = get_search_index()
+    index.refresh()
+    return (index.generation, tuple(sorted({" ".join(q.lower().split()) for q in queries})))
+
+
+def _emit_tool_output(tool_name: str, text: str) -> None:
+    # 在工具运行上下文里把输出片段作为自定义事件发出去；没有父 run（直接调用函数）时忽略
+    try:
+        dispatch_custom_event("tool_output", {"tool": tool_name, "text": text})
+    except RuntimeError:
+        pass
+
+
 # --- Layer 1: Atomic Function Calling Tools ---
 
 @tool(args_schema=FileReadInput)
+@idempotent(_file_read_key, paths_fn=lambda path, *args, **kwargs: [path])
 def file_read(path: str, range_start: int = 1, range_end: int = -1) -> str:
     """
     Reads the content of a text file.
     This is a Layer 1 atomic tool.
     """
     try:
-        # Simulate the file tool's read action
-        # In a real system, this would call the file tool API
-        # Try UTF-8 first, then fall back to other encodings
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        except UnicodeDecodeError:
-            # Fall back to GBK encoding
-            try:
-                with open(path, 'r', encoding='gbk') as f:
-                    lines = f.readlines()
-            except UnicodeDecodeError:
-                # Last resort: use latin-1 which accepts all byte values
-                with open(path, 'r', encoding='latin-1') as f:
-                    lines = f.readlines()
-        
-        start = max(0, range_start - 1)
-        end = len(lines) if range_end == -1 else min(len(lines), range_end)
-        
-        content = "".join(lines[start:end])
-        
+        # 编码只探测一次；行偏移索引按 (path, mtime) 缓存，内容经 mmap 按需读取（见 file_index），
+        # 读大文件的一小段不必把整个文件读进内存
+        lines = file_index.read_lines(path, range_start, range_end)
+        content = lines.text
+
         if not content:
             return f"Error: File '{path}' is empty or the specified range is invalid."
-            
-        return f"Successfully read file '{path}' (lines {start+1}-{end}):\n---\n{content}\n---"
+
+        return f"Successfully read file '{path}' (lines {lines.start}-{lines.end}):\n---\n{content}\n---"
     except FileNotFoundError:
         return f"Error: File not found at path '{path}'."
     except Exception as e:
         return f"Error reading file '{path}': {e}"
 
+@tool(args_schema=FileReadManyInput)
+def file_read_many(paths: List[Union[str, FileReadSpec]], max_total_tokens: int = 4000) -> str:
+    """
+    Reads several text files (paths or globs, each with an optional line range) in one call
+    and returns them together as JSON. Prefer it over multiple file_read calls.
+    This is a Layer 1 atomic tool.
+    """
+    # 展开 glob 后并发读取（共用 file_index 的行索引缓存），再按顺序套用总 token 预算
+    specs = []
+    seen = set()
+    missing = []
+    for item in paths:
+        spec = item if isinstance(item, FileReadSpec) else FileReadSpec.model_validate(
+            item if isinstance(item, dict) else {"path": item}
+        )
+        matched = sorted(p for p in globlib.glob(spec.path, recursive=True) if os.path.isfile(p))
+        if not matched:
+            if globlib.has_magic(spec.path) or not os.path.isfile(spec.path):
+                missing.append(spec.path)
+                continue
+            matched = [spec.path]
+        for p in matched:
+            key = (os.path.realpath(p), spec.range_start, spec.range_end)
+            if key not in seen and len(specs) < READ_MANY_MAX_FILES:
+                seen.add(key)
+                specs.append((p, spec.range_start, spec.range_end))
+
+    def read_one(spec):
+        path, start, end = spec
+        # 预算再大也不会一次读完整个大文件：单个文件最多读 READ_MANY_MAX_LINES 行
+        if end == -1 or end - start + 1 > READ_MANY_MAX_LINES:
+            end = start + READ_MANY_MAX_LINES - 1
+        try:
+            return path, file_index.read_lines(path, start, end), None
+        except Exception as e:
+            return path, None, f"{type(e).__name__}: {e}"
+
+    results = list(_read_many_executor.map(read_one, specs)) if specs else []
+
+    files = []
+    skipped = []
+    budget = max(0, max_total_tokens)
+    for (path, lines, error), (_, start, end) in zip(results, specs):
+        if budget <= 0:
+            # 预算用完（上一个文件已被截断）：后面的文件一律不返回片段，只列出路径留给下一次调用
+            skipped.append(path)
+            continue
+        if error is not None:
+            files.append({"path": path, "error": error})
+            continue
+        entry = {"path": path, "range_start": lines.start, "range_end": lines.end, "total_lines": lines.total}
+        text = lines.text
+        tokens = estimate_tokens(text)
+        if tokens > budget:
+            # 按行截断到预算以内
+            kept, used = [], 0
+            for line in text.splitlines(keepends=True):
+                cost = estimate_tokens(line)
+                if used + cost > budget:
+                    break
+                kept.append(line)
+                used += cost
+            # 这个文件被预算截断后就停止：剩下的预算不再拿去读其他文件的零碎片段
+            text, tokens = "".join(kept), budget
+            entry["range_end"] = lines.start + len(kept) - 1
+        # 没读到请求的末尾（预算截断或单文件行数上限）时，告诉模型从哪一行接着读
+        wanted_end = float("inf") if end == -1 else end
+        if lines.total is not None:
+            wanted_end = min(wanted_end, lines.total)
+        if entry["range_end"] < wanted_end:
+            entry["truncated"] = True
+            entry["next_range_start"] = entry["range_end"] + 1
+        entry["content"] = text
+        budget -= tokens
+        files.append(entry)
+
+    result = {"files": files}
+    if skipped:
+        result["skipped"] = skipped
+        result["skipped_note"] = "Token budget exhausted; these files were not read. Read them in a follow-up call."
+    if missing:
+        result["not_found"] = missing
+    if len(specs) >= READ_MANY_MAX_FILES:
+        result["note"] = f"Only the first {READ_MANY_MAX_FILES} files were read; narrow the globs to read the rest."
+    return json.dumps(result, ensure_ascii=False, indent=1)
+
 @tool(args_schema=FileWriteInput)
-def file_write(path: str, content: str) -> str:
+def file_write(path: str, content: str, mode: str = "overwrite", start_line: int = 1, end_line: int = -1) -> str:
     """
-    Writes content to a text file, overwriting existing content.
+    Writes text to a file: overwrite it, append to it, replace a line range, or apply a unified diff.
     This is a Layer 1 atomic tool.
     """
     try:
-        # Simulate the file tool's write action
-        # In a real system, this would call the file tool API
-        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
-        # Always write as UTF-8 for consistency
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        return f"Successfully wrote content to file '{path}'."
+        # 除 overwrite 外都是在现有内容上做局部修改，模型只需要发送改动的部分；
+        # 所有模式都先写临时文件再原子替换（见 file_edit），中途失败不会留下写了一半的文件
+        # 局部修改沿用文件原来的编码；整体覆盖和新文件按 UTF-8 写
+        encoding = "utf-8"
+        if mode == "overwrite":
+            new_text = content
+        else:
+            original, encoding = read_text(path)
+            if mode == "append":
+                new_text = original + content
+            elif mode == "replace_lines":
+                end = len(original.splitlines()) if end_line == -1 else end_line
+                new_text = replace_lines(original, start_line, end, content)
+            elif mode == "patch":
+                new_text = apply_unified_diff(original, content)
+            else:
+                return f"Error writing to file '{path}': unknown mode '{mode}'."
+        atomic_write(path, new_text, encoding=encoding)
+        tool_cache.invalidate_path(path)
+        if mode == "overwrite":
+            return f"Successfully wrote content to file '{path}'."
+        saved = estimate_tokens(new_text) - estimate_tokens(content)
+        return (
+            f"Successfully updated file '{path}' (mode={mode}, {len(new_text.splitlines())} lines now). "
+            f"About {max(saved, 0)} output tokens saved compared with rewriting the whole file."
+        )
+    except PatchError as e:
+        return f"Error applying patch to '{path}': {e}. The file was not modified; re-read it and regenerate the diff."
+    except UnicodeEncodeError as e:
+        return (
+            f"Error writing to file '{path}': the new content contains characters that cannot be encoded as "
+            f"{e.encoding} (the file's existing encoding). The file was not modified."
+        )
     except Exception as e:
         return f"Error writing to file '{path}': {e}"
 
+@tool(args_schema=FileGrepInput)
+def file_grep(
+    pattern: str,
+    path: str = ".",
+    glob: List[str] = None,
+    ignore_case: bool = False,
+    context_lines: int = 0,
+    max_results: int = 50,
+) -> str:
+    """
+    Searches file contents with a regular expression and returns matching lines as path:line:text.
+    Use it to find the right file and line before reading, instead of reading whole files.
+    This is a Layer 1 atomic tool.
+    """
+    # 多线程遍历目录 + mmap 扫描（见 grep），遵守 .gitignore，达到 max_results 后提前停止
+    if not os.path.exists(path):
+        return f"Error: Path not found '{path}'."
+    try:
+        matches, truncated = grep(
+            path, pattern, globs=glob or (), ignore_case=ignore_case,
+            context=max(0, context_lines), max_results=max(1, max_results),
+        )
+    except re.error as e:
+        return f"Error: Invalid regular expression '{pattern}': {e}"
+    if not matches:
+        return f"No matches for '{pattern}' in '{path}'."
+    header = f"Found {len(matches)} matching lines for '{pattern}' in '{path}'"
+    if truncated:
+        header += f" (stopped at max_results={max_results}; narrow the pattern or glob to see more)"
+    return f"{header}:\n{format_matches(matches, path)}"
+
 @tool(args_schema=ShellExecInput)
-def shell_exec(command: str, session: str = "default", timeout: int = 30) -> str:
+def shell_exec(command: str, session: str = "default", timeout: int = 30, config: RunnableConfig = None) -> str:
     """
     Executes a shell command in the sandbox. This is the gateway for Layer 2 tools.
     This is a Layer 1 atomic tool.
     """
-    # NOTE: In a real OpenManus environment, this function would call the
-    # 'default_api:shell' tool. Since we are running *within* the sandbox,
-    # we will simulate the execution using the standard 'os.system' or 'subprocess'
-    # for simplicity, but the LLM's *intent* is to use the sandbox shell.
-    # For this demonstration, we will just return a simulated success message
-    # to allow the flow to continue, as direct execution of shell commands
-    # via a Python function in this context is complex and error-prone.
-    
-    # To make it more realistic, we will use the actual shell tool for a real execution
-    # but since we are defining the tools for the LLM *inside* the main script,
-    # we must rely on the LLM to call the tool and the main loop to execute it.
-    # For the purpose of this file, we will define the function signature.
-    
-    # For the sake of a runnable example, we will simulate the output.
-    # In the main LangGraph loop, the actual execution will be handled by the Agent.
-    
-    # Layer 2 tools are called via this Layer 1 tool.
-    if command.startswith("manus-"):
-        return f"Simulated Shell Execution (Layer 2 Tool): Executing command '{command}' in session '{session}' with timeout {timeout}s. Output: 'Layer 2 tool execution successful. Result saved to file or returned.'"
-    
-    # General shell command
-    return f"Simulated Shell Execution (Layer 1 Tool): Executing command '{command}' in session '{session}' with timeout {timeout}s. Output: 'Command executed successfully. (Simulated)'"
+    # 每个 (对话, session) 对应一个常驻 shell（见 shell_sessions），cd / export 在多条命令间保留。
+    # 输出边产生边以自定义事件推给 astream_events，超长输出只返回首尾，完整内容落盘。
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    try:
+        result = get_shell_registry().run(
+            (thread_id, session),
+            command,
+            timeout=timeout,
+            on_output=lambda text: _emit_tool_output("shell_exec", text),
+        )
+    except Exception as e:
+        return f"Shell Execution Error: {e}"
+
+    if result.status == "syntax_error":
+        header = f"Shell Syntax Error: the command was not run and session '{session}' is unchanged; fix the command and retry."
+    elif result.status == "timeout":
+        header = f"Shell Execution Timeout: command exceeded {timeout}s and session '{session}' was terminated (its state is lost)."
+    elif result.status == "crashed":
+        header = f"Shell Execution Error: the shell of session '{session}' exited (code {result.exit_code}); a new one will be started on the next call."
+    else:
+        header = f"Shell Execution (session '{session}', exit code {result.exit_code}):"
+    return f"{header}\n---\n{result.output}\n---"
 
 @tool(args_schema=SearchInfoInput)
+@idempotent(_search_info_key)
 def search_info(queries: List[str]) -> str:
     """
-    Searches for general web information.
+    Searches the local knowledge base (the workspace directory and configured corpora).
     This is a Layer 1 atomic tool.
     """
-    # Simulate the search tool's info action
-    # In a real system, this would call the search tool API
+    # 离线运行：检索本地 BM25 段落索引（见 search_index），多个查询变体并行检索后合并去重
+    hits = get_search_index().search(queries[:3], top_k=5)
     query_str = ", ".join(queries)
-    return f"Simulated Search Result: Successfully searched for '{query_str}'. Found 3 relevant articles: [Article 1: LangGraph Basics], [Article 2: OpenManus Architecture], [Article 3: Function Calling in LLMs]."
+    if not hits:
+        return f"Search Result: No local documents matched '{query_str}'."
+    lines = [f"Search Result: {len(hits)} passages matched '{query_str}':"]
+    for i, hit in enumerate(hits, 1):
+        lines.append(f"[{i}] {hit.path} (line {hit.line}, score {hit.score:.3f})\n    {hit.snippet}")
+    return "\n".join(lines)
 
 # --- Layer 3: Code Execution Tool ---
 
 @tool(args_schema=CodeExecInput)
-def code_exec(code: str) -> str:
+def code_exec(code: str, timeout: int = 30, reset: bool = False, config: RunnableConfig = None) -> str:
     """
     Executes arbitrary Python code in a sandboxed environment. This is the gateway for Layer 3.
     This is a Layer 3 tool, but exposed as a Layer 1-like function call to the LLM.
     """
-    # NOTE: In a real system, this would involve a secure, isolated execution environment.
-    # For this demonstration, we will use a simple exec() with output capture.
-    # WARNING: Using exec() is inherently unsafe in a production environment.
-    
-    import io
-    import sys
-    
-    old_stdout = sys.stdout
-    redirected_output = io.StringIO()
-    sys.stdout = redirected_output
-    
-    try:
-        # Execute the code
-        exec(code, {})
-        output = redirected_output.getvalue()
+    # 代码在独立的 worker 进程里执行（见 code_runner），有独立的超时、CPU/内存限制和输出捕获，
+    # 死循环或崩溃只会让那个 worker 被替换，不会卡住或污染 Agent 进程。
+    # 带 thread_id 的对话使用会话内核，全局变量在多次调用间保留；否则走无状态的预热进程池。
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    if thread_id is not None:
+        result = get_kernel_manager().run(str(thread_id), code, timeout=timeout, reset=reset)
+    else:
+        result = get_code_pool().run(code, timeout=timeout)
+
+    if result.status == "ok":
+        output = result.stdout
+        if result.stderr:
+            output += f"\n[stderr]\n{result.stderr}"
         return f"Code Execution Successful (Layer 3):\n---\n{output}\n---"
-    except Exception as e:
-        return f"Code Execution Error (Layer 3):\n---\n{type(e).__name__}: {e}\n---"
-    finally:
-        sys.stdout = old_stdout
+
+    details = result.error or ""
+    if result.stdout:
+        details += f"\n[stdout]\n{result.stdout}"
+    if result.stderr:
+        details += f"\n[stderr]\n{result.stderr}"
+    return f"Code Execution Error (Layer 3):\n---\n{details}\n---"
         
         
 @tool(args_schema=PlanTaskInput)
@@ -191,6 +390,3 @@ def plan_task(goal: str, steps: List[str]) -> str:
     # 返回 JSON 字符串，方便 LLM 继续解析 / 调试
     return json.dumps(plan, ensure_ascii=False, indent=2)
 
-
-# Combine all tools for the LLM
-ALL_TOOLS = [file_read, file_write, shell_exec, search_info, code_exec, plan_task,sandbox_code_exec,sandbox_list_files,sandbox_kill,]
\ No newline at end of file